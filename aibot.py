@@ -1,11 +1,341 @@
-from openai import AsyncOpenAI
+import copy
+import hashlib
+import logging
 import re
 import json
+import time
+from typing import TYPE_CHECKING, Any, Mapping
+from config import Truncated
+from hedging import Hedger
+from html_blocks import apply_block_patches, locate_flagged_blocks
+from rate_limit import (
+    PRIORITY_CONTINUE,
+    PRIORITY_FINISH,
+    PRIORITY_START,
+    RateLimiter,
+)
 from tenacity import (
     retry,
     stop_after_attempt,
     wait_random_exponential,
 )
+from tracing import span
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+    from llm_store import RecordReplayTransport
+
+log = logging.getLogger(__name__)
+
+# model, reasoning effort and web search per call type; override with MODEL_TIERS
+DEFAULT_MODEL_TIERS: dict[str, dict] = {
+    "generation": {"model": "gpt-5", "effort": "medium", "tools": True},
+    "context": {"model": "gpt-5", "effort": "minimal", "tools": False},
+    "improvement": {"model": "gpt-5", "effort": "medium", "tools": False},
+    "json_repair": {"model": "gpt-5-mini", "effort": "minimal", "tools": False},
+    "metadata_edit": {"model": "gpt-5-mini", "effort": "low", "tools": False},
+    "summary": {"model": "gpt-5-mini", "effort": "low", "tools": False},
+}
+
+# Prompts are laid out static part first so the provider can serve the shared
+# prefix from its prompt cache. Everything below must stay byte-identical
+# between calls: no formatting, no keyphrase or site data.
+GENERATION_INSTRUCTIONS: tuple[dict[str, str], ...] = (
+    {
+        "role": "developer",
+        "content": (
+            "You are an expert Persian SEO content writer and assistant.\n"
+            "Your task is to generate structured, SEO-optimized Persian blog posts using information provided step-by-step.\n\n"
+            "### Core Rules:\n"
+            "- NEVER generate any article content until you explicitly receive the command [FINAL].\n"
+            "- Before [FINAL], your only valid responses are one word response brief acknowledgements such as 'Noted' or 'Understood'.\n"
+            "- On receiving [FINAL], you must combine **all previously provided context** (keyword, Google results, related articles, tags/categories, etc.) "
+            "to generate the full, final output.\n"
+            "- Maintain a professional, informative tone and natural Persian phrasing (avoid translation-like structures)."
+        ),
+    },
+    {
+        "role": "developer",
+        "content": (
+            "### Output Format (only used during [FINAL]):\n"
+            "1. Return clean HTML only — no <html>, <head>, or <body> tags.\n"
+            "2. Wrap the entire article in:\n"
+            "   <div lang='fa' dir='rtl'> ... </div>\n"
+            "3. Use only structural tags (<h1>, <h2>, <h3>, <p>, <ul>, <ol>, <a>, <img>, etc.).\n"
+            "4. Do NOT use inline styles, CSS classes, or custom attributes.\n"
+            "5. Ensure factual accuracy and current information.\n\n"
+            "After the HTML, append a valid JSON block with the following fields:\n"
+            "{\n"
+            '  "title": "Generated SEO title",\n'
+            '  "slug": "english-seo-slug",\n'
+            '  "categories": [list of relevant categories],\n'
+            '  "tags": [exactly 5 relevant tags],\n'
+            '  "faqs": [{"question": "...", "answer": "..."}, ... 3 total],\n'
+            '  "meta": "≤160 characters meta description (must include the primary keyword)",\n'
+            '  "sources": [{"title": "...", "link": "..."}, ...]\n'
+            '  "synonyms": [list of relevant synonyms]\n'
+            "}\n"
+            "Do not output anything outside this format."
+        ),
+    },
+    {
+        "role": "developer",
+        "content": (
+            "### HTML Formatting Guidelines:\n"
+            "- Use <strong> for bold emphasis.\n"
+            "- Use <em> for italic emphasis.\n"
+            "- Use <blockquote> for quotes or cited statements.\n"
+            "- Use <ul>/<ol> and <li> for bullet and numbered lists.\n"
+            "- Use <table>, <tr>, <th>, <td> where it helps organize information clearly.\n"
+            "- Use <mark> to highlight key terms if needed.\n"
+            "- Maintain consistent semantic HTML formatting throughout the article.\n\n"
+            "### Important Rule:\n"
+            '- **Do NOT include any FAQs in the main HTML content.** All FAQ questions and answers must appear only in the JSON block under "faqs".\n\n'
+            "When generating the article on [FINAL], follow these HTML guidelines along with the JSON structure requirements."
+        ),
+    },
+    {
+        "role": "user",
+        "content": (
+            "You will receive the top 5 Google search results for the primary keyword.\n"
+            "Each result will arrive separately. Do NOT generate any text yet — just acknowledge each one.\n\n"
+            "### When generating later:\n"
+            "- Use insights from these results to match or exceed their coverage.\n"
+            "- Do NOT copy text. Rephrase ideas in your own words.\n"
+            "- Improve structure, readability, and topical depth using these insights.\n"
+            "- Incorporate common subtopics and related questions found across multiple results."
+        ),
+    },
+    {
+        "role": "user",
+        "content": (
+            "You will receive related internal blog articles (for internal linking).\n\n"
+            "### Related internal articles format:\n"
+            "- Each item is a dictionary with the following fields:\n"
+            "  • 'title': the article title\n"
+            "  • 'url': full URL of the article\n"
+            "  • 'categories': list of category names\n"
+            "  • 'tags': list of tag names\n"
+            "  • 'first_paragraphs': the first one or two paragraphs of the article\n"
+            "- Use these fields to insert natural, descriptive anchor text links.\n"
+            "- Before placing a link, **derive the primary intent of each article** based on this information.\n"
+            "  • Informational: for readers seeking general knowledge.\n"
+            "  • Educational / Research: for deeper analysis, comparisons, or detailed explanations.\n"
+            "  • Commercial Investigation: for evaluating options before a purchase or decision.\n"
+            "  • Transactional: for readers ready to buy, book, or submit a form.\n"
+            "  • Navigational: when a reader is looking specifically for a brand, product, or website.\n"
+            "  • Local Intent: when a reader is searching for location-specific results.\n"
+            "- Insert links naturally where they add value and context.\n"
+            "- Use descriptive, reader-friendly anchor text derived from the article title, first_paragraphs, or categories.\n"
+            "- Avoid keyword stuffing and do not force links into unrelated sentences.\n"
+            "- Limit to 2–5 internal links per article, distributed across different sections."
+        ),
+    },
+    {
+        "role": "user",
+        "content": (
+            "You will receive the available categories and tags of the site.\n\n"
+            "Rules:\n"
+            "- Select only from these lists when filling the JSON.\n"
+            "- Do NOT create new category or tag names.\n"
+            "- Pick those most relevant to your article’s focus."
+        ),
+    },
+    {
+        "role": "user",
+        "content": (
+            "Rules for synonyms:\n"
+            "- Generate 3–5 concise, natural synonyms or alternative phrases for the primary keyword.\n"
+            "- Each synonym should be 1–3 words, reader-friendly, and suitable for Yoast SEO input.\n"
+            "- Synonyms must be in Persian (the same language as the primary keyword).\n"
+            "- Do not repeat the primary keyword itself.\n"
+            "- Ensure relevance and contextual accuracy."
+        ),
+    },
+    {
+        "role": "user",
+        "content": (
+            "Instructions for using synonyms in the article:\n"
+            "- Treat the generated synonyms as secondary keyphrases.\n"
+            "- Naturally incorporate them into headings, subheadings, and body text.\n"
+            "- Ensure they appear multiple times but avoid overstuffing.\n"
+            "- Maintain natural Persian phrasing — do not force synonyms unnaturally.\n"
+            "- Continue using the primary keyword as usual alongside the synonyms.\n"
+            "Acknowledge only. Do not write any article content yet."
+        ),
+    },
+)
+
+FINAL_PROMPT: str = (
+    "[FINAL]\n"
+    "Now generate a complete 1500-word Persian blog post optimized for Yoast SEO.\n\n"
+    "### Structure:\n"
+    "• **Title:** Compelling, SEO-friendly title including the primary keyword near the start.\n"
+    "• **Summary paragraph:** 1 short paragraph summarizing the article.\n"
+    "• **Introduction (~100 words)** introducing the topic naturally.\n"
+    "• **12 main headings (H2)** with 2–3 subheadings (H3) under relevant sections.\n"
+    "• Short paragraphs (≤3 lines), clear sentences, and transition words (مثل «از طرفی»، «در نتیجه»، «به طور کلی»).\n"
+    "• **Conclusion:** A concise wrap-up paragraph.\n"
+    "• Use HTML formatting as described in the previous guidelines where appropriate (bold, italic, blockquotes, lists, tables, and highlights).\n\n"
+    "### HTML Guidelines:\n"
+    "- Follow the HTML formatting rules from the previous guidelines.\n"
+    '- **Do NOT include any FAQs in the main HTML content.** All FAQ questions and answers must appear only in the JSON block under "faqs".\n\n'
+    "### SEO Guidelines:\n"
+    "- Include the primary keyword naturally in the title, first paragraph, meta description, and several times in the text.\n"
+    "- Maintain a natural flow — avoid keyword stuffing.\n"
+    "- Add internal and external links naturally where relevant.\n"
+    "- Use informative, keyword-rich headings.\n"
+    "- Keep readability high (simple, clear language).\n\n"
+    "### JSON Output:\n"
+    "Follow the schema described above. Output only HTML followed by JSON, nothing else."
+)
+
+IMPROVEMENT_INSTRUCTIONS: str = (
+    "IMPORTANT: Do not include explanations, suggestions, or commentary. "
+    "Only return the improved HTML and JSON in the specified format.\n\n"
+    "You are an expert Persian SEO assistant and editor. "
+    "Your task is to improve an existing article using the feedback from Yoast SEO analysis. "
+    "The article, its JSON data and the feedback follow in the next message.\n\n"
+    "### Yoast analysis fields:\n"
+    "- '_identifier': the issue type (e.g., 'sentenceBeginnings', 'subheadingsKeyword', 'metaDescription').\n"
+    "- 'text': human-readable description of the issue.\n"
+    "- 'rating': severity ('good', 'ok', 'bad').\n"
+    "- 'problemSentences': list of exact sentences that violate the rule (if available), "
+    "each entry containing 'fullSentence' and 'firstWord'.\n"
+    "For 'subheadingsKeyword', treat all <h2> and <h3> headings as problem sentences. "
+    "Rephrase only the sentences listed in 'problemSentences' minimally to fix the issue.\n\n"
+    "### Yoast quantitative guidance:\n"
+    "- **Keyword density:** 0.5%–3% of total words (adjust body text only).\n"
+    "- **Meta description:** 120–156 characters, must include the primary keyword.\n"
+    "- **Subheadings with keyword:** 30–75% of H2/H3 should include the primary keyword.\n"
+    "- **Consecutive sentences starting with the same word:** No more than 2 consecutive sentences starting with the same word.\n"
+    "- **Sentence length:** Prefer sentences under 20 words.\n"
+    "- **Transition words:** ≥30% of sentences.\n"
+    "- **Passive voice:** <10% of sentences.\n"
+    "- **Paragraph length:** ≤150 words per paragraph.\n\n"
+    "### Instructions for improvement:\n"
+    "- Apply the **smallest possible edits** to resolve each Yoast issue.\n"
+    "- Do NOT rewrite large portions unless absolutely necessary.\n"
+    "- Preserve previously correct optimizations.\n"
+    "- Only modify sections directly related to the issues provided.\n"
+    "- When adjusting ranges (keyword density, subheading coverage), move slightly toward the target without overcompensating.\n"
+    "- Keep tone, topic, structure, headings, and tags/categories unchanged unless absolutely necessary.\n"
+    "- Track adjustments to avoid repeatedly editing the same sentence or heading.\n"
+    "- Attempt only **one adjustment cycle per issue** per pass.\n\n"
+    "### Actionable fixes for common Yoast issues:\n"
+    "- **Consecutive sentence beginnings:** Rephrase only the 2nd and 3rd sentences in sequences of 3+ using slight restructuring. Fully rewrite only if needed.\n"
+    "- **Keyword density:** Adjust only body text, not subheadings. Add or remove minimal occurrences of the primary keyword **or any of its synonyms** (from the 'synonyms' list in the JSON) to reach 0.5–3%. Avoid overcorrection.\n"
+    "- **SubheadingsKeyword:** For each <h2>/<h3> heading listed in 'problemSentences':\n"
+    "  • Check if the primary keyword or any of its synonyms are present.\n"
+    "  • If missing, **first try to insert a synonym naturally** in the heading. Only use the primary keyword if no suitable synonym fits.\n"
+    "  • If the heading contains too many occurrences of the keyword or synonyms, remove extras.\n"
+    "  • Apply minimal edits but **ensure that after editing Yoast would no longer mark it as a problem**.\n"
+    "- **Meta description:** Only adjust if Yoast flagged it as too short or too long. If flagged, adjust to 120–156 characters including the primary keyword naturally. Do not modify otherwise.\n"
+    "- **Sentence length:** Split sentences >20 words while keeping meaning.\n"
+    "- **Transition words / readability:** Add in underrepresented sentences.\n"
+    "- **Passive voice:** Rewrite to active where necessary.\n"
+    "- **Paragraphs too long:** Split >150 words into shorter paragraphs.\n"
+    "- **Internal links:** Use provided related articles (title, first_paragraphs, categories, tags) naturally. Limit 2–5 internal links per article.\n\n"
+    "### Conflict resolution priority:\n"
+    "- If subheadingsKeyword and keyword density conflict, prioritize maintaining subheading coverage.\n"
+    "- Adjust body text first for density before touching subheadings.\n\n"
+    "### Output requirements:\n"
+    "1. Return **improved article as clean HTML** only — no <html>, <head>, or <body> tags.\n"
+    "2. Wrap content in a single <div lang='fa' dir='rtl'> ... </div>\n"
+    "3. Use only structural tags (<h1>, <h2>, <h3>, <p>, <ul>, <ol>, <a>, <img>, etc.)\n"
+    "4. Do NOT add inline styles, CSS classes, or custom attributes.\n"
+    "5. Append a **valid JSON block** after the HTML with:\n"
+    '   - "title": improved SEO title (if relevant)\n'
+    '   - "categories": [list of relevant categories]\n'
+    '   - "tags": [list of 5 relevant tags]\n'
+    '   - "faqs": [3 objects {"question","answer"}]\n'
+    '   - "meta": meta description (≤160 chars, must include the Primary Keyword, only edit if flagged by Yoast)\n'
+    '   - "sources": list of objects with "title" and "link" for every source referenced\n'
+    '   - "synonyms": [list of relevant synonyms]\n\n'
+    "### Self-check:\n"
+    "- Verify each Yoast issue is actually resolved.\n"
+    "- Consecutive sentence beginnings ≤2 per sequence.\n"
+    "- Keyword density 0.5–3%, using primary keyword and/or synonyms; subheadingsKeyword fixed as per problemSentences.\n"
+    "- Meta description only changed if flagged, otherwise unchanged.\n"
+    "- Sentence lengths, transition words, passive voice, paragraph lengths within thresholds.\n"
+    "- Only return final HTML and JSON when all adjustments are within range.\n\n"
+    "Ensure format is identical to original generation for correct parsing."
+)
+
+PATCH_INSTRUCTIONS: str = (
+    "IMPORTANT: Do not include explanations, suggestions, or commentary. "
+    "Only return the JSON object in the specified format.\n\n"
+    "You are an expert Persian SEO assistant and editor. "
+    "Your task is to fix specific blocks of an existing article using the feedback from Yoast SEO analysis. "
+    "You only receive the blocks and metadata fields that Yoast flagged, not the whole article.\n\n"
+    "### Input fields:\n"
+    "- 'issues': list of Yoast issues, each with '_identifier', 'text' and 'blockIds' (ids of the blocks that violate the rule).\n"
+    "- 'blocks': list of flagged HTML blocks, each with 'id' and 'html'.\n"
+    "- 'fields': flagged metadata fields (e.g. 'meta', 'title') with their current values.\n\n"
+    "### Yoast quantitative guidance:\n"
+    "- **Meta description:** 120–156 characters, must include the primary keyword.\n"
+    "- **Subheadings with keyword:** 30–75% of H2/H3 should include the primary keyword or a synonym.\n"
+    "- **Consecutive sentences starting with the same word:** No more than 2 consecutive sentences starting with the same word.\n"
+    "- **Sentence length:** Prefer sentences under 20 words.\n"
+    "- **Transition words:** ≥30% of sentences.\n"
+    "- **Passive voice:** <10% of sentences.\n"
+    "- **Paragraph length:** ≤150 words per paragraph.\n\n"
+    "### Instructions:\n"
+    "- Apply the **smallest possible edits** to resolve each issue.\n"
+    "- Keep the same tag for every block; a long paragraph may be returned as several <p> blocks.\n"
+    "- Keep existing links, tone and meaning.\n"
+    "- Only return blocks you changed.\n\n"
+    "### Output requirements:\n"
+    "Return only a valid JSON object:\n"
+    "{\n"
+    '  "blocks": [{"id": <block id>, "html": "<replacement html>"}, ...],\n'
+    '  "fields": {"<field name>": "<new value>", ...}\n'
+    "}"
+)
+
+COMPACTION_INSTRUCTIONS: str = (
+    "You are an expert Persian SEO content writer and editor. "
+    "You are continuing work on an existing article. "
+    "Maintain a professional, informative tone and natural Persian phrasing. "
+    "When asked for the full article, return clean HTML wrapped in "
+    "<div lang='fa' dir='rtl'> ... </div> followed by a valid JSON block with "
+    "the keys title, slug, categories, tags, faqs, meta, sources and synonyms. "
+    "Only select categories and tags from the lists below.\n"
+)
+
+
+def prompt_cache_key(family: str, *prefix: Any) -> str:
+    """Cache routing key of a prompt family, changing only with its static prefix."""
+    digest = hashlib.sha256(
+        json.dumps(prefix, ensure_ascii=False, sort_keys=True).encode()
+    ).hexdigest()
+    return f"{family}-{digest[:16]}"
+
+
+def taxonomy_message(categories: list[str], tags: list[str]) -> str:
+    # the same for every article of a site, so it follows the static instructions
+    return f"Available categories: {categories}\nAvailable tags: {tags}\n"
+
+
+def create_openai_client(
+    api_key: str, llm_cache_mode: str = "off", llm_cache_dir: str = ".llm_cache"
+) -> tuple["AsyncOpenAI", "RecordReplayTransport | None"]:
+    """SDK client, recording or replaying through llm_store unless the mode is off."""
+    # the openai sdk takes a large share of startup, only load it when a client is built
+    from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+    llm_store: "RecordReplayTransport | None" = None
+    if llm_cache_mode != "off":
+        from llm_store import RecordReplayTransport
+
+        llm_store = RecordReplayTransport(llm_cache_dir, llm_cache_mode)
+    client = AsyncOpenAI(
+        api_key=api_key,
+        http_client=(
+            DefaultAsyncHttpxClient(transport=llm_store) if llm_store else None
+        ),
+    )
+    return client, llm_store
 
 
 class OpenAi:
@@ -19,8 +349,22 @@ class OpenAi:
         conversation_id: str | None = None,
         html_output: str = "",
         json_output: dict = {},
+        compaction_threshold: int = 0,
+        model_tiers: Mapping[str, dict] | None = None,
+        rate_limiter: RateLimiter | None = None,
+        hedger: Hedger | None = None,
+        llm_cache_mode: str = "off",
+        llm_cache_dir: str = ".llm_cache",
+        openai_client: "AsyncOpenAI | None" = None,
     ) -> None:
-        self.client = AsyncOpenAI(api_key=openai_api_key)
+        self.llm_store: "RecordReplayTransport | None" = None
+        if openai_client is not None:
+            # a long-running process shares one client and its connection pool
+            self.client = openai_client
+        else:
+            self.client, self.llm_store = create_openai_client(
+                openai_api_key, llm_cache_mode, llm_cache_dir
+            )
         self.keyword: str = keyword
         self.categories: list[str] = categories
         self.tags: list[str] = tags
@@ -28,325 +372,428 @@ class OpenAi:
         self.conversation_id: str | None = conversation_id
         self.html_output: str = html_output
         self.json_output = json_output
+        # start a fresh conversation once a call's input exceeds this many tokens (0 = never)
+        self.compaction_threshold: int = compaction_threshold
+        self.context_log: list[dict] = []
+        self.model_tiers: dict[str, dict] = {
+            name: {
+                **DEFAULT_MODEL_TIERS.get(name, DEFAULT_MODEL_TIERS["generation"]),
+                **tier,
+            }
+            for name, tier in {**DEFAULT_MODEL_TIERS, **(model_tiers or {})}.items()
+        }
+        # share one limiter between every client that uses the same api key
+        self.rate_limiter: RateLimiter = rate_limiter or RateLimiter()
+        self.hedger: Hedger = hedger or Hedger()
+        # conversations of one site start with the same instructions and taxonomy,
+        # sending them to the same cache machine keeps that prefix warm
+        self.conversation_cache_key: str = prompt_cache_key(
+            "generation", GENERATION_INSTRUCTIONS, categories, tags
+        )
 
     async def _initialize_conversation(self) -> None:
         if not self.conversation_id:
-            conversation = await self.client.conversations.create()
+            # the keyphrase keeps conversations of concurrent articles apart in llm_store
+            conversation = await self.client.conversations.create(
+                metadata={"keyphrase": self.keyword[:512]}
+            )
             self.conversation_id = conversation.id
 
-    @retry(wait=wait_random_exponential(min=1, max=60), stop=stop_after_attempt(6))
-    async def _get_text_response(self, input):
-        await self._initialize_conversation()
-        print("getting text responsse")
-        self.current_response = await self.client.responses.create(
-            model="gpt-5",
-            reasoning={"effort": "medium"},
-            tools=[{"type": "web_search_preview"}],
-            input=input,
-            conversation=self.conversation_id,
+    def _record_context(
+        self, latency: float, call_type: str, conversation_id: str | None
+    ) -> None:
+        usage = getattr(self.current_response, "usage", None)
+        entry = {
+            "conversation_id": conversation_id,
+            "call_type": call_type,
+            "model": self.model_tiers[call_type]["model"],
+            "input_tokens": getattr(usage, "input_tokens", 0) if usage else 0,
+            "output_tokens": getattr(usage, "output_tokens", 0) if usage else 0,
+            "cached_tokens": (
+                getattr(usage.input_tokens_details, "cached_tokens", 0) or 0
+                if usage and getattr(usage, "input_tokens_details", None)
+                else 0
+            ),
+            "latency": round(latency, 3),
+        }
+        self.context_log.append(entry)
+        log.info(
+            "context [%s]: %d input tokens (%d cached), %d output tokens, %ss",
+            call_type,
+            entry["input_tokens"],
+            entry["cached_tokens"],
+            entry["output_tokens"],
+            entry["latency"],
         )
-        print(self.current_response.output_text)
 
-    async def get_full_response(self, top_results_info: list[dict]) -> tuple[dict, str]:
-        print("keyword:", self.keyword)
-        print("related articles:", self.related_articles)
-        print("Categories:", self.categories)
-        print("tags:", self.tags)
+    def _estimate_tokens(self, input, call_type: str, stateless: bool) -> int:
+        # the conversation history is billed again on every non-stateless call
+        history = 0
+        for entry in reversed(self.context_log if not stateless else []):
+            if entry["conversation_id"] == self.conversation_id:
+                history = entry["input_tokens"] + entry["output_tokens"]
+                break
+        new_input = len(json.dumps(input, ensure_ascii=False)) // 3
+        expected_output = 4000 if call_type in ("generation", "improvement") else 500
+        return history + new_input + expected_output
 
-        messages = [
-            {
-                "role": "developer",
-                "content": (
-                    "You are an expert Persian SEO content writer and assistant.\n"
-                    "Your task is to generate structured, SEO-optimized Persian blog posts using information provided step-by-step.\n\n"
-                    "### Core Rules:\n"
-                    "- NEVER generate any article content until you explicitly receive the command [FINAL].\n"
-                    "- Before [FINAL], your only valid responses are one word response brief acknowledgements such as 'Noted' or 'Understood'.\n"
-                    "- On receiving [FINAL], you must combine **all previously provided context** (keyword, Google results, related articles, tags/categories, etc.) "
-                    "to generate the full, final output.\n"
-                    "- Maintain a professional, informative tone and natural Persian phrasing (avoid translation-like structures)."
-                ),
-            },
-            {
-                "role": "developer",
-                "content": (
-                    "### Output Format (only used during [FINAL]):\n"
-                    "1. Return clean HTML only — no <html>, <head>, or <body> tags.\n"
-                    "2. Wrap the entire article in:\n"
-                    "   <div lang='fa' dir='rtl'> ... </div>\n"
-                    "3. Use only structural tags (<h1>, <h2>, <h3>, <p>, <ul>, <ol>, <a>, <img>, etc.).\n"
-                    "4. Do NOT use inline styles, CSS classes, or custom attributes.\n"
-                    "5. Ensure factual accuracy and current information.\n\n"
-                    "After the HTML, append a valid JSON block with the following fields:\n"
-                    "{\n"
-                    '  "title": "Generated SEO title",\n'
-                    '  "slug": "english-seo-slug",\n'
-                    '  "categories": [list of relevant categories],\n'
-                    '  "tags": [exactly 5 relevant tags],\n'
-                    '  "faqs": [{"question": "...", "answer": "..."}, ... 3 total],\n'
-                    '  "meta": "≤160 characters meta description (must include the primary keyword)",\n'
-                    '  "sources": [{"title": "...", "link": "..."}, ...]\n'
-                    '  "synonyms": [list of relevant synonyms]\n'
-                    "}\n"
-                    "Do not output anything outside this format."
-                ),
-            },
-            {
-                "role": "user",
-                "content": (
-                    f'Primary Keyword: "{self.keyword}"\n'
-                    "Acknowledge only. Do not write any article content yet."
-                ),
-            },
-            {
-                "role": "user",
-                "content": (
-                    "You will now receive the top 5 Google search results for this keyword.\n"
-                    "Each result will arrive separately. Do NOT generate any text yet — just acknowledge each one.\n\n"
-                    "### When generating later:\n"
-                    "- Use insights from these results to match or exceed their coverage.\n"
-                    "- Do NOT copy text. Rephrase ideas in your own words.\n"
-                    "- Improve structure, readability, and topical depth using these insights.\n"
-                    "- Incorporate common subtopics and related questions found across multiple results."
-                ),
-            },
-            *[
+    def _priority(self, call_type: str) -> int:
+        if not self.conversation_id:
+            return PRIORITY_START
+        if call_type in ("generation", "context") and not self.html_output:
+            return PRIORITY_CONTINUE
+        return PRIORITY_FINISH
+
+    def tier_stats(self) -> dict[str, dict]:
+        stats: dict[str, dict] = {}
+        for entry in self.context_log:
+            tier = stats.setdefault(
+                entry["call_type"],
+                {
+                    "model": entry["model"],
+                    "calls": 0,
+                    "latency": 0.0,
+                    "input_tokens": 0,
+                    "cached_tokens": 0,
+                    "output_tokens": 0,
+                },
+            )
+            tier["calls"] += 1
+            tier["latency"] += entry["latency"]
+            tier["input_tokens"] += entry["input_tokens"]
+            tier["cached_tokens"] += entry.get("cached_tokens", 0)
+            tier["output_tokens"] += entry["output_tokens"]
+        for tier in stats.values():
+            tier["latency"] = round(tier["latency"], 3)
+            tier["avg_latency"] = round(tier["latency"] / tier["calls"], 3)
+            tier["cache_ratio"] = round(
+                tier["cached_tokens"] / max(1, tier["input_tokens"]), 3
+            )
+        return stats
+
+    def fork(self) -> "OpenAi":
+        """Copy to improve the current draft with, leaving this client's draft alone.
+
+        The copy shares the API client, scheduler and context log. Only use it
+        with stateless=True so concurrent forks never write to the conversation.
+        """
+        return copy.copy(self)
+
+    def _needs_compaction(self) -> bool:
+        if not self.compaction_threshold or not self.context_log:
+            return False
+        last = self.context_log[-1]
+        return (
+            last["conversation_id"] == self.conversation_id
+            and last["input_tokens"] >= self.compaction_threshold
+        )
+
+    async def compact_conversation(self) -> None:
+        """Replace the conversation with one seeded by a summary and the current draft."""
+        log.info("compacting conversation %s", self.conversation_id)
+        await self._get_text_response(
+            [
                 {
                     "role": "user",
                     "content": (
-                        f"Top result #{i + 1}:\n{info}\n"
-                        "Acknowledge only. Incorporate this data later when generating the article."
+                        "Summarize, in at most 300 words, everything from this conversation "
+                        "that is still needed to keep improving the article: the search intent, "
+                        "key insights from the competitor pages, the internal articles to link to "
+                        "and any editing decisions already made. Do not include the article itself. "
+                        "Return only the summary."
                     ),
                 }
+            ],
+            call_type="summary",
+        )
+        summary = self.current_response.output_text.strip()
+        draft_json = {
+            k: v for k, v in self.json_output.items() if k != "conversation_id"
+        }
+        conversation = await self.client.conversations.create(
+            items=[
+                {
+                    "type": "message",
+                    "role": "developer",
+                    "content": COMPACTION_INSTRUCTIONS
+                    + taxonomy_message(self.categories, self.tags),
+                },
+                {
+                    "type": "message",
+                    "role": "user",
+                    "content": (
+                        f'Primary Keyword: "{self.keyword}"\n\n'
+                        f"Summary of the work so far:\n{summary}\n\n"
+                        f"Current article HTML:\n{self.html_output}\n\n"
+                        f"Current JSON data:\n{json.dumps(draft_json, ensure_ascii=False)}"
+                    ),
+                },
+            ]
+        )
+        self.conversation_id = conversation.id
+        self.conversation_cache_key = prompt_cache_key(
+            "compacted", COMPACTION_INSTRUCTIONS, self.categories, self.tags
+        )
+        if self.json_output:
+            self.json_output["conversation_id"] = conversation.id
+
+    async def _create_response(
+        self,
+        input,
+        tier: dict,
+        priority: int,
+        tokens: int,
+        stateless: bool,
+        call_type: str = "generation",
+        cache_key: str | None = None,
+    ) -> tuple[Any, float]:
+        from openai import RateLimitError
+
+        # stateless calls carry all their context and leave the conversation untouched,
+        # which also makes them safe to hedge
+        conversation_args: dict[str, Any] = (
+            {"store": False} if stateless else {"conversation": self.conversation_id}
+        )
+        with span(
+            "llm.call",
+            call_type=call_type,
+            model=tier["model"],
+            stateless=stateless,
+            priority=priority,
+        ) as attributes:
+            queued = time.perf_counter()
+            async with self.rate_limiter.reserve(tokens, priority) as reservation:
+                started = time.perf_counter()
+                attributes["queued"] = round(started - queued, 3)
+                try:
+                    raw_response = await self.client.responses.with_raw_response.create(
+                        model=tier["model"],
+                        reasoning={"effort": tier["effort"]},
+                        tools=(
+                            [{"type": "web_search_preview"}] if tier["tools"] else []
+                        ),
+                        input=input,
+                        prompt_cache_key=cache_key or self.conversation_cache_key,
+                        **conversation_args,
+                    )
+                except RateLimitError as e:
+                    attributes["status"] = e.status_code
+                    self.rate_limiter.update_from_headers(
+                        e.response.headers, throttled=True
+                    )
+                    raise
+                latency = time.perf_counter() - started
+                attributes["status"] = raw_response.status_code
+                self.rate_limiter.update_from_headers(raw_response.headers)
+                response = raw_response.parse()
+                usage = getattr(response, "usage", None)
+                if usage:
+                    details = getattr(usage, "input_tokens_details", None)
+                    attributes["input_tokens"] = usage.input_tokens
+                    attributes["output_tokens"] = usage.output_tokens
+                    attributes["cached_tokens"] = getattr(details, "cached_tokens", 0)
+                    self.rate_limiter.settle(
+                        reservation, usage.input_tokens + usage.output_tokens
+                    )
+                return response, latency
+
+    @retry(wait=wait_random_exponential(min=1, max=60), stop=stop_after_attempt(6))
+    async def _get_text_response(
+        self,
+        input,
+        call_type: str = "generation",
+        stateless: bool = False,
+        cache_key: str | None = None,
+    ):
+        priority = self._priority(call_type)
+        await self._initialize_conversation()
+        log.debug("requesting a %s response", call_type)
+        if call_type not in self.model_tiers:
+            call_type = "generation"
+        tier = self.model_tiers[call_type]
+        tokens = self._estimate_tokens(input, call_type, stateless)
+
+        def make_call():
+            return self._create_response(
+                input, tier, priority, tokens, stateless, call_type, cache_key
+            )
+
+        if stateless:
+            self.current_response, latency = await self.hedger.run(call_type, make_call)
+        else:
+            self.current_response, latency = await make_call()
+        self._record_context(
+            latency, call_type, None if stateless else self.conversation_id
+        )
+        log.debug(
+            "%s response: %s", call_type, Truncated(self.current_response.output_text)
+        )
+
+    async def get_full_response(self, top_results_info: list[dict]) -> tuple[dict, str]:
+        log.info("generating an article for %s", self.keyword)
+        log.debug("related articles: %s", Truncated(self.related_articles))
+        log.debug("categories: %s", Truncated(self.categories))
+        log.debug("tags: %s", Truncated(self.tags))
+
+        # static instructions first, then the site's taxonomy, then this article's data
+        await self._get_text_response(
+            input=list(GENERATION_INSTRUCTIONS), call_type="context"
+        )
+        messages = [
+            taxonomy_message(self.categories, self.tags) + "Acknowledge only.",
+            f'Primary Keyword: "{self.keyword}"\n'
+            "Acknowledge only. Do not write any article content yet.",
+            *[
+                f"Top result #{i + 1}:\n{info}\n"
+                "Acknowledge only. Incorporate this data later when generating the article."
                 for i, info in enumerate(top_results_info)
             ],
-            {
-                "role": "user",
-                "content": (
-                    "Related internal blog articles (for internal linking):\n"
-                    f"{self.related_articles}\n\n"
-                    "### Related internal articles format:\n"
-                    "- Each item is a dictionary with the following fields:\n"
-                    "  • 'title': the article title\n"
-                    "  • 'url': full URL of the article\n"
-                    "  • 'categories': list of category names\n"
-                    "  • 'tags': list of tag names\n"
-                    "  • 'first_paragraphs': the first one or two paragraphs of the article\n"
-                    "- Use these fields to insert natural, descriptive anchor text links.\n"
-                    "- Before placing a link, **derive the primary intent of each article** based on this information.\n"
-                    "  • Informational: for readers seeking general knowledge.\n"
-                    "  • Educational / Research: for deeper analysis, comparisons, or detailed explanations.\n"
-                    "  • Commercial Investigation: for evaluating options before a purchase or decision.\n"
-                    "  • Transactional: for readers ready to buy, book, or submit a form.\n"
-                    "  • Navigational: when a reader is looking specifically for a brand, product, or website.\n"
-                    "  • Local Intent: when a reader is searching for location-specific results.\n"
-                    "- Insert links naturally where they add value and context.\n"
-                    "- Use descriptive, reader-friendly anchor text derived from the article title, first_paragraphs, or categories.\n"
-                    "- Avoid keyword stuffing and do not force links into unrelated sentences.\n"
-                    "- Limit to 2–5 internal links per article, distributed across different sections.\n"
-                    "Acknowledge only; do not generate article content yet."
-                ),
-            },
-            {
-                "role": "user",
-                "content": (
-                    f"Available categories: {self.categories}\n"
-                    f"Available tags: {self.tags}\n\n"
-                    "Rules:\n"
-                    "- Select only from these lists when filling the JSON.\n"
-                    "- Do NOT create new category or tag names.\n"
-                    "- Pick those most relevant to your article’s focus.\n"
-                    "Acknowledge only."
-                ),
-            },
-            {
-                "role": "user",
-                "content": (
-                    "Rules for synonyms:\n"
-                    "- Generate 3–5 concise, natural synonyms or alternative phrases for the primary keyword.\n"
-                    "- Each synonym should be 1–3 words, reader-friendly, and suitable for Yoast SEO input.\n"
-                    "- Synonyms must be in Persian (the same language as the primary keyword).\n"
-                    "- Do not repeat the primary keyword itself.\n"
-                    "- Ensure relevance and contextual accuracy.\n"
-                    "Acknowledge only."
-                ),
-            },
-            {
-                "role": "user",
-                "content": (
-                    "Instructions for using synonyms in the article:\n"
-                    "- Treat the generated synonyms as secondary keyphrases.\n"
-                    "- Naturally incorporate them into headings, subheadings, and body text.\n"
-                    "- Ensure they appear multiple times but avoid overstuffing.\n"
-                    "- Maintain natural Persian phrasing — do not force synonyms unnaturally.\n"
-                    "- Continue using the primary keyword as usual alongside the synonyms.\n"
-                    "Acknowledge only."
-                ),
-            },
-            {
-                "role": "developer",
-                "content": (
-                    "### HTML Formatting Guidelines:\n"
-                    "- Use <strong> for bold emphasis.\n"
-                    "- Use <em> for italic emphasis.\n"
-                    "- Use <blockquote> for quotes or cited statements.\n"
-                    "- Use <ul>/<ol> and <li> for bullet and numbered lists.\n"
-                    "- Use <table>, <tr>, <th>, <td> where it helps organize information clearly.\n"
-                    "- Use <mark> to highlight key terms if needed.\n"
-                    "- Maintain consistent semantic HTML formatting throughout the article.\n\n"
-                    "### Important Rule:\n"
-                    '- **Do NOT include any FAQs in the main HTML content.** All FAQ questions and answers must appear only in the JSON block under "faqs".\n\n'
-                    "When generating the article on [FINAL], follow these HTML guidelines along with the JSON structure requirements."
-                ),
-            },
-            {
-                "role": "user",
-                "content": (
-                    "[FINAL]\n"
-                    "Now generate a complete 1500-word Persian blog post optimized for Yoast SEO.\n\n"
-                    "### Structure:\n"
-                    "• **Title:** Compelling, SEO-friendly title including the primary keyword near the start.\n"
-                    "• **Summary paragraph:** 1 short paragraph summarizing the article.\n"
-                    "• **Introduction (~100 words)** introducing the topic naturally.\n"
-                    "• **12 main headings (H2)** with 2–3 subheadings (H3) under relevant sections.\n"
-                    "• Short paragraphs (≤3 lines), clear sentences, and transition words (مثل «از طرفی»، «در نتیجه»، «به طور کلی»).\n"
-                    "• **Conclusion:** A concise wrap-up paragraph.\n"
-                    "• Use HTML formatting as described in the previous guidelines where appropriate (bold, italic, blockquotes, lists, tables, and highlights).\n\n"
-                    "### HTML Guidelines:\n"
-                    "- Follow the HTML formatting rules from the previous guidelines.\n"
-                    '- **Do NOT include any FAQs in the main HTML content.** All FAQ questions and answers must appear only in the JSON block under "faqs".\n\n'
-                    "### SEO Guidelines:\n"
-                    "- Include the primary keyword naturally in the title, first paragraph, meta description, and several times in the text.\n"
-                    "- Maintain a natural flow — avoid keyword stuffing.\n"
-                    "- Add internal and external links naturally where relevant.\n"
-                    "- Use informative, keyword-rich headings.\n"
-                    "- Keep readability high (simple, clear language).\n\n"
-                    "### JSON Output:\n"
-                    "Follow the schema described above. Output only HTML followed by JSON, nothing else."
-                ),
-            },
+            "Related internal blog articles (for internal linking):\n"
+            f"{self.related_articles}\n\n"
+            "Acknowledge only; do not generate article content yet.",
+            FINAL_PROMPT,
         ]
         for i, message in enumerate(messages):
-            print(f"Message {i}")
+            log.debug("message %d of %d", i + 1, len(messages))
+            # every message before [FINAL] only needs an acknowledgement
             await self._get_text_response(
-                input=[{"role": message["role"], "content": message["content"]}],
+                input=[{"role": "user", "content": message}],
+                call_type="generation" if i == len(messages) - 1 else "context",
             )
-        print(self.current_response.output_text)
         await self.separate_json(self.current_response.output_text)
 
         return self.json_output, self.html_output
 
     async def improve_article(
-        self, title: str, yoast_info: list[dict]
+        self, title: str, yoast_info: list[dict], stateless: bool = False
+    ) -> tuple[dict, str]:
+        if not stateless and self._needs_compaction():
+            await self.compact_conversation()
+        context = (
+            f"Title: {title}\n"
+            f"Primary Keyword/Keyphrase: {self.keyword}\n"
+            f"Synonyms: {self.json_output.get('synonyms', [])}\n\n"
+            f"Yoast analysis feedback:\n{yoast_info}\n\n"
+            "Full article HTML:\n"
+            f"{self.html_output}\n\n"
+            "Original JSON data (for reference):\n"
+            f"{self.json_output}"
+        )
+        if stateless:
+            # the related articles are otherwise only known to the conversation
+            context += (
+                "\n\nRelated internal blog articles (for internal linking):\n"
+                f"{self.related_articles}"
+            )
+        input_prompt = [
+            {"role": "developer", "content": IMPROVEMENT_INSTRUCTIONS},
+            {"role": "user", "content": context},
+        ]
+
+        await self._get_text_response(
+            input_prompt,
+            call_type="improvement",
+            stateless=stateless,
+            cache_key=(
+                prompt_cache_key("improvement", IMPROVEMENT_INSTRUCTIONS)
+                if stateless
+                else None
+            ),
+        )
+        await self.separate_json(
+            text=self.current_response.output_text, stateless=stateless
+        )
+
+        return self.json_output, self.html_output
+
+    async def improve_article_blocks(
+        self, title: str, yoast_info: list[dict], stateless: bool = False
     ) -> tuple[dict, str]:
+        if not stateless and self._needs_compaction():
+            await self.compact_conversation()
+        flagged, local_issues, fields, unresolved = locate_flagged_blocks(
+            self.html_output, yoast_info
+        )
+        if not flagged and not fields:
+            # nothing can be localized (e.g. keyword density), rewrite the article
+            log.info("no localizable issues, falling back to full improvement")
+            return await self.improve_article(
+                title=title, yoast_info=yoast_info, stateless=stateless
+            )
+
+        blocks = [{"id": bid, "html": flagged[bid]["html"]} for bid in sorted(flagged)]
+        current_fields = {name: self.json_output.get(name, "") for name in fields}
         input_prompt = [
+            {"role": "developer", "content": PATCH_INSTRUCTIONS},
             {
                 "role": "user",
                 "content": (
-                    "IMPORTANT: Do not include explanations, suggestions, or commentary. "
-                    "Only return the improved HTML and JSON in the specified format.\n\n"
-                    "You are an expert Persian SEO assistant and editor. "
-                    "Your task is to improve an existing article using the feedback from Yoast SEO analysis.\n\n"
-                    "### Yoast analysis fields:\n"
-                    "- '_identifier': the issue type (e.g., 'sentenceBeginnings', 'subheadingsKeyword', 'metaDescription').\n"
-                    "- 'text': human-readable description of the issue.\n"
-                    "- 'rating': severity ('good', 'ok', 'bad').\n"
-                    "- 'problemSentences': list of exact sentences that violate the rule (if available), "
-                    "each entry containing 'fullSentence' and 'firstWord'.\n"
-                    "For 'subheadingsKeyword', treat all <h2> and <h3> headings as problem sentences. "
-                    "Rephrase only the sentences listed in 'problemSentences' minimally to fix the issue.\n\n"
-                    "### Yoast quantitative guidance:\n"
-                    "- **Keyword density:** 0.5%–3% of total words (adjust body text only).\n"
-                    "- **Meta description:** 120–156 characters, must include the primary keyword.\n"
-                    "- **Subheadings with keyword:** 30–75% of H2/H3 should include the primary keyword.\n"
-                    "- **Consecutive sentences starting with the same word:** No more than 2 consecutive sentences starting with the same word.\n"
-                    "- **Sentence length:** Prefer sentences under 20 words.\n"
-                    "- **Transition words:** ≥30% of sentences.\n"
-                    "- **Passive voice:** <10% of sentences.\n"
-                    "- **Paragraph length:** ≤150 words per paragraph.\n\n"
-                    "### Instructions for improvement:\n"
-                    "- Apply the **smallest possible edits** to resolve each Yoast issue.\n"
-                    "- Do NOT rewrite large portions unless absolutely necessary.\n"
-                    "- Preserve previously correct optimizations.\n"
-                    "- Only modify sections directly related to the issues provided.\n"
-                    "- When adjusting ranges (keyword density, subheading coverage), move slightly toward the target without overcompensating.\n"
-                    "- Keep tone, topic, structure, headings, and tags/categories unchanged unless absolutely necessary.\n"
-                    "- Track adjustments to avoid repeatedly editing the same sentence or heading.\n"
-                    "- Attempt only **one adjustment cycle per issue** per pass.\n\n"
-                    "### Actionable fixes for common Yoast issues:\n"
-                    "- **Consecutive sentence beginnings:** Rephrase only the 2nd and 3rd sentences in sequences of 3+ using slight restructuring. Fully rewrite only if needed.\n"
-                    "- **Keyword density:** Adjust only body text, not subheadings. Add or remove minimal occurrences of the primary keyword **or any of its synonyms** (from the 'synonyms' list in the JSON) to reach 0.5–3%. Avoid overcorrection.\n"
-                    "- **SubheadingsKeyword:** For each <h2>/<h3> heading listed in 'problemSentences':\n"
-                    "  • Check if the primary keyword or any of its synonyms are present.\n"
-                    "  • If missing, **first try to insert a synonym naturally** in the heading. Only use the primary keyword if no suitable synonym fits.\n"
-                    "  • If the heading contains too many occurrences of the keyword or synonyms, remove extras.\n"
-                    "  • Apply minimal edits but **ensure that after editing Yoast would no longer mark it as a problem**.\n"
-                    "- **Meta description:** Only adjust if Yoast flagged it as too short or too long. If flagged, adjust to 120–156 characters including the primary keyword naturally. Do not modify otherwise.\n"
-                    "- **Sentence length:** Split sentences >20 words while keeping meaning.\n"
-                    "- **Transition words / readability:** Add in underrepresented sentences.\n"
-                    "- **Passive voice:** Rewrite to active where necessary.\n"
-                    "- **Paragraphs too long:** Split >150 words into shorter paragraphs.\n"
-                    "- **Internal links:** Use provided related articles (title, first_paragraphs, categories, tags) naturally. Limit 2–5 internal links per article.\n\n"
-                    "### Conflict resolution priority:\n"
-                    "- If subheadingsKeyword and keyword density conflict, prioritize maintaining subheading coverage.\n"
-                    "- Adjust body text first for density before touching subheadings.\n\n"
-                    "### Context:\n"
                     f"Title: {title}\n"
                     f"Primary Keyword/Keyphrase: {self.keyword}\n"
                     f"Synonyms: {self.json_output.get('synonyms', [])}\n\n"
-                    f"Yoast analysis feedback:\n{yoast_info}\n\n"
-                    "Full article HTML:\n"
-                    f"{self.html_output}\n\n"
-                    "Original JSON data (for reference):\n"
-                    f"{self.json_output}\n\n"
-                    "### Output requirements:\n"
-                    "1. Return **improved article as clean HTML** only — no <html>, <head>, or <body> tags.\n"
-                    "2. Wrap content in a single <div lang='fa' dir='rtl'> ... </div>\n"
-                    "3. Use only structural tags (<h1>, <h2>, <h3>, <p>, <ul>, <ol>, <a>, <img>, etc.)\n"
-                    "4. Do NOT add inline styles, CSS classes, or custom attributes.\n"
-                    "5. Append a **valid JSON block** after the HTML with:\n"
-                    '   - "title": improved SEO title (if relevant)\n'
-                    '   - "categories": [list of relevant categories]\n'
-                    '   - "tags": [list of 5 relevant tags]\n'
-                    '   - "faqs": [3 objects {"question","answer"}]\n'
-                    '   - "meta": meta description (≤160 chars, must include the Primary Keyword, only edit if flagged by Yoast)\n'
-                    '   - "sources": list of objects with "title" and "link" for every source referenced\n'
-                    '   - "synonyms": [list of relevant synonyms]\n\n'
-                    "### Self-check:\n"
-                    "- Verify each Yoast issue is actually resolved.\n"
-                    "- Consecutive sentence beginnings ≤2 per sequence.\n"
-                    "- Keyword density 0.5–3%, using primary keyword and/or synonyms; subheadingsKeyword fixed as per problemSentences.\n"
-                    "- Meta description only changed if flagged, otherwise unchanged.\n"
-                    "- Sentence lengths, transition words, passive voice, paragraph lengths within thresholds.\n"
-                    "- Only return final HTML and JSON when all adjustments are within range.\n\n"
-                    "Ensure format is identical to original generation for correct parsing."
+                    f"issues:\n{json.dumps(local_issues, ensure_ascii=False)}\n\n"
+                    f"blocks:\n{json.dumps(blocks, ensure_ascii=False)}\n\n"
+                    f"fields:\n{json.dumps(current_fields, ensure_ascii=False)}"
                 ),
-            }
+            },
         ]
+        log.info(
+            "patching %d block(s) and %d field(s), %d issue(s) left for later passes",
+            len(blocks),
+            len(fields),
+            len(unresolved),
+        )
 
-        await self._get_text_response(input_prompt)
-        await self.separate_json(text=self.current_response.output_text)
+        await self._get_text_response(
+            input_prompt,
+            call_type="improvement" if flagged else "metadata_edit",
+            stateless=True,
+            cache_key=prompt_cache_key("patch", PATCH_INSTRUCTIONS),
+        )
+        self.apply_patch_response(self.current_response.output_text, fields)
 
         return self.json_output, self.html_output
 
-    async def separate_json(self, text: str, max_fixes: int = 3):
-        print("trying to separate")
+    def apply_patch_response(self, text: str, allowed_fields: list[str]) -> None:
+        match = re.search(r"\{[\s\S]*\}", text)
+        try:
+            patch = json.loads(match.group()) if match else {}
+        except json.JSONDecodeError:
+            log.warning("patch response is not valid JSON: %s", Truncated(text))
+            patch = {}
+        if not isinstance(patch, dict):
+            patch = {}
+
+        patches = patch.get("blocks", [])
+        if isinstance(patches, list):
+            self.html_output = apply_block_patches(self.html_output, patches)
+
+        new_fields = patch.get("fields", {})
+        if isinstance(new_fields, dict):
+            json_output = dict(self.json_output)
+            for name, value in new_fields.items():
+                if name in allowed_fields and isinstance(value, str) and value:
+                    json_output[name] = value
+            self.json_output = json_output
+
+    async def separate_json(
+        self, text: str, max_fixes: int = 3, stateless: bool = False
+    ):
         conversation_id = self.conversation_id
 
         match = re.search(r"\{[\s\S]*\}", text)
         if match:
-            print("initial: theres a match")
             html_output = text[: match.start()].strip()
             json_text = match.group()
         else:
-            print("initial: no match found")
+            log.warning("no JSON block in the response")
             html_output = text.strip()
             json_text = "{}"
 
         try:
             json_output = json.loads(json_text)
         except json.JSONDecodeError:
-            print("initial: json decode error")
+            log.warning("JSON block of the response does not parse")
             json_output = {}
 
         for attempt in range(1, max_fixes + 1):
@@ -354,12 +801,12 @@ class OpenAi:
             issues = validate_post_json(json_output)
 
             if not issues:
-                print(f"JSON validated successfully after {attempt} attempt(s)")
+                log.debug("JSON validated after %d attempt(s)", attempt)
                 self.json_output = json_output
                 self.html_output = html_output
                 return
 
-            print(f"Attempt {attempt}: JSON has issues -> {issues}")
+            log.warning("attempt %d: JSON has issues %s", attempt, issues)
             missing_keys = ", ".join(issues)
             fix_message = (
                 f"The JSON you provided is missing or invalid in the following fields: {missing_keys}.\n"
@@ -368,18 +815,28 @@ class OpenAi:
                 "Reminder: JSON format should include keys: title, slug, categories, tags, faqs, meta, and sources."
             )
 
+            fix_input = [{"role": "user", "content": fix_message}]
+            if stateless:
+                # no conversation to look back at, send the JSON along
+                fix_input.insert(
+                    0,
+                    {
+                        "role": "assistant",
+                        "content": json.dumps(json_output, ensure_ascii=False),
+                    },
+                )
             try:
                 await self._get_text_response(
-                    [{"role": "user", "content": fix_message}]
+                    fix_input, call_type="json_repair", stateless=stateless
                 )
                 response_text = self.current_response.output_text.strip()
                 try:
                     json_output = json.loads(response_text)
                 except json.JSONDecodeError:
-                    print("json decode error in fix attempt")
+                    log.warning("JSON fix does not parse")
                     json_output = {}
             except Exception as e:
-                print("Error while requesting fix:", e)
+                log.error("requesting a JSON fix failed: %s", e)
                 break
 
         # --- Final fallback after all attempts ---
@@ -398,7 +855,7 @@ class OpenAi:
             if key not in json_output:
                 json_output[key] = value
 
-        print("Could not get a valid JSON after several attempts.")
+        log.error("no valid JSON after %d attempts, filling in defaults", max_fixes)
         self.json_output = json_output
         self.html_output = html_output
 
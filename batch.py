@@ -0,0 +1,282 @@
+import argparse
+import asyncio
+import logging
+import time
+from typing import TYPE_CHECKING, Any
+from aibot import create_openai_client
+from config import Settings, load_settings, setup_logging, validate_environment
+from hedging import Hedger
+from link_check import LinkChecker
+from main import create_analyzer, create_client, create_resilience
+from models import PostData, SiteInfo, StopPolicy
+from rate_limit import RateLimiter
+from resilience import Resilience
+from scrape import Scrape
+from wordpress import WordPressClient
+from state_store import StateStore
+from site_index import SiteIndex
+import tracing
+from workflow import run_pipeline
+from yoast import YoastPool
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
+log = logging.getLogger(__name__)
+
+STAGES = ("scrape", "generate", "optimize", "links", "publish")
+
+
+def read_keyphrases(path: str) -> list[str]:
+    with open(path, "r", encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+async def run_keyphrase(
+    settings: Settings,
+    keyphrase: str,
+    site_info: SiteInfo,
+    wordpress: WordPressClient,
+    scraper: Scrape,
+    related_articles: list[dict],
+    rate_limiter: RateLimiter,
+    hedger: Hedger,
+    store: StateStore,
+    publish: bool = True,
+    link_checker: LinkChecker | None = None,
+    openai_client: "AsyncOpenAI | None" = None,
+    yoast_pool: YoastPool | None = None,
+    timings: dict[str, float] | None = None,
+) -> dict[str, Any]:
+    """Run the pipeline for one keyphrase; timings fills in as stages finish."""
+    timings = {} if timings is None else timings
+    summary: dict[str, Any] = {"keyphrase": keyphrase}
+    started = time.perf_counter()
+    try:
+        # cached by the client, fetched again once older than TAXONOMY_TTL, so
+        # terms created during a long batch or worker run are picked up
+        site_info.all_tags, site_info.all_categories = await asyncio.gather(
+            wordpress.get_tags(), wordpress.get_categories()
+        )
+        client = create_client(
+            settings,
+            keyphrase,
+            site_info,
+            related_articles,
+            rate_limiter,
+            hedger,
+            openai_client,
+        )
+        summary = await run_pipeline(
+            PostData(keyphrase=keyphrase),
+            site_info,
+            scraper,
+            client,
+            create_analyzer(yoast_pool),
+            wordpress,
+            store,
+            StopPolicy(interactive=False),
+            edit_mode=settings.improve_mode,
+            publish=publish,
+            timings=timings,
+            link_checker=link_checker,
+        )
+        summary["status"] = "done"
+    except Exception as e:
+        log.error("%s failed: %s", keyphrase, e)
+        summary["status"] = "failed"
+        summary["error"] = str(e)
+    summary["timings"] = timings
+    summary["total"] = time.perf_counter() - started
+    return summary
+
+
+def print_summary(results: list[dict[str, Any]], elapsed: float) -> None:
+    header = f"{'keyphrase':<40} {'status':<8}" + "".join(
+        f" {stage:>9}" for stage in STAGES
+    )
+    print(header + f" {'total':>9}")
+    for result in results:
+        row = f"{result['keyphrase'][:40]:<40} {result['status']:<8}"
+        for stage in STAGES:
+            value = result["timings"].get(stage)
+            row += f" {value:>8.1f}s" if value is not None else f" {'-':>9}"
+        print(row + f" {result['total']:>8.1f}s")
+    done = sum(1 for result in results if result["status"] == "done")
+    print(f"{done}/{len(results)} keyphrases done in {elapsed:.1f}s")
+
+
+class KeyphraseRunner:
+    """Clients and site data shared by every keyphrase of one site.
+
+    The scraper, OpenAI scheduler and client, hedger, link checker and Yoast
+    pool can be passed in to share them (and their caches) between the runners
+    of several sites.
+    """
+
+    def __init__(
+        self,
+        settings: Settings,
+        site_info: SiteInfo,
+        publish: bool = True,
+        site: str = "",
+        related_article_data: list[int | str] | None = None,
+        scraper: Scrape | None = None,
+        rate_limiter: RateLimiter | None = None,
+        hedger: Hedger | None = None,
+        link_checker: LinkChecker | None = None,
+        resilience: Resilience | None = None,
+        max_connections: int = 8,
+        openai_client: "AsyncOpenAI | None" = None,
+        yoast_pool: YoastPool | None = None,
+    ) -> None:
+        self.settings: Settings = settings
+        self.site_info: SiteInfo = site_info
+        self.publish: bool = publish
+        self.site: str = site
+        self.related_article_data: list[int | str] = (
+            settings.related_article_data
+            if related_article_data is None
+            else related_article_data
+        )
+        self.resilience = resilience or create_resilience(settings)
+        self.wordpress = WordPressClient(
+            username=site_info.wp_api_user,
+            password=site_info.wp_api_pass,
+            site_url=site_info.site_url,
+            max_connections=max_connections,
+            resilience=self.resilience,
+            taxonomy_ttl=settings.taxonomy_ttl,
+        )
+        self.scraper = scraper or Scrape(
+            google_api_key=settings.google_api,
+            google_cse_id=settings.google_cse,
+            resilience=self.resilience,
+        )
+        self.rate_limiter = rate_limiter or RateLimiter(
+            requests_per_minute=settings.openai_rpm,
+            tokens_per_minute=settings.openai_tpm,
+        )
+        self.hedger = hedger or Hedger(
+            percentile=settings.hedge_percentile, max_ratio=settings.hedge_max_ratio
+        )
+        self.store = StateStore(settings.state_db, site=site)
+        self.site_index = SiteIndex(settings.state_db, site_info.site_url)
+        self.link_checker = link_checker or LinkChecker(self.store, settings.link_check)
+        self.use_index: bool = (
+            not self.related_article_data and settings.related_count > 0
+        )
+        self.related_articles: list[dict] = []
+        self.openai_client: "AsyncOpenAI | None" = openai_client
+        self.yoast_pool: YoastPool | None = yoast_pool
+
+    async def prepare(self) -> None:
+        (
+            self.site_info.all_tags,
+            self.site_info.all_categories,
+            self.related_articles,
+            _,
+        ) = await asyncio.gather(
+            self.wordpress.get_tags(),
+            self.wordpress.get_categories(),
+            self.wordpress.get_posts_info(self.related_article_data),
+            (
+                self.site_index.sync(self.wordpress)
+                if self.use_index
+                else asyncio.sleep(0)
+            ),
+        )
+
+    async def run(
+        self, keyphrase: str, timings: dict[str, float] | None = None
+    ) -> dict[str, Any]:
+        related = (
+            await self.site_index.related_articles(
+                keyphrase,
+                self.site_info.all_categories,
+                self.site_info.all_tags,
+                self.settings.related_count,
+            )
+            if self.use_index
+            else self.related_articles
+        )
+        return await run_keyphrase(
+            self.settings,
+            keyphrase,
+            self.site_info,
+            self.wordpress,
+            self.scraper,
+            related,
+            self.rate_limiter,
+            self.hedger,
+            self.store,
+            self.publish,
+            self.link_checker,
+            self.openai_client,
+            self.yoast_pool,
+            timings,
+        )
+
+    async def close(self) -> None:
+        await self.wordpress.close()
+        await self.link_checker.close()
+
+
+async def main(keyphrases: list[str], concurrency: int, publish: bool = True) -> None:
+    settings = load_settings()
+    setup_logging(settings)
+    tracer = tracing.configure(settings.trace_file)
+    site_info: SiteInfo = SiteInfo()
+    validate_environment(settings, site_info)
+    if not keyphrases:
+        raise RuntimeError("No keyphrases given")
+    keyphrases = list(dict.fromkeys(keyphrases))
+
+    started = time.perf_counter()
+    # one SDK client and one pool of Yoast processes for every keyphrase
+    openai_client, _ = create_openai_client(
+        settings.api_key, settings.llm_cache_mode, settings.llm_cache_dir
+    )
+    yoast_pool = YoastPool(settings.yoast_workers)
+    runner = KeyphraseRunner(
+        settings,
+        site_info,
+        publish,
+        openai_client=openai_client,
+        yoast_pool=yoast_pool,
+    )
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def bounded(keyphrase: str) -> dict[str, Any]:
+        async with semaphore:
+            return await runner.run(keyphrase)
+
+    try:
+        await runner.prepare()
+        results = await asyncio.gather(
+            *(bounded(keyphrase) for keyphrase in keyphrases)
+        )
+    finally:
+        await runner.close()
+        await openai_client.close()
+        await asyncio.to_thread(yoast_pool.close)
+    print_summary(list(results), time.perf_counter() - started)
+    print(f"http: {runner.resilience.metrics()}")
+    if tracer.enabled:
+        tracing.print_report(tracer.summary())
+        tracer.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate posts for many keyphrases")
+    parser.add_argument("keyphrases", nargs="*", help="keyphrases to generate")
+    parser.add_argument("-f", "--file", help="file with one keyphrase per line")
+    parser.add_argument("-c", "--concurrency", type=int, default=4)
+    parser.add_argument(
+        "--no-publish", action="store_true", help="skip creating the WordPress posts"
+    )
+    args = parser.parse_args()
+    keyphrases: list[str] = list(args.keyphrases)
+    if args.file:
+        keyphrases += read_keyphrases(args.file)
+    asyncio.run(main(keyphrases, args.concurrency, publish=not args.no_publish))
@@ -0,0 +1,79 @@
+"""Measure the startup cost of the entry points with `python -X importtime`.
+
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --module batch --budget-ms 150 --runs 5
+
+Prints the median cumulative import time of each module and the heaviest
+imports it pulls in, and exits with status 1 when a module is over budget.
+"""
+
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LINE_PATTERN = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+
+def measure(module: str) -> dict[str, int]:
+    """Return the cumulative import time in microseconds of every imported module."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"importing {module} failed:\n{proc.stderr}")
+    cumulative: dict[str, int] = {}
+    for line in proc.stderr.splitlines():
+        match = LINE_PATTERN.match(line)
+        if match:
+            cumulative[match.group(4)] = int(match.group(2))
+    return cumulative
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="import time benchmark")
+    parser.add_argument("--module", action="append", help="module to import")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--budget-ms", type=float, default=0)
+    parser.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args()
+    modules: list[str] = args.module or ["main", "batch"]
+
+    results: dict[str, dict] = {}
+    over_budget = False
+    for module in modules:
+        runs = [measure(module) for _ in range(args.runs)]
+        total_ms = statistics.median(run[module] for run in runs) / 1000
+        heaviest = sorted(
+            ((name, us) for name, us in runs[-1].items() if name != module),
+            key=lambda item: item[1],
+            reverse=True,
+        )[: args.top]
+        results[module] = {
+            "median_ms": round(total_ms, 2),
+            "heaviest": {name: round(us / 1000, 2) for name, us in heaviest},
+        }
+        status = ""
+        if args.budget_ms and total_ms > args.budget_ms:
+            status = f"  OVER BUDGET ({args.budget_ms:.0f} ms)"
+            over_budget = True
+        print(f"{module}: {total_ms:.1f} ms{status}")
+        for name, us in heaviest:
+            print(f"    {name:<40} {us / 1000:>8.1f} ms")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    sys.exit(1 if over_budget else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,276 @@
+"""Regenerate the checked-in benchmark fixtures in benchmarks/fixtures.
+
+    python benchmarks/make_fixtures.py
+
+Everything is generated from a fixed seed so the fixtures only change when
+this script does. The Yoast outputs come from yoast_seo.js when node can load
+yoastseo; otherwise they are synthesized in the same shape (identifier, score,
+rating, text and marks with start/end offsets into the article).
+"""
+
+import json
+import os
+import random
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES = os.path.join(ROOT, "benchmarks", "fixtures")
+sys.path.insert(0, ROOT)
+
+from title_width import title_width
+
+KEYPHRASE = "قهوه دمی"
+
+WORDS = (
+    "قهوه دانه آسیاب دم آب دما فنجان طعم عطر تلخی اسیدیته برشته کافئین "
+    "روش دستگاه فیلتر اسپرسو شیر کف نوشیدنی صبح انرژی سلامت مصرف روز "
+    "کیفیت تازه نگهداری ظرف هوا نور رطوبت خرید بازار قیمت برند مزرعه "
+    "کشاورز ارتفاع خاک باران برداشت فرآوری شستشو خشک تخمیر رست سبک "
+    "متوسط تیره روشن زمان دقیقه ثانیه گرم سرد یخ شکر عسل دارچین هل "
+    "کاربر مهمان کافه خانه دفتر سفر تجربه سلیقه پیشنهاد راهنما نکته"
+).split()
+TRANSITIONS = ["از طرفی", "در نتیجه", "به طور کلی", "همچنین", "بنابراین", "با این حال"]
+ASSESSMENTS = [
+    ("seo", "keyphraseDensity", "Keyphrase density"),
+    ("seo", "metaDescriptionKeyword", "Keyphrase in meta description"),
+    ("seo", "titleWidth", "SEO title width"),
+    ("seo", "subheadingsKeyword", "Keyphrase in subheading"),
+    ("seo", "keyphraseDistribution", "Keyphrase distribution"),
+    ("seo", "images", "Images"),
+    ("seo", "slugKeyword", "Keyphrase in slug"),
+    ("readability", "sentenceLength", "Sentence length"),
+    ("readability", "transitionWords", "Transition words"),
+    ("readability", "passiveVoice", "Passive voice"),
+    ("readability", "sentenceBeginnings", "Consecutive sentences"),
+    ("readability", "paragraphLength", "Paragraph length"),
+    ("readability", "textPresence", "Not enough content"),
+    ("relatedKeyword", "keyphraseInSEOTitle", "Keyphrase in SEO title"),
+    ("inclusiveLanguage", "inclusiveLanguage", "Inclusive language"),
+]
+
+
+def sentence(rng: random.Random, keyword: bool = False) -> str:
+    words: list[str] = rng.choices(WORDS, k=rng.randint(8, 26))
+    if keyword:
+        words.insert(rng.randint(0, len(words)), KEYPHRASE)
+    if rng.random() < 0.3:
+        words.insert(0, rng.choice(TRANSITIONS))
+    return " ".join(words) + "."
+
+
+def paragraph(rng: random.Random, keyword_rate: float = 0.15) -> str:
+    return " ".join(
+        sentence(rng, rng.random() < keyword_rate) for _ in range(rng.randint(2, 5))
+    )
+
+
+def article(rng: random.Random, words: int) -> str:
+    parts = [f"<div lang='fa' dir='rtl'><h1>راهنمای کامل {KEYPHRASE}</h1>"]
+    parts.append(f"<p>{paragraph(rng, 0.5)}</p>")
+    count = 0
+    section = 0
+    while count < words:
+        section += 1
+        heading = " ".join(rng.choices(WORDS, k=3))
+        if rng.random() < 0.5:
+            heading = f"{KEYPHRASE} {heading}"
+        parts.append(f"<h2>{heading}</h2>")
+        for _ in range(rng.randint(2, 4)):
+            text = paragraph(rng)
+            count += len(text.split())
+            parts.append(f"<p>{text}</p>")
+        if section % 3 == 0:
+            items = "".join(f"<li>{sentence(rng)}</li>" for _ in range(4))
+            parts.append(f"<ul>{items}</ul>")
+        if section % 5 == 0:
+            parts.append(f"<h3>{' '.join(rng.choices(WORDS, k=3))}</h3>")
+            parts.append(f"<blockquote>{sentence(rng)}</blockquote>")
+        if section % 7 == 0:
+            rows = "".join(
+                f"<tr><td>{rng.choice(WORDS)}</td><td>{rng.randint(1, 99)}</td></tr>"
+                for _ in range(5)
+            )
+            parts.append(f"<table><tr><th>نام</th><th>مقدار</th></tr>{rows}</table>")
+    parts.append("</div>")
+    return "".join(parts)
+
+
+def competitor_page(rng: random.Random, index: int) -> str:
+    menu = "".join(
+        f"<li><a href='https://competitor{index}.example/{rng.choice(WORDS)}'>"
+        f"{rng.choice(WORDS)}</a></li>"
+        for _ in range(40)
+    )
+    sidebar = "".join(
+        f"<div class='widget'><h4>{rng.choice(WORDS)}</h4><p>{sentence(rng)}</p></div>"
+        for _ in range(15)
+    )
+    comments = "".join(
+        f"<div class='comment'><span class='author'>{rng.choice(WORDS)}</span>"
+        f"<p>{sentence(rng)}</p></div>"
+        for _ in range(25)
+    )
+    body = article(rng, rng.randint(1200, 2500))
+    body = body.replace(
+        "</h2>",
+        f"</h2><img src='https://competitor{index}.example/img/{rng.randint(1, 999)}.jpg' "
+        f"alt='{KEYPHRASE}'>",
+        3,
+    )
+    return (
+        "<!DOCTYPE html><html lang='fa' dir='rtl'><head><meta charset='utf-8'>"
+        f"<title>{KEYPHRASE} | سایت نمونه {index}</title>"
+        + "".join(
+            f"<script src='https://cdn.example/lib{i}.js'></script>" for i in range(12)
+        )
+        + "<style>"
+        + "".join(f".c{i}{{margin:{i}px}}" for i in range(300))
+        + "</style></head><body>"
+        f"<header><nav><ul>{menu}</ul></nav></header>"
+        f"<main><article>{body}</article><section class='comments'>{comments}</section></main>"
+        f"<aside>{sidebar}</aside>"
+        "<footer><p>تمامی حقوق محفوظ است.</p>"
+        "<script>window.dataLayer=window.dataLayer||[];</script></footer>"
+        "</body></html>"
+    )
+
+
+def taxonomy(rng: random.Random, kind: str, count: int) -> list[dict]:
+    names: set[str] = set()
+    while len(names) < count:
+        names.add(" ".join(rng.choices(WORDS, k=rng.randint(1, 3))))
+    return [
+        {
+            "id": 1000 + i,
+            "count": rng.randint(0, 120),
+            "description": "",
+            "link": f"https://site.example/{kind}/{1000 + i}/",
+            "name": name,
+            "slug": f"{kind}-{1000 + i}",
+            "taxonomy": "category" if kind == "category" else "post_tag",
+            "parent": 0,
+        }
+        for i, name in enumerate(sorted(names))
+    ]
+
+
+def sentence_marks(html: str, rng: random.Random, count: int) -> list[dict]:
+    marks = []
+    starts = [i + 3 for i in range(len(html)) if html.startswith("<p>", i)]
+    for start in rng.sample(starts, min(count, len(starts))):
+        end = html.find(".", start)
+        marks.append(
+            {
+                "_properties": {
+                    "position": {"startOffset": start, "endOffset": end + 1},
+                    "marked": "",
+                    "original": "",
+                }
+            }
+        )
+    return sorted(marks, key=lambda m: m["_properties"]["position"]["startOffset"])
+
+
+def synthetic_yoast(html: str, rng: random.Random) -> dict[str, list[dict]]:
+    output: dict[str, list[dict]] = {}
+    paragraphs = html.count("<p>")
+    for group, identifier, label in ASSESSMENTS:
+        score = rng.choice([3, 3, 6, 6, 9])
+        marks = (
+            sentence_marks(html, rng, max(1, paragraphs // 4))
+            if identifier
+            in (
+                "sentenceLength",
+                "passiveVoice",
+                "sentenceBeginnings",
+                "transitionWords",
+            )
+            else []
+        )
+        output.setdefault(group, []).append(
+            {
+                "_identifier": identifier,
+                "score": score,
+                "text": f"<a href='https://yoa.st/x'>{label}</a>: sample feedback.",
+                "marks": marks,
+                "editFieldName": "",
+                "rating": "bad" if score <= 4 else "ok" if score <= 7 else "good",
+            }
+        )
+    return output
+
+
+def yoast_output(html: str, post: dict, rng: random.Random) -> dict[str, list[dict]]:
+    payload = {
+        "keyword": KEYPHRASE,
+        "synonyms": ", ".join(post["synonyms"]),
+        "title": post["title"],
+        "titleWidth": title_width(post["title"]),
+        "metaDescription": post["meta"],
+        "slug": post["slug"],
+        "text": html,
+        "locale": "fa",
+        "permalink": "https://site.example/",
+    }
+    try:
+        proc = subprocess.run(
+            ["node", "yoast_seo.js"],
+            cwd=ROOT,
+            input=json.dumps(payload).encode(),
+            capture_output=True,
+        )
+        if proc.returncode == 0:
+            return json.loads(proc.stdout)
+    except FileNotFoundError:
+        pass
+    return synthetic_yoast(html, rng)
+
+
+def write(path: str, data) -> None:
+    full_path = os.path.join(FIXTURES, path)
+    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+    with open(full_path, "w", encoding="utf-8") as f:
+        if isinstance(data, str):
+            f.write(data)
+        else:
+            json.dump(data, f, ensure_ascii=False)
+
+
+def main() -> None:
+    rng = random.Random(1404)
+    for index in range(1, 4):
+        write(f"pages/competitor_{index}.html", competitor_page(rng, index))
+
+    categories = taxonomy(rng, "category", 300)
+    tags = taxonomy(rng, "tag", 2000)
+    write("wordpress/categories.json", categories)
+    write("wordpress/tags.json", tags)
+
+    post = {
+        "title": f"راهنمای کامل {KEYPHRASE}",
+        "slug": "pour-over-coffee-guide",
+        "categories": [c["name"] for c in rng.sample(categories, 3)],
+        "tags": [t["name"] for t in rng.sample(tags, 5)],
+        "faqs": [
+            {"question": sentence(rng, True), "answer": paragraph(rng)}
+            for _ in range(3)
+        ],
+        "meta": f"در این مقاله همه چیز درباره {KEYPHRASE} را به زبان ساده می‌خوانید.",
+        "sources": [
+            {"title": rng.choice(WORDS), "link": f"https://source{i}.example/"}
+            for i in range(4)
+        ],
+        "synonyms": ["قهوه فیلتری", "دم آوری قهوه", "قهوه پوراور"],
+        "conversation_id": "conv_benchmark",
+    }
+    write("post.json", post)
+
+    for words in (1500, 6000):
+        html = article(rng, words)
+        write(f"articles/article_{words}.html", html)
+        write(f"yoast/article_{words}.json", yoast_output(html, post, rng))
+
+
+if __name__ == "__main__":
+    main()
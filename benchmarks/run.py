@@ -0,0 +1,377 @@
+"""Offline benchmarks of the hot paths, run against benchmarks/fixtures.
+
+    python benchmarks/run.py --output before.json
+    python benchmarks/run.py --output after.json --compare before.json
+    python benchmarks/run.py --filter yoast --min-time 2
+
+Nothing touches the network. Results are written as JSON (one entry per
+benchmark and parameter set, times in milliseconds) so runs can be compared.
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Callable
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES = os.path.join(ROOT, "benchmarks", "fixtures")
+sys.path.insert(0, ROOT)
+
+from config import Settings, Truncated, setup_logging, stop_logging
+from models import PostData, PostJsonData, SiteInfo
+from scrape import extract_page_info
+from title_width import glyph_advances, load_table, title_width
+from wordpress import WordPressClient
+from yoast import Yoast, extract_problem_sentences, select_problems
+
+FILTERS = ["images", "imageKeyphrase", "slugKeyword"]
+
+
+def fixture(path: str) -> Any:
+    with open(os.path.join(FIXTURES, path), "r", encoding="utf-8") as f:
+        return json.load(f) if path.endswith(".json") else f.read()
+
+
+def measure(fn: Callable[[], Any], min_time: float, min_runs: int = 5) -> dict:
+    fn()  # warm up caches and lazy imports
+    times: list[float] = []
+    started = time.perf_counter()
+    while len(times) < min_runs or time.perf_counter() - started < min_time:
+        begin = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - begin) * 1000)
+    times.sort()
+    return {
+        "runs": len(times),
+        "median_ms": round(statistics.median(times), 4),
+        "p95_ms": round(times[int((len(times) - 1) * 0.95)], 4),
+        "min_ms": round(times[0], 4),
+    }
+
+
+def bench_scrape_extract(min_time: float) -> list[dict]:
+    pages = [fixture(f"pages/competitor_{i}.html") for i in range(1, 4)]
+    size = sum(len(page.encode()) for page in pages)
+    result = measure(lambda: [extract_page_info(page) for page in pages], min_time)
+    seconds = result["median_ms"] / 1000
+    result["pages_per_s"] = round(len(pages) / seconds, 2)
+    result["mb_per_s"] = round(size / seconds / 1024**2, 3)
+    return [{"name": "scrape.extract_page_info", "params": {"pages": 3}, **result}]
+
+
+def yoast_available() -> bool:
+    proc = subprocess.run(
+        ["node", "-e", "require.resolve('yoastseo')"], cwd=ROOT, capture_output=True
+    )
+    return proc.returncode == 0
+
+
+def bench_yoast(min_time: float) -> list[dict]:
+    post = fixture("post.json")
+    results = []
+    node = yoast_available()
+    for words in (1500, 6000):
+        html = fixture(f"articles/article_{words}.html")
+        output = fixture(f"yoast/article_{words}.json")
+        analyzer = Yoast(filters=FILTERS)
+
+        if node:
+            results.append(
+                {
+                    "name": "yoast.analyze",
+                    "params": {"words": words},
+                    **measure(
+                        lambda: analyzer.analyze(
+                            keyword="قهوه دمی",
+                            synonyms=", ".join(post["synonyms"]),
+                            title=post["title"],
+                            meta=post["meta"],
+                            slug=post["slug"],
+                            text=html,
+                            permalink="https://site.example/",
+                        ),
+                        min_time,
+                        min_runs=3,
+                    ),
+                }
+            )
+        else:
+            results.append(
+                {
+                    "name": "yoast.analyze",
+                    "params": {"words": words},
+                    "skipped": "node cannot load yoastseo",
+                }
+            )
+
+        # the python side of analyze and get_analysis on the saved node output
+        def analysis() -> None:
+            analyzer.text = html
+            analyzer._analysis = select_problems(output, FILTERS)
+            analyzer.get_analysis()
+
+        results.append(
+            {
+                "name": "yoast.get_analysis",
+                "params": {"words": words},
+                **measure(analysis, min_time),
+            }
+        )
+    return results
+
+
+def bench_problem_sentences(min_time: float) -> list[dict]:
+    html = fixture("articles/article_6000.html")
+    output = fixture("yoast/article_6000.json")
+    marks = [
+        mark
+        for group in output.values()
+        for item in group
+        for mark in item.get("marks", [])
+    ]
+    results = []
+    for copies in (1, 2, 4, 8):
+        text = html * copies
+        # every copy carries the same marks, shifted to its offset
+        scaled = [
+            {
+                "_properties": {
+                    "position": {
+                        "startOffset": mark["_properties"]["position"]["startOffset"]
+                        + copy * len(html),
+                        "endOffset": mark["_properties"]["position"]["endOffset"]
+                        + copy * len(html),
+                    }
+                }
+            }
+            for copy in range(copies)
+            for mark in marks
+        ]
+        results.append(
+            {
+                "name": "yoast.extract_problem_sentences",
+                "params": {"chars": len(text), "marks": len(scaled)},
+                **measure(lambda: extract_problem_sentences(text, scaled), min_time),
+            }
+        )
+    return results
+
+
+def scaled_taxonomy(items: list[dict], factor: int) -> dict[int, str]:
+    taxonomy: dict[int, str] = {}
+    for copy in range(factor):
+        suffix = f" {copy}" if copy else ""
+        for item in items:
+            taxonomy[item["id"] + copy * 100000] = item["name"] + suffix
+    return taxonomy
+
+
+def bench_from_json(min_time: float) -> list[dict]:
+    post = fixture("post.json")
+    categories = fixture("wordpress/categories.json")
+    tags = fixture("wordpress/tags.json")
+    results = []
+    for factor in (1, 5, 25):
+        site_info = SiteInfo(
+            all_tags=scaled_taxonomy(tags, factor),
+            all_categories=scaled_taxonomy(categories, factor),
+        )
+        results.append(
+            {
+                "name": "models.PostJsonData.from_json",
+                "params": {
+                    "categories": len(site_info.all_categories),
+                    "tags": len(site_info.all_tags),
+                },
+                **measure(lambda: PostJsonData.from_json(post, site_info), min_time),
+            }
+        )
+
+    # Arabic letters and a dropped word, resolved through the fuzzy fallback
+    variants = {
+        **post,
+        "tags": [tag.replace("ی", "ي").replace("ک", "ك") for tag in post["tags"]]
+        + [post["tags"][0] + " قهوه"],
+    }
+    site_info.fuzzy_taxonomy = True
+
+    def fuzzy() -> None:
+        PostJsonData.from_json(variants, site_info)
+
+    # the fallback warns about every replaced term
+    logging.getLogger("taxonomy").setLevel(logging.ERROR)
+
+    results.append(
+        {
+            "name": "models.PostJsonData.from_json",
+            "params": {
+                "categories": len(site_info.all_categories),
+                "tags": len(site_info.all_tags),
+                "fuzzy": True,
+            },
+            **measure(fuzzy, min_time),
+        }
+    )
+    return results
+
+
+def bench_post_payload(min_time: float) -> list[dict]:
+    post = fixture("post.json")
+    site_info = SiteInfo(
+        all_tags=scaled_taxonomy(fixture("wordpress/tags.json"), 1),
+        all_categories=scaled_taxonomy(fixture("wordpress/categories.json"), 1),
+    )
+    post_data = PostData(
+        keyphrase="قهوه دمی",
+        html=fixture("articles/article_6000.html"),
+        json=PostJsonData.from_json(post, site_info),
+    )
+    client = WordPressClient(username="", password="", site_url="https://site.example/")
+
+    def build() -> None:
+        client._build_post_payload(post_data)
+
+    return [
+        {
+            "name": "wordpress._build_post_payload",
+            "params": {"words": 6000},
+            **measure(build, min_time),
+        }
+    ]
+
+
+def bench_title_width(min_time: float) -> list[dict]:
+    title = fixture("post.json")["title"]
+    table = load_table()
+
+    def cached() -> None:
+        title_width(title)
+
+    def uncached() -> None:
+        sum(glyph_advances(title, table))
+
+    return [
+        {
+            "name": "title_width",
+            "params": {"chars": len(title), "cached": cached_run},
+            **measure(fn, min_time),
+        }
+        for cached_run, fn in ((False, uncached), (True, cached))
+    ]
+
+
+def bench_logging(min_time: float) -> list[dict]:
+    # what the event loop pays for logging a scraped page, the writing happens
+    # on the listener thread
+    page = fixture("pages/competitor_1.html")
+    log = logging.getLogger("benchmarks.scrape")
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for level in ("INFO", "DEBUG"):
+            setup_logging(
+                Settings(
+                    log_level=level,
+                    log_quiet=True,
+                    log_file=os.path.join(directory, "bench.log"),
+                )
+            )
+
+            def emit() -> None:
+                log.info("fetched %s (%d chars)", "https://example.com", len(page))
+                log.debug("page %s: %s", "https://example.com", Truncated(page))
+
+            results.append(
+                {
+                    "name": "logging.page",
+                    "params": {"level": level, "bytes": len(page.encode())},
+                    **measure(emit, min_time),
+                }
+            )
+        stop_logging()
+    logging.getLogger().handlers = []
+    return results
+
+
+BENCHMARKS: dict[str, Callable[[float], list[dict]]] = {
+    "scrape": bench_scrape_extract,
+    "yoast": bench_yoast,
+    "problem_sentences": bench_problem_sentences,
+    "from_json": bench_from_json,
+    "post_payload": bench_post_payload,
+    "title_width": bench_title_width,
+    "logging": bench_logging,
+}
+
+
+def git_commit() -> str:
+    proc = subprocess.run(
+        ["git", "rev-parse", "--short", "HEAD"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+    )
+    return proc.stdout.strip()
+
+
+def result_key(result: dict) -> str:
+    return result["name"] + json.dumps(result["params"], sort_keys=True)
+
+
+def print_results(results: list[dict], baseline: dict[str, dict]) -> None:
+    for result in results:
+        params = ", ".join(f"{k}={v}" for k, v in result["params"].items())
+        label = f"{result['name']} [{params}]"
+        if "skipped" in result:
+            print(f"{label:<70} skipped: {result['skipped']}")
+            continue
+        line = f"{label:<70} {result['median_ms']:>10.3f} ms  p95 {result['p95_ms']:>10.3f} ms"
+        before = baseline.get(result_key(result))
+        if before and "median_ms" in before:
+            change = (result["median_ms"] / before["median_ms"] - 1) * 100
+            line += f"  ({change:+.1f}% vs {before['median_ms']:.3f} ms)"
+        print(line)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="offline hot path benchmarks")
+    parser.add_argument(
+        "--filter", help="only run benchmarks whose group contains this"
+    )
+    parser.add_argument("--min-time", type=float, default=1.0, help="seconds per case")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="results file of an earlier run")
+    args = parser.parse_args()
+
+    results: list[dict] = []
+    for group, bench in BENCHMARKS.items():
+        if args.filter and args.filter not in group:
+            continue
+        results.extend(bench(args.min_time))
+
+    baseline: dict[str, dict] = {}
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = {result_key(r): r for r in json.load(f)["results"]}
+    print_results(results, baseline)
+
+    if args.output:
+        report = {
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "results": results,
+        }
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""Compare title_width.py against the widths a browser canvas measures.
+
+    python benchmarks/title_width_check.py --tolerance 1.5
+    python benchmarks/title_width_check.py --record
+
+The reference widths live in fixtures/title_widths.json, so the comparison
+(also run by tests/test_title_width.py) needs nothing installed. --record
+measures them again: with node-canvas when it is installed, otherwise by
+shaping each script run with HarfBuzz (pip install uharfbuzz), the shaper
+node-canvas uses through Pango, in the font the glyph table was built from.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import unicodedata
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURE = os.path.join(ROOT, "benchmarks", "fixtures", "title_widths.json")
+sys.path.insert(0, ROOT)
+
+from title_width import FONT_SIZE, title_width
+
+FONT = "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf"
+TITLES = [
+    "قهوه دمی چیست؟ راهنمای کامل دم کردن قهوه در خانه",
+    "۱۰ روش ساده برای نگهداری دانه قهوه",
+    "بهترین دستگاه اسپرسو خانگی در سال ۱۴۰۴ | مقایسه و خرید",
+    "لاته، کاپوچینو یا موکا؟ تفاوت‌ها را بشناسید",
+    "می‌خواهم قهوه‌ام تلخ نباشد: نکته‌هایی برای آسیاب",
+    "Coffee Brewing Guide: French Press vs. V60",
+    "راهنمای خرید French Press برای مبتدی‌ها",
+    "WAVE AVATAR Typography — kerning test",
+    "لوازم جانبی قهوه: آسیاب، ترازو و کتری لاله‌ای",
+    "اسپرسو ۱۰۰٪ عربیکا | Espresso Blend",
+]
+SCRIPT = """
+const { createCanvas } = require("canvas");
+const ctx = createCanvas(10, 10).getContext("2d");
+ctx.font = process.argv[1];
+const titles = JSON.parse(require("fs").readFileSync(0, "utf8"));
+console.log(JSON.stringify(titles.map((title) => ctx.measureText(title).width)));
+"""
+
+
+def canvas_widths(titles: list[str], size: float) -> list[float] | None:
+    try:
+        proc = subprocess.run(
+            ["node", "-e", SCRIPT, f"{size}px sans-serif"],
+            cwd=ROOT,
+            input=json.dumps(titles).encode(),
+            capture_output=True,
+        )
+    except FileNotFoundError:
+        return None
+    if proc.returncode != 0:
+        return None
+    return json.loads(proc.stdout)
+
+
+def script_runs(text: str) -> list[str]:
+    """Split text where the script changes, as Pango itemizes it before shaping."""
+    runs: list[str] = []
+    current, script = "", None
+    for char in text:
+        if "\u0600" <= char <= "\u06ff" or char in "\u200c\u200d":
+            char_script = "arabic"
+        elif unicodedata.category(char).startswith("L"):
+            char_script = "latin"
+        else:
+            # spaces, digits and punctuation stay in the run they are in
+            char_script = None
+        if char_script and script and char_script != script:
+            runs.append(current)
+            current = ""
+        script = char_script or script
+        current += char
+    return runs + [current]
+
+
+def harfbuzz_widths(titles: list[str], size: float, font_path: str) -> list[float]:
+    import uharfbuzz as hb  # pyright: ignore[reportMissingImports]
+
+    with open(font_path, "rb") as f:
+        face = hb.Face(f.read())
+    font = hb.Font(face)
+    widths: list[float] = []
+    for title in titles:
+        advance = 0
+        for run in script_runs(title):
+            buffer = hb.Buffer()
+            buffer.add_str(run)
+            buffer.guess_segment_properties()
+            hb.shape(font, buffer, {})
+            advance += sum(position.x_advance for position in buffer.glyph_positions)
+        widths.append(round(advance * size / face.upem, 2))
+    return widths
+
+
+def record(titles: list[str], size: float, font_path: str) -> None:
+    widths = canvas_widths(titles, size)
+    reference = "node-canvas"
+    if widths is None:
+        try:
+            widths = harfbuzz_widths(titles, size, font_path)
+        except ImportError:
+            raise SystemExit("neither node-canvas nor uharfbuzz is installed")
+        reference = f"harfbuzz, {os.path.basename(font_path)}"
+    with open(FIXTURE, "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "reference": reference,
+                "size": size,
+                "titles": [
+                    {"title": title, "width": round(width, 2)}
+                    for title, width in zip(titles, widths)
+                ],
+            },
+            f,
+            ensure_ascii=False,
+            indent=1,
+        )
+        f.write("\n")
+    print(f"{len(titles)} widths measured with {reference} written to {FIXTURE}")
+
+
+def compare(tolerance: float) -> float:
+    """Print every fixture title with its error; returns the largest (percent)."""
+    with open(FIXTURE, "r", encoding="utf-8") as f:
+        fixture = json.load(f)
+    worst = 0.0
+    for item in fixture["titles"]:
+        width = title_width(item["title"], fixture["size"])
+        error = abs(width - item["width"]) / item["width"] * 100
+        worst = max(worst, error)
+        print(f"{item['width']:8.2f} {width:8.2f} {error:5.2f}%  {item['title']}")
+    print(
+        f"largest difference {worst:.2f}% against {fixture['reference']} "
+        f"(tolerance {tolerance}%)"
+    )
+    return worst
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Compare title_width.py against canvas widths"
+    )
+    parser.add_argument("titles", nargs="*", help="titles to record besides the set")
+    parser.add_argument("--tolerance", type=float, default=1.5)
+    parser.add_argument("--size", type=float, default=FONT_SIZE)
+    parser.add_argument("--font", default=FONT, help="font HarfBuzz measures with")
+    parser.add_argument(
+        "--record", action="store_true", help="measure the reference widths again"
+    )
+    args = parser.parse_args()
+
+    if args.record:
+        record(TITLES + args.titles, args.size, args.font)
+    if compare(args.tolerance) > args.tolerance:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""Time to the target problem count: serial improvements against draft variants.
+
+    OPENAI_API_KEY=... python benchmarks/variants.py --variants 1 3 5 --target 2
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1 OPENAI_API_KEY=x python benchmarks/variants.py
+
+Optimizes the fixture article once per variant count, starting from the same
+draft, and prints wall-clock time, rounds and tokens of each run. Needs node
+with yoastseo installed and an OpenAI endpoint (the API or llm_standin.py).
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from typing import Any
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES = os.path.join(ROOT, "benchmarks", "fixtures")
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)  # yoast_seo.js is resolved from the working directory
+
+from aibot import OpenAi
+from main import create_analyzer
+from models import PostData, PostJsonData, SiteInfo, StopPolicy
+from state_store import StateStore
+from workflow import optimize_until_valid
+
+# the keyphrase the fixture article was written for (see make_fixtures.py)
+KEYPHRASE = "قهوه دمی"
+
+
+def fixture(path: str) -> str:
+    with open(os.path.join(FIXTURES, path), "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def json_fixture(path: str) -> Any:
+    return json.loads(fixture(path))
+
+
+def taxonomy(items: list[dict]) -> dict[int, str]:
+    return {item["id"]: item["name"] for item in items}
+
+
+async def optimize(variants: int, args: argparse.Namespace) -> dict:
+    post = {**json_fixture("post.json"), "conversation_id": None}
+    html = fixture("articles/article_1500.html")
+    site_info = SiteInfo(
+        all_tags=taxonomy(json_fixture("wordpress/tags.json")),
+        all_categories=taxonomy(json_fixture("wordpress/categories.json")),
+        site_url="https://example.com/",
+        wp_api_user="",
+        wp_api_pass="",
+    )
+    client = OpenAi(
+        openai_api_key=os.environ.get("OPENAI_API_KEY", "x"),
+        keyword=args.keyphrase,
+        categories=list(site_info.all_categories.values()),
+        tags=list(site_info.all_tags.values()),
+        html_output=html,
+        json_output=post,
+    )
+    with tempfile.TemporaryDirectory() as directory:
+        store = StateStore(os.path.join(directory, "state.db"))
+        policy = StopPolicy(
+            interactive=False,
+            target_problems=args.target,
+            max_iterations=args.max_iterations,
+            plateau_window=0,
+            token_budget=args.token_budget,
+            variants=variants,
+        )
+        return await optimize_until_valid(
+            client,
+            create_analyzer(),
+            PostData(
+                keyphrase=args.keyphrase,
+                html=html,
+                json=PostJsonData.from_json(post, site_info),
+            ),
+            site_info,
+            store,
+            edit_mode=args.edit_mode,
+            policy=policy,
+        )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Time to the target problem count with draft variants"
+    )
+    parser.add_argument("--variants", type=int, nargs="+", default=[1, 3])
+    parser.add_argument("--target", type=int, default=2)
+    parser.add_argument("--max-iterations", type=int, default=10)
+    parser.add_argument("--token-budget", type=int, default=0)
+    parser.add_argument("--edit-mode", choices=("full", "patch"), default="full")
+    parser.add_argument("--keyphrase", default=KEYPHRASE)
+    args = parser.parse_args()
+    yoast = await asyncio.to_thread(
+        subprocess.run,
+        ["node", "-e", "require.resolve('yoastseo')"],
+        cwd=ROOT,
+        capture_output=True,
+    )
+    if yoast.returncode != 0:
+        raise SystemExit("yoastseo is not installed, every draft would pass")
+
+    print(
+        f"{'variants':>8} {'stop reason':<16} {'rounds':>6} {'problems':>8} {'tokens':>9} {'elapsed':>9}"
+    )
+    serial = None
+    for variants in args.variants:
+        result = await optimize(variants, args)
+        row = (
+            f"{variants:>8} {result['stop_reason']:<16} {result['iterations']:>6} "
+            f"{result['problems']:>8} {result['tokens']:>9} {result['elapsed']:>8.1f}s"
+        )
+        if variants == 1:
+            serial = result
+        elif serial and serial["time_to_target"] and result["time_to_target"]:
+            row += (
+                f"  {serial['time_to_target'] / result['time_to_target']:.2f}x faster"
+            )
+        print(row)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,27 +1,139 @@
+import atexit
 import os
+import json
 import logging
+import queue
 import sys
 from datetime import datetime
-from dotenv import load_dotenv
+from dataclasses import dataclass, field
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any
 
-load_dotenv()
-
-api_key: str = os.getenv("OPENAI_API_KEY", "")
-google_api: str = os.getenv("GOOGLE_API", "")
-google_cse: str = os.getenv("GOOGLE_CSE", "")
-ids_str = os.getenv("RELATED_ARTICLE_IDS", "")
-related_article_data: list[int | str] = [
-    int(x) if x.isdigit() else str(x) for x in ids_str.split(",") if x
-]
+# characters of a logged payload (model output, page, analysis) before it is cut
+LOG_BODY_CHARS = 500
+_listener: QueueListener | None = None
 
 
 def get_from_env(var_name: str, default: str = "") -> str:
     return os.getenv(var_name, default)
 
 
-def validate_environment(site_info, post_info):
+def parse_related_article_data(ids_str: str) -> list[int | str]:
+    return [int(x) if x.isdigit() else str(x) for x in ids_str.split(",") if x]
+
+
+@dataclass
+class Settings:
+    api_key: str = field(default_factory=lambda: get_from_env("OPENAI_API_KEY"))
+    google_api: str = field(default_factory=lambda: get_from_env("GOOGLE_API"))
+    google_cse: str = field(default_factory=lambda: get_from_env("GOOGLE_CSE"))
+    related_article_data: list[int | str] = field(
+        default_factory=lambda: parse_related_article_data(
+            get_from_env("RELATED_ARTICLE_IDS")
+        )
+    )
+    # related articles picked from the local site index when no ids are given (0 = none)
+    related_count: int = field(
+        default_factory=lambda: int(get_from_env("RELATED_ARTICLE_COUNT") or 5)
+    )
+    # "full" resends the whole article on every pass, "patch" only the flagged blocks
+    improve_mode: str = field(
+        default_factory=lambda: get_from_env("IMPROVE_MODE", "full")
+    )
+    # input tokens after which the improvement loop starts a compacted conversation (0 = off)
+    compaction_threshold: int = field(
+        default_factory=lambda: int(get_from_env("CONTEXT_COMPACTION_TOKENS") or 0)
+    )
+    # e.g. {"improvement": {"model": "gpt-5", "effort": "low", "tools": false}}
+    model_tiers: dict[str, dict] = field(
+        default_factory=lambda: json.loads(get_from_env("MODEL_TIERS") or "{}")
+    )
+    # account limits for the shared OpenAI scheduler (0 = only follow response headers)
+    openai_rpm: int = field(
+        default_factory=lambda: int(get_from_env("OPENAI_RPM") or 0)
+    )
+    openai_tpm: int = field(
+        default_factory=lambda: int(get_from_env("OPENAI_TPM") or 0)
+    )
+    # duplicate stateless calls slower than this latency percentile (0 = off)
+    hedge_percentile: float = field(
+        default_factory=lambda: float(get_from_env("HEDGE_PERCENTILE") or 0)
+    )
+    hedge_max_ratio: float = field(
+        default_factory=lambda: float(get_from_env("HEDGE_MAX_RATIO") or 0.1)
+    )
+    # off | record | replay | auto, see llm_store.RecordReplayTransport
+    llm_cache_mode: str = field(
+        default_factory=lambda: get_from_env("LLM_CACHE_MODE", "off")
+    )
+    llm_cache_dir: str = field(
+        default_factory=lambda: get_from_env("LLM_CACHE_DIR", ".llm_cache")
+    )
+    # sqlite database with the pipeline state of every keyphrase
+    state_db: str = field(
+        default_factory=lambda: get_from_env("STATE_DB", "pipeline.db")
+    )
+    # what to do with dead images and links before publishing: off | report | strip | fail
+    link_check: str = field(
+        default_factory=lambda: get_from_env("LINK_CHECK", "report")
+    )
+    # seconds a worker may hold a job without a heartbeat before others can take it
+    job_lease_seconds: float = field(
+        default_factory=lambda: float(get_from_env("JOB_LEASE_SECONDS") or 300)
+    )
+    # attempts of WordPress and Google requests that fail with 429/5xx or connection errors
+    http_max_attempts: int = field(
+        default_factory=lambda: int(get_from_env("HTTP_MAX_ATTEMPTS") or 4)
+    )
+    # failures in a row after which a host is not called for circuit_reset_seconds
+    circuit_failures: int = field(
+        default_factory=lambda: int(get_from_env("CIRCUIT_FAILURES") or 5)
+    )
+    circuit_reset_seconds: float = field(
+        default_factory=lambda: float(get_from_env("CIRCUIT_RESET_SECONDS") or 30)
+    )
+    # node processes kept warm for Yoast analyses by workers and the service
+    yoast_workers: int = field(
+        default_factory=lambda: int(get_from_env("YOAST_WORKERS") or 2)
+    )
+    # seconds categories and tags are reused before they are fetched again
+    taxonomy_ttl: float = field(
+        default_factory=lambda: float(get_from_env("TAXONOMY_TTL") or 600)
+    )
+    # JSON list of the sites one worker serves, see sites.load_sites (empty = SITE_URL only)
+    sites_file: str = field(default_factory=lambda: get_from_env("SITES_FILE"))
+    # JSON lines file that receives the tracing spans (empty = tracing off)
+    trace_file: str = field(default_factory=lambda: get_from_env("TRACE_FILE"))
+    # DEBUG adds model outputs, scraped pages and Yoast analyses to the log
+    log_level: str = field(default_factory=lambda: get_from_env("LOG_LEVEL", "INFO"))
+    # production mode: warnings and errors on the terminal, everything else only in log_file
+    log_quiet: bool = field(
+        default_factory=lambda: get_from_env("LOG_QUIET", "0") == "1"
+    )
+    log_file: str = field(
+        default_factory=lambda: get_from_env(
+            "LOG_FILE", f"wp_poster_{datetime.now().strftime('%Y-%m-%d')}.log"
+        )
+    )
+    log_body_chars: int = field(
+        default_factory=lambda: int(get_from_env("LOG_BODY_CHARS") or LOG_BODY_CHARS)
+    )
+
+
+def load_settings(env_file: str | None = None) -> Settings:
+    """Load the .env file into the environment and read the settings from it.
+
+    Nothing is read or configured at import time, entry points call this once.
+    """
+    from dotenv import load_dotenv
+
+    load_dotenv(env_file)
+    return Settings()
+
+
+def validate_environment(settings: Settings, site_info, post_info=None):
     missing: list[str] = []
-    if not api_key:
+    if not settings.api_key:
         missing.append("API_KEY")
     if not site_info.wp_api_user:
         missing.append("USERNAME")
@@ -29,7 +141,7 @@ def validate_environment(site_info, post_info):
         missing.append("PASSWORD")
     if not site_info.site_url:
         missing.append("SITE_URL")
-    if not post_info.keyphrase:
+    if post_info is not None and not post_info.keyphrase:
         missing.append("KEYPHRASE")
     if missing:
         logging.error(
@@ -41,15 +153,69 @@ def validate_environment(site_info, post_info):
         )
 
 
-# logging setup
-log_file = f"wp_poster_{datetime.now().strftime('%Y-%m-%d')}.log"
-logging.basicConfig(
-    filename=log_file,
-    level=logging.ERROR,
-    format="%(asctime)s [%(levelname)s] %(message)s",
-)
-console = logging.StreamHandler(sys.stdout)
-console.setLevel(logging.CRITICAL)
-formatter = logging.Formatter("%(asctime)s [%(levelname)s] %(message)s")
-console.setFormatter(formatter)
-logging.getLogger().addHandler(console)
+class Truncated:
+    """Log argument cut to LOG_BODY_CHARS, rendered only when the record is emitted.
+
+    log.debug("response: %s", Truncated(text))
+    """
+
+    __slots__ = ("value",)
+
+    def __init__(self, value: Any) -> None:
+        self.value: Any = value
+
+    def __str__(self) -> str:
+        text = (
+            self.value
+            if isinstance(self.value, str)
+            else json.dumps(self.value, ensure_ascii=False, default=str)
+        )
+        if len(text) <= LOG_BODY_CHARS:
+            return text
+        return f"{text[:LOG_BODY_CHARS]}... [{len(text) - LOG_BODY_CHARS} more chars]"
+
+
+def setup_logging(settings: Settings | None = None) -> None:
+    """Send every record through a queue to a thread that writes terminal and file.
+
+    Logging calls only put the record on the queue, so a slow terminal or disk
+    never holds up the event loop.
+    """
+    global _listener, LOG_BODY_CHARS
+    settings = settings or Settings()
+    LOG_BODY_CHARS = settings.log_body_chars
+    level = logging.getLevelName(settings.log_level.upper())
+    if not isinstance(level, int):
+        level = logging.INFO
+    formatter = logging.Formatter("%(asctime)s [%(levelname)s] %(message)s")
+
+    console = logging.StreamHandler(sys.stdout)
+    console.setLevel(max(level, logging.WARNING) if settings.log_quiet else level)
+    console.setFormatter(formatter)
+    handlers: list[logging.Handler] = [console]
+    if settings.log_file:
+        log_file = logging.FileHandler(settings.log_file, encoding="utf-8")
+        log_file.setLevel(level)
+        log_file.setFormatter(formatter)
+        handlers.append(log_file)
+
+    if _listener is None:
+        atexit.register(stop_logging)
+    else:
+        _listener.stop()
+    records: queue.SimpleQueue = queue.SimpleQueue()
+    root = logging.getLogger()
+    root.handlers = [QueueHandler(records)]
+    root.setLevel(level)
+    # httpx logs every OpenAI request at INFO
+    logging.getLogger("httpx").setLevel(max(level, logging.WARNING))
+    _listener = QueueListener(records, *handlers, respect_handler_level=True)
+    _listener.start()
+
+
+def stop_logging() -> None:
+    """Write out the queued records and stop the logging thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,90 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Callable, Coroutine
+
+log = logging.getLogger(__name__)
+
+
+class Hedger:
+    """Fire a duplicate of a slow idempotent call and keep whichever finishes first.
+
+    A call is hedged once it runs past the given percentile of the recent
+    latencies for its key. Hedges are capped to max_ratio of all calls.
+    """
+
+    def __init__(
+        self,
+        percentile: float = 0,
+        max_ratio: float = 0.1,
+        min_samples: int = 10,
+        history: int = 100,
+    ) -> None:
+        self.percentile: float = percentile
+        self.max_ratio: float = max_ratio
+        self.min_samples: int = min_samples
+        self.history: int = history
+        self._latencies: dict[str, deque[float]] = {}
+        self.stats: dict[str, int] = {"calls": 0, "fired": 0, "won": 0, "failed": 0}
+
+    def _record(self, key: str, latency: float) -> None:
+        self._latencies.setdefault(key, deque(maxlen=self.history)).append(latency)
+
+    def delay_for(self, key: str) -> float | None:
+        if not self.percentile:
+            return None
+        samples = sorted(self._latencies.get(key, ()))
+        if len(samples) < self.min_samples:
+            return None
+        index = min(len(samples) - 1, int(len(samples) * self.percentile / 100))
+        return samples[index]
+
+    def _can_hedge(self) -> bool:
+        return self.stats["fired"] + 1 <= self.max_ratio * self.stats["calls"]
+
+    async def run(
+        self, key: str, make_call: Callable[[], Coroutine[Any, Any, Any]]
+    ) -> Any:
+        self.stats["calls"] += 1
+        delay = self.delay_for(key)
+        # each call's own start, so a winning hedge records its own latency
+        started: dict[asyncio.Task, float] = {}
+
+        def start() -> asyncio.Task:
+            task = asyncio.create_task(make_call())
+            started[task] = time.perf_counter()
+            return task
+
+        primary = start()
+        try:
+            done: set[asyncio.Task] = set()
+            if delay is not None:
+                done, _ = await asyncio.wait({primary}, timeout=delay)
+            if delay is None or done or not self._can_hedge():
+                result = await primary
+                self._record(key, time.perf_counter() - started[primary])
+                return result
+
+            log.info("%s call passed %.1fs, firing a duplicate", key, delay)
+            self.stats["fired"] += 1
+            hedge = start()
+            pending = {primary, hedge}
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                if hedge in done and hedge.exception() is not None:
+                    self.stats["failed"] += 1
+                succeeded = [task for task in done if task.exception() is None]
+                if succeeded:
+                    task = primary if primary in succeeded else hedge
+                    if task is hedge:
+                        self.stats["won"] += 1
+                    self._record(key, time.perf_counter() - started[task])
+                    return task.result()
+            raise primary.exception()  # type: ignore[misc]
+        finally:
+            for task in started:
+                if not task.done():
+                    task.cancel()
@@ -0,0 +1,136 @@
+import logging
+import re
+from typing import Any, Pattern
+
+log = logging.getLogger(__name__)
+
+BLOCK_TAG_PATTERN: Pattern = re.compile(
+    r"<(/?)(h[1-6]|p|li|blockquote|td|th)\b[^>]*>", re.IGNORECASE
+)
+
+# yoast assessment identifiers that are fixed by editing a json field
+# instead of the article body
+METADATA_FIELDS: dict[str, list[str]] = {
+    "metaDescriptionKeyword": ["meta"],
+    "metaDescriptionLength": ["meta"],
+    "titleWidth": ["title"],
+    "keyphraseInSEOTitle": ["title"],
+    "TextTitleAssessment": ["title"],
+    "slugKeyword": ["slug"],
+}
+
+
+def split_blocks(html: str) -> list[dict[str, Any]]:
+    """Outermost block elements of html; nested lists and quotes stay inside them."""
+    blocks: list[dict[str, Any]] = []
+    # open tags of the current outermost block
+    stack: list[str] = []
+    start = 0
+    for m in BLOCK_TAG_PATTERN.finditer(html):
+        closing, tag = m.group(1), m.group(2).lower()
+        if not closing:
+            if not stack:
+                start = m.start()
+            stack.append(tag)
+            continue
+        if tag not in stack:
+            continue
+        # a closing tag also ends the unclosed tags opened inside it
+        while stack.pop() != tag:
+            pass
+        if not stack:
+            blocks.append(
+                {
+                    "id": len(blocks),
+                    "start": start,
+                    "end": m.end(),
+                    "html": html[start : m.end()],
+                }
+            )
+    return blocks
+
+
+def _strip_tags(text: str) -> str:
+    return re.sub(r"<[^>]+>", "", text).strip()
+
+
+def find_block_id(blocks: list[dict[str, Any]], fragment: str) -> int | None:
+    fragment = fragment.strip()
+    if not _strip_tags(fragment):
+        return None
+    for block in blocks:
+        if fragment in block["html"]:
+            return block["id"]
+    # the fragment may span several inline tags, fall back to plain text
+    text_only = _strip_tags(fragment)
+    for block in blocks:
+        if text_only in _strip_tags(block["html"]):
+            return block["id"]
+    return None
+
+
+def locate_flagged_blocks(
+    html: str, yoast_info: list[dict[str, Any]]
+) -> tuple[dict[int, dict[str, Any]], list[dict[str, Any]], list[str], list[dict]]:
+    """Split yoast feedback into block level, metadata and document level issues.
+
+    Returns (flagged blocks by id, issues that reference them, flagged json fields,
+    issues that could not be tied to a block or a field).
+    """
+    blocks = split_blocks(html)
+    flagged: dict[int, dict[str, Any]] = {}
+    local_issues: list[dict[str, Any]] = []
+    fields: list[str] = []
+    unresolved: list[dict[str, Any]] = []
+
+    for issue in yoast_info:
+        identifier = issue.get("_identifier", "")
+        if identifier in METADATA_FIELDS:
+            for name in METADATA_FIELDS[identifier]:
+                if name not in fields:
+                    fields.append(name)
+            local_issues.append(
+                {"_identifier": identifier, "text": issue.get("text"), "blockIds": []}
+            )
+            continue
+
+        block_ids: list[int] = []
+        for problem in issue.get("problemSentences") or []:
+            block_id = find_block_id(blocks, problem.get("fullSentence", ""))
+            if block_id is not None and block_id not in block_ids:
+                block_ids.append(block_id)
+                flagged[block_id] = blocks[block_id]
+
+        if block_ids:
+            local_issues.append(
+                {
+                    "_identifier": identifier,
+                    "text": issue.get("text"),
+                    "blockIds": block_ids,
+                }
+            )
+        else:
+            unresolved.append(issue)
+
+    return flagged, local_issues, fields, unresolved
+
+
+def apply_block_patches(html: str, patches: list[dict[str, Any]]) -> str:
+    blocks = {block["id"]: block for block in split_blocks(html)}
+    replacements: dict[int, str] = {}
+    for patch in patches:
+        block_id = patch.get("id")
+        new_html = patch.get("html")
+        if not isinstance(block_id, int) or not isinstance(new_html, str):
+            log.warning("skipping malformed patch: %s", patch)
+            continue
+        if block_id not in blocks:
+            log.warning("skipping patch for unknown block id %s", block_id)
+            continue
+        replacements[block_id] = new_html.strip()
+
+    # apply from the end so earlier offsets stay valid
+    for block_id in sorted(replacements, reverse=True):
+        block = blocks[block_id]
+        html = html[: block["start"]] + replacements[block_id] + html[block["end"] :]
+    return html
@@ -0,0 +1,270 @@
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from typing import Any, Callable
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    site TEXT NOT NULL DEFAULT '',
+    keyphrase TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    available_at REAL NOT NULL,
+    lease_owner TEXT,
+    lease_expires REAL,
+    last_error TEXT,
+    result TEXT,
+    created_at REAL,
+    updated_at REAL,
+    UNIQUE (site, keyphrase)
+);
+CREATE INDEX IF NOT EXISTS jobs_claimable ON jobs (status, available_at);
+"""
+STATUSES = ("pending", "running", "done", "failed")
+COLUMNS = (
+    "id, keyphrase, status, attempts, max_attempts, available_at, lease_owner, "
+    "lease_expires, last_error, result, created_at, updated_at"
+)
+
+
+def migrate(conn: sqlite3.Connection) -> None:
+    """Rebuild queues created before jobs had a site, keeping their rows."""
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(jobs)")]
+    if not columns or "site" in columns:
+        return
+    conn.execute("ALTER TABLE jobs RENAME TO jobs_old")
+    conn.execute("DROP INDEX IF EXISTS jobs_claimable")
+    conn.executescript(SCHEMA)
+    conn.execute(f"INSERT INTO jobs ({COLUMNS}) SELECT {COLUMNS} FROM jobs_old")
+    conn.execute("DROP TABLE jobs_old")
+
+
+class JobQueue:
+    """Keyphrase jobs in sqlite, claimed by workers under a time-limited lease.
+
+    A claim is a single UPDATE ... RETURNING, so two workers can never take the
+    same job. Workers renew the lease with heartbeat(); a job whose lease runs
+    out (crashed or stuck worker) becomes claimable again until max_attempts is
+    reached. complete() and fail() only apply while the caller still owns the
+    lease, so a worker that lost its job cannot overwrite the new owner's work.
+    """
+
+    def __init__(self, path: str = "pipeline.db", lease_seconds: float = 300) -> None:
+        self.path: str = path
+        self.lease_seconds: float = lease_seconds
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        migrate(self._conn)
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+
+    def _execute(self, fn: Callable[[sqlite3.Connection], Any]) -> Any:
+        with self._lock:
+            try:
+                result = fn(self._conn)
+                self._conn.commit()
+                return result
+            except Exception:
+                self._conn.rollback()
+                raise
+
+    async def _run(self, fn: Callable[[sqlite3.Connection], Any]) -> Any:
+        return await asyncio.to_thread(self._execute, fn)
+
+    def close(self) -> None:
+        self._conn.close()
+
+    async def enqueue(
+        self, keyphrases: list[str], max_attempts: int = 3, site: str = ""
+    ) -> int:
+        """Add jobs for keyphrases the site has not queued yet; returns how many were added."""
+        now = time.time()
+
+        def insert(conn: sqlite3.Connection) -> int:
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO jobs "
+                "(site, keyphrase, max_attempts, available_at, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (site, keyphrase, max_attempts, now, now, now)
+                    for keyphrase in keyphrases
+                ],
+            )
+            return conn.total_changes - before
+
+        return await self._run(insert)
+
+    async def claim(
+        self, owner: str, sites: list[str] | None = None
+    ) -> dict[str, Any] | None:
+        """Take the next due job, only of the given sites when sites is set."""
+        now = time.time()
+        site_filter = (
+            f"AND site IN ({', '.join('?' * len(sites))}) " if sites is not None else ""
+        )
+
+        def claim_one(conn: sqlite3.Connection) -> dict[str, Any] | None:
+            # jobs whose lease expired on their last allowed attempt are given up
+            conn.execute(
+                "UPDATE jobs SET status = 'failed', lease_owner = NULL, "
+                "last_error = COALESCE(last_error, 'lease expired'), updated_at = ? "
+                "WHERE status = 'running' AND lease_expires < ? "
+                "AND attempts >= max_attempts",
+                (now, now),
+            )
+            row = conn.execute(
+                "UPDATE jobs SET status = 'running', lease_owner = ?, "
+                "lease_expires = ?, attempts = attempts + 1, updated_at = ? "
+                "WHERE id = ("
+                "  SELECT id FROM jobs WHERE attempts < max_attempts AND ("
+                "    (status = 'pending' AND available_at <= ?)"
+                "    OR (status = 'running' AND lease_expires < ?)"
+                f"  ) {site_filter}ORDER BY available_at, id LIMIT 1"
+                ") RETURNING id, site, keyphrase, attempts",
+                (owner, now + self.lease_seconds, now, now, now, *(sites or [])),
+            ).fetchone()
+            if row is None:
+                return None
+            return {
+                "id": row[0],
+                "site": row[1],
+                "keyphrase": row[2],
+                "attempts": row[3],
+            }
+
+        return await self._run(claim_one)
+
+    async def heartbeat(self, job_id: int, owner: str) -> bool:
+        """Extend the lease; False means the job is no longer owned by this worker."""
+        now = time.time()
+        changed = await self._run(
+            lambda conn: (
+                conn.execute(
+                    "UPDATE jobs SET lease_expires = ?, updated_at = ? "
+                    "WHERE id = ? AND lease_owner = ? AND status = 'running'",
+                    (now + self.lease_seconds, now, job_id, owner),
+                ).rowcount
+            )
+        )
+        return changed == 1
+
+    async def complete(self, job_id: int, owner: str, result: dict[str, Any]) -> bool:
+        changed = await self._run(
+            lambda conn: (
+                conn.execute(
+                    "UPDATE jobs SET status = 'done', lease_owner = NULL, result = ?, "
+                    "updated_at = ? WHERE id = ? AND lease_owner = ? AND status = 'running'",
+                    (
+                        json.dumps(result, ensure_ascii=False, default=str),
+                        time.time(),
+                        job_id,
+                        owner,
+                    ),
+                ).rowcount
+            )
+        )
+        return changed == 1
+
+    async def fail(
+        self, job_id: int, owner: str, error: str, retry_delay: float = 60
+    ) -> bool:
+        """Release the job for a retry after retry_delay * attempts, or mark it failed."""
+        now = time.time()
+        changed = await self._run(
+            lambda conn: (
+                conn.execute(
+                    "UPDATE jobs SET "
+                    "status = CASE WHEN attempts < max_attempts "
+                    "THEN 'pending' ELSE 'failed' END, "
+                    "available_at = ? + ? * attempts, lease_owner = NULL, "
+                    "last_error = ?, updated_at = ? "
+                    "WHERE id = ? AND lease_owner = ? AND status = 'running'",
+                    (now, retry_delay, error, now, job_id, owner),
+                ).rowcount
+            )
+        )
+        return changed == 1
+
+    async def retry_failed(self) -> int:
+        """Give every failed job a fresh set of attempts."""
+        return await self._run(
+            lambda conn: (
+                conn.execute(
+                    "UPDATE jobs SET status = 'pending', attempts = 0, available_at = ?, "
+                    "updated_at = ? WHERE status = 'failed'",
+                    (time.time(), time.time()),
+                ).rowcount
+            )
+        )
+
+    async def counts(self) -> dict[str, int]:
+        rows = await self._run(
+            lambda conn: conn.execute(
+                "SELECT status, COUNT(*) FROM jobs GROUP BY status"
+            ).fetchall()
+        )
+        return {status: dict(rows).get(status, 0) for status in STATUSES}
+
+    async def jobs(self, status: str | None = None) -> list[dict[str, Any]]:
+        rows = await self._run(
+            lambda conn: conn.execute(
+                "SELECT id, site, keyphrase, status, attempts, max_attempts, lease_owner, "
+                "last_error FROM jobs WHERE ? IS NULL OR status = ? ORDER BY id",
+                (status, status),
+            ).fetchall()
+        )
+        keys = (
+            "id",
+            "site",
+            "keyphrase",
+            "status",
+            "attempts",
+            "max_attempts",
+            "lease_owner",
+            "last_error",
+        )
+        return [dict(zip(keys, row)) for row in rows]
+
+    async def job(self, job_id: int) -> dict[str, Any] | None:
+        """One job with its result summary and timestamps."""
+        row = await self._run(
+            lambda conn: conn.execute(
+                "SELECT id, site, keyphrase, status, attempts, max_attempts, "
+                "last_error, result, created_at, updated_at FROM jobs WHERE id = ?",
+                (job_id,),
+            ).fetchone()
+        )
+        if row is None:
+            return None
+        keys = (
+            "id",
+            "site",
+            "keyphrase",
+            "status",
+            "attempts",
+            "max_attempts",
+            "last_error",
+            "result",
+            "created_at",
+            "updated_at",
+        )
+        job: dict[str, Any] = dict(zip(keys, row))
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    async def job_ids(self, keyphrases: list[str], site: str = "") -> dict[str, int]:
+        """Ids of the site's jobs for keyphrases, whether just queued or queued before."""
+        rows = await self._run(
+            lambda conn: conn.execute(
+                "SELECT keyphrase, id FROM jobs WHERE site = ? "
+                f"AND keyphrase IN ({', '.join('?' * len(keyphrases))})",
+                (site, *keyphrases),
+            ).fetchall()
+        )
+        return dict(rows)
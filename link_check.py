@@ -0,0 +1,183 @@
+import asyncio
+import logging
+import re
+import time
+from html import unescape
+from typing import Any
+from models import PostData
+from state_store import StateStore
+from tracing import span
+
+log = logging.getLogger(__name__)
+
+ACTIONS = ("off", "report", "strip", "fail")
+IMG_PATTERN = re.compile(r"<img\b[^>]*?\bsrc=[\"']([^\"']+)[\"'][^>]*>", re.I)
+ANCHOR_PATTERN = re.compile(
+    r"<a\b[^>]*?\bhref=[\"']([^\"']+)[\"'][^>]*>(.*?)</a>", re.I | re.S
+)
+# servers that refuse HEAD are retried with a GET
+HEAD_REJECTED = {403, 405, 501}
+
+
+def extract_links(post_data: PostData) -> dict[str, str]:
+    """Every http(s) URL of the draft mapped to "image" or "link"."""
+    links: dict[str, str] = {}
+    for url in IMG_PATTERN.findall(post_data.html):
+        links[unescape(url)] = "image"
+    for url, _ in ANCHOR_PATTERN.findall(post_data.html):
+        links.setdefault(unescape(url), "link")
+    for source in post_data.json.sources:
+        links.setdefault(str(source.get("link", "")), "link")
+    return {url: kind for url, kind in links.items() if url.startswith("http")}
+
+
+class LinkChecker:
+    """HEAD-checks the images and links of drafts before they are published.
+
+    Requests go through one shared session with at most `concurrency` in
+    flight. Results are cached per URL in memory and, with a store, in the
+    state database, so URLs seen in an earlier draft or run cost nothing
+    until their ttl runs out. Dead links are reported, stripped from the
+    draft or make publishing fail, depending on `action`.
+    """
+
+    def __init__(
+        self,
+        store: StateStore | None = None,
+        action: str = "report",
+        concurrency: int = 16,
+        timeout: float = 10,
+        ttl: float = 86400,
+        failure_ttl: float = 3600,
+    ) -> None:
+        if action not in ACTIONS:
+            raise ValueError(
+                f"Unknown link check action '{action}', expected {ACTIONS}"
+            )
+        self.store: StateStore | None = store
+        self.action: str = action
+        self.timeout: float = timeout
+        self.ttl: float = ttl
+        self.failure_ttl: float = failure_ttl
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._session = None
+        self._cache: dict[str, dict[str, Any]] = {}
+        self._pending: dict[str, asyncio.Task] = {}
+        self.stats: dict[str, int] = {"checked": 0, "cached": 0, "dead": 0}
+
+    def _fresh(self, result: dict[str, Any] | None) -> bool:
+        if result is None:
+            return False
+        ttl = self.ttl if result["ok"] else self.failure_ttl
+        return time.time() - result["checked_at"] < ttl
+
+    def _get_session(self):
+        import aiohttp
+
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                headers={"User-Agent": "Mozilla/5.0 (link check)"},
+            )
+        return self._session
+
+    async def _request(self, url: str, kind: str) -> dict[str, Any]:
+        session = self._get_session()
+        result: dict[str, Any] = {"url": url, "kind": kind, "status": None}
+        async with self._semaphore:
+            with span("links.check", url=url, kind=kind) as attributes:
+                try:
+                    async with session.head(url, allow_redirects=True) as resp:
+                        status, content_type = resp.status, resp.content_type
+                    if status in HEAD_REJECTED:
+                        async with session.get(url, allow_redirects=True) as resp:
+                            status, content_type = resp.status, resp.content_type
+                    result["status"] = status
+                    result["ok"] = status < 400 and (
+                        kind != "image" or content_type.startswith("image/")
+                    )
+                    if status < 400 and not result["ok"]:
+                        result["error"] = f"not an image ({content_type})"
+                except Exception as e:
+                    result["ok"] = False
+                    result["error"] = f"{type(e).__name__}: {e}"
+                attributes["status"] = result["status"]
+                attributes["ok"] = result["ok"]
+        result["checked_at"] = time.time()
+        self.stats["checked"] += 1
+        return result
+
+    async def _check_one(self, url: str, kind: str) -> dict[str, Any]:
+        if self._fresh(self._cache.get(url)):
+            self.stats["cached"] += 1
+            return self._cache[url]
+        # concurrent drafts linking the same URL share one request
+        task = self._pending.get(url)
+        if task is None:
+            task = asyncio.create_task(self._request(url, kind))
+            self._pending[url] = task
+            task.add_done_callback(lambda _: self._pending.pop(url, None))
+        result = await task
+        self._cache[url] = result
+        return result
+
+    async def check(self, links: dict[str, str]) -> list[dict[str, Any]]:
+        if self.store is not None:
+            stored = await self.store.get_link_checks(
+                [url for url in links if not self._fresh(self._cache.get(url))]
+            )
+            self._cache.update(
+                {url: result for url, result in stored.items() if self._fresh(result)}
+            )
+        fresh = {url for url in links if self._fresh(self._cache.get(url))}
+        results = await asyncio.gather(
+            *(self._check_one(url, kind) for url, kind in links.items())
+        )
+        if self.store is not None:
+            await self.store.save_link_checks(
+                [result for result in results if result["url"] not in fresh]
+            )
+        return list(results)
+
+    async def check_post(self, post_data: PostData) -> list[dict[str, Any]]:
+        """Check the draft and apply the action; returns the dead links."""
+        if self.action == "off":
+            return []
+        links = extract_links(post_data)
+        with span("links.check_post", links=len(links)) as attributes:
+            results = await self.check(links)
+            dead = [result for result in results if not result["ok"]]
+            attributes["dead"] = len(dead)
+        self.stats["dead"] += len(dead)
+        for result in dead:
+            log.warning(
+                "dead %s: %s (%s)",
+                result["kind"],
+                result["url"],
+                result.get("error") or result["status"],
+            )
+        if dead and self.action == "fail":
+            raise Exception(f"{len(dead)} dead links in '{post_data.keyphrase}'")
+        if dead and self.action == "strip":
+            strip_links(post_data, {result["url"] for result in dead})
+        return dead
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+
+
+def strip_links(post_data: PostData, urls: set[str]) -> None:
+    """Drop dead images and sources and unwrap dead anchors, keeping their text."""
+    post_data.html = IMG_PATTERN.sub(
+        lambda m: "" if unescape(m.group(1)) in urls else m.group(0), post_data.html
+    )
+    post_data.html = ANCHOR_PATTERN.sub(
+        lambda m: m.group(2) if unescape(m.group(1)) in urls else m.group(0),
+        post_data.html,
+    )
+    post_data.json.sources = [
+        source
+        for source in post_data.json.sources
+        if str(source.get("link", "")) not in urls
+    ]
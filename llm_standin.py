@@ -0,0 +1,279 @@
+"""Local stand-in for the subset of the OpenAI API used by aibot.OpenAi.
+
+Implements POST /v1/conversations and POST /v1/responses with canned answers
+(acknowledgements, a synthetic article with its JSON block, JSON fixes,
+summaries and empty patches) so the pipeline can run offline. Prompt caching
+is simulated like the real API: the longest prefix of at least 1024 tokens
+already seen, in 128 token steps, is reported as cached_tokens.
+
+    python llm_standin.py --port 8765 --latency 2 --jitter 0.5
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1 python main.py
+"""
+
+import argparse
+import ast
+import asyncio
+import hashlib
+import json
+import random
+import re
+import time
+import uuid
+from collections import deque
+from typing import Any
+
+from aiohttp import web
+
+# the stand-in counts three characters as a token
+CHARS_PER_TOKEN = 3
+CACHE_MIN_TOKENS = 1024
+CACHE_STEP_TOKENS = 128
+
+
+def _message_text(item: Any) -> str:
+    if isinstance(item, str):
+        return item
+    content = item.get("content", "") if isinstance(item, dict) else ""
+    if isinstance(content, list):
+        return "\n".join(
+            part.get("text", "") for part in content if isinstance(part, dict)
+        )
+    return str(content)
+
+
+def _find_list(pattern: str, context: str) -> list[str]:
+    match = re.search(pattern, context)
+    if not match:
+        return []
+    try:
+        value = ast.literal_eval(match.group(1))
+    except (ValueError, SyntaxError):
+        return []
+    return [str(v) for v in value] if isinstance(value, list) else []
+
+
+def synthetic_article(context: str) -> str:
+    match = re.search(r'Primary Keyword(?:/Keyphrase)?: "?([^"\n]+)', context)
+    keyword = match.group(1).strip() if match else "کلمه کلیدی"
+    categories = _find_list(r"Available categories: (\[.*?\])\n", context)
+    tags = _find_list(r"Available tags: (\[.*?\])\n", context)
+
+    sections = []
+    for i in range(12):
+        sections.append(
+            f"<h2>{keyword} بخش {i + 1}</h2>"
+            f"<p>در این بخش درباره {keyword} توضیح می‌دهیم. از طرفی این متن نمونه است.</p>"
+            f"<p>در نتیجه خواننده با جنبه‌های مختلف {keyword} آشنا می‌شود.</p>"
+        )
+    html = (
+        "<div lang='fa' dir='rtl'>"
+        f"<h1>راهنمای کامل {keyword}</h1>"
+        f"<p>{keyword} موضوع این مقاله است.</p>" + "".join(sections) + "</div>"
+    )
+    data = {
+        "title": f"راهنمای کامل {keyword}",
+        "slug": "sample-article",
+        "categories": categories[:1],
+        "tags": tags[:5],
+        "faqs": [
+            {"question": f"{keyword} چیست؟", "answer": "پاسخ نمونه."} for _ in range(3)
+        ],
+        "meta": f"در این مقاله همه چیز درباره {keyword} را به زبان ساده می‌خوانید.",
+        "sources": [{"title": "منبع نمونه", "link": "https://example.com"}],
+        "synonyms": [f"{keyword} ساده", f"آموزش {keyword}"],
+    }
+    return html + "\n" + json.dumps(data, ensure_ascii=False)
+
+
+def reply_for(latest: str, context: str) -> str:
+    if latest.startswith("[FINAL]") or "Full article HTML" in latest:
+        return synthetic_article(context)
+    if "Please fix the JSON" in latest:
+        return synthetic_article(context).split("\n", 1)[1]
+    if '"blocks": [{"id"' in latest:
+        # echo the flagged blocks and fields back unchanged
+        match = re.search(
+            r"blocks:\n(\[.*?\])\n\nfields:\n(\{.*?\})(?:\n\n|$)", latest, re.S
+        )
+        blocks, fields = (
+            (json.loads(match.group(1)), json.loads(match.group(2)))
+            if match
+            else ([], {})
+        )
+        return json.dumps({"blocks": blocks, "fields": fields}, ensure_ascii=False)
+    if latest.startswith("Summarize"):
+        return "Summary of the previous work."
+    return "Noted."
+
+
+class StandIn:
+    def __init__(
+        self,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        slow_rate: float = 0.0,
+        slow_factor: float = 10.0,
+        requests_per_minute: int = 0,
+        seed: int | None = None,
+    ) -> None:
+        self.latency: float = latency
+        self.jitter: float = jitter
+        self.slow_rate: float = slow_rate
+        self.slow_factor: float = slow_factor
+        self.requests_per_minute: int = requests_per_minute
+        self.random = random.Random(seed)
+        self.conversations: dict[str, list[str]] = {}
+        self._requests: deque[float] = deque()
+        self._prefixes: dict[str, None] = {}
+        self.max_prefixes: int = 100_000
+
+    def cached_tokens(self, prompt: str) -> int:
+        """Tokens of the longest cacheable prefix of prompt seen before; remembers prompt."""
+        step = CACHE_STEP_TOKENS * CHARS_PER_TOKEN
+        hasher = hashlib.sha256()
+        cached = 0
+        for end in range(step, len(prompt) + 1, step):
+            hasher.update(prompt[end - step : end].encode())
+            if end < CACHE_MIN_TOKENS * CHARS_PER_TOKEN:
+                continue
+            digest = hasher.hexdigest()
+            if digest in self._prefixes:
+                cached = end // CHARS_PER_TOKEN
+            else:
+                self._prefixes[digest] = None
+        while len(self._prefixes) > self.max_prefixes:
+            del self._prefixes[next(iter(self._prefixes))]
+        return cached
+
+    def _delay(self) -> float:
+        delay = max(0.0, self.random.gauss(self.latency, self.jitter))
+        if self.slow_rate and self.random.random() < self.slow_rate:
+            delay *= self.slow_factor
+        return delay
+
+    def _rate_limit_headers(self) -> tuple[dict[str, str], bool]:
+        now = time.monotonic()
+        while self._requests and self._requests[0] <= now - 60:
+            self._requests.popleft()
+        if not self.requests_per_minute:
+            return {}, False
+        throttled = len(self._requests) >= self.requests_per_minute
+        if not throttled:
+            self._requests.append(now)
+        reset = self._requests[0] + 60 - now if self._requests else 0
+        headers = {
+            "x-ratelimit-limit-requests": str(self.requests_per_minute),
+            "x-ratelimit-remaining-requests": str(
+                max(0, self.requests_per_minute - len(self._requests))
+            ),
+            "x-ratelimit-reset-requests": f"{reset:.3f}s",
+        }
+        if throttled:
+            headers["retry-after"] = f"{reset:.3f}"
+        return headers, throttled
+
+    async def create_conversation(self, request: web.Request) -> web.Response:
+        body = await request.json() if request.can_read_body else {}
+        conversation_id = f"conv_{uuid.uuid4().hex}"
+        self.conversations[conversation_id] = [
+            _message_text(item) for item in (body or {}).get("items") or []
+        ]
+        return web.json_response(
+            {
+                "id": conversation_id,
+                "object": "conversation",
+                "created_at": int(time.time()),
+                "metadata": {},
+            }
+        )
+
+    async def create_response(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        headers, throttled = self._rate_limit_headers()
+        if throttled:
+            return web.json_response(
+                {"error": {"message": "Rate limit reached", "type": "requests"}},
+                status=429,
+                headers=headers,
+            )
+
+        items = body.get("input", [])
+        if isinstance(items, str):
+            items = [items]
+        new_texts = [_message_text(item) for item in items]
+        history = self.conversations.get(body.get("conversation") or "", [])
+        context = "\n".join(history + new_texts)
+        text = reply_for("\n".join(new_texts), context)
+
+        await asyncio.sleep(self._delay())
+        if body.get("conversation") in self.conversations:
+            history.extend(new_texts + [text])
+
+        input_tokens = len(context) // CHARS_PER_TOKEN
+        output_tokens = len(text) // CHARS_PER_TOKEN
+        cached_tokens = self.cached_tokens(context)
+        return web.json_response(
+            {
+                "id": f"resp_{uuid.uuid4().hex}",
+                "object": "response",
+                "created_at": int(time.time()),
+                "model": body.get("model", ""),
+                "status": "completed",
+                "output": [
+                    {
+                        "type": "message",
+                        "id": f"msg_{uuid.uuid4().hex}",
+                        "role": "assistant",
+                        "status": "completed",
+                        "content": [
+                            {"type": "output_text", "text": text, "annotations": []}
+                        ],
+                    }
+                ],
+                "parallel_tool_calls": True,
+                "tool_choice": "auto",
+                "tools": body.get("tools", []),
+                "usage": {
+                    "input_tokens": input_tokens,
+                    "input_tokens_details": {"cached_tokens": cached_tokens},
+                    "output_tokens": output_tokens,
+                    "output_tokens_details": {"reasoning_tokens": 0},
+                    "total_tokens": input_tokens + output_tokens,
+                },
+            },
+            headers=headers,
+        )
+
+    def app(self) -> web.Application:
+        app = web.Application(client_max_size=64 * 1024**2)
+        app.router.add_post("/v1/conversations", self.create_conversation)
+        app.router.add_post("/v1/responses", self.create_response)
+        return app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Stand-in for the OpenAI Responses API"
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="mean seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="stddev seconds")
+    parser.add_argument("--slow-rate", type=float, default=0.0)
+    parser.add_argument("--slow-factor", type=float, default=10.0)
+    parser.add_argument("--rpm", type=int, default=0)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+    stand_in = StandIn(
+        latency=args.latency,
+        jitter=args.jitter,
+        slow_rate=args.slow_rate,
+        slow_factor=args.slow_factor,
+        requests_per_minute=args.rpm,
+        seed=args.seed,
+    )
+    web.run_app(stand_in.app(), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
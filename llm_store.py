@@ -0,0 +1,132 @@
+import hashlib
+import json
+import os
+from typing import Any
+
+import httpx
+from tracing import span
+
+MODES = ("off", "record", "replay", "auto")
+
+
+def request_key(method: str, path: str, body: bytes) -> str:
+    try:
+        payload: Any = json.loads(body) if body else {}
+    except json.JSONDecodeError:
+        payload = body.decode(errors="replace")
+    canonical = json.dumps(
+        {"method": method, "path": path, "body": payload},
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+class RecordReplayTransport(httpx.AsyncBaseTransport):
+    """httpx transport that records OpenAI responses to disk and replays them.
+
+    Responses are keyed by a hash of the method, path and request body (model,
+    parameters and input). Identical requests made several times in one run are
+    replayed in the order they were recorded.
+
+    modes: record (always call the API and store), replay (only use the store,
+    fail on a miss), auto (replay when stored, otherwise call and store).
+    """
+
+    def __init__(
+        self,
+        store_dir: str,
+        mode: str = "auto",
+        transport: httpx.AsyncBaseTransport | None = None,
+    ) -> None:
+        if mode not in MODES:
+            raise ValueError(
+                f"Unknown llm cache mode '{mode}', expected one of {MODES}"
+            )
+        self.store_dir: str = store_dir
+        self.mode: str = mode
+        self.transport: httpx.AsyncBaseTransport = (
+            transport or httpx.AsyncHTTPTransport()
+        )
+        self._seen: dict[str, int] = {}
+        self.stats: dict[str, int] = {"hits": 0, "misses": 0, "recorded": 0}
+        os.makedirs(store_dir, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.store_dir, f"{key}.json")
+
+    def _load(self, key: str) -> list[dict[str, Any]]:
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return []
+
+    def _save(self, key: str, entries: list[dict[str, Any]]) -> None:
+        tmp_path = self._path(key) + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entries, f, ensure_ascii=False)
+        os.replace(tmp_path, self._path(key))
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        with span("llm.store", path=request.url.path, mode=self.mode) as attributes:
+            response = await self._handle(request, attributes)
+            attributes["status"] = response.status_code
+            return response
+
+    async def _handle(
+        self, request: httpx.Request, attributes: dict[str, Any]
+    ) -> httpx.Response:
+        body = await request.aread()
+        key = request_key(request.method, request.url.path, body)
+        index = self._seen.get(key, 0)
+        self._seen[key] = index + 1
+        entries = self._load(key)
+
+        if self.mode != "record" and index < len(entries):
+            self.stats["hits"] += 1
+            attributes["cache"] = "hit"
+            entry = entries[index]
+            return httpx.Response(
+                status_code=entry["status"],
+                headers=entry["headers"],
+                content=entry["body"].encode(),
+                request=request,
+            )
+
+        self.stats["misses"] += 1
+        attributes["cache"] = "miss"
+        if self.mode == "replay":
+            raise RuntimeError(
+                f"No recorded response for {request.method} {request.url.path} ({key})"
+            )
+
+        response = await self.transport.handle_async_request(request)
+        content = await response.aread()
+        headers = {
+            name: value
+            for name, value in response.headers.items()
+            if name.lower() not in ("content-encoding", "content-length")
+        }
+        # errors are returned but never stored so a replay does not repeat a 429
+        if response.status_code < 400:
+            entries = entries[:index] + [
+                {
+                    "status": response.status_code,
+                    "headers": headers,
+                    "body": content.decode(),
+                }
+            ]
+            self._save(key, entries)
+            self.stats["recorded"] += 1
+        else:
+            self._seen[key] = index
+        return httpx.Response(
+            status_code=response.status_code,
+            headers=headers,
+            content=content,
+            request=request,
+        )
+
+    async def aclose(self) -> None:
+        await self.transport.aclose()
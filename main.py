@@ -1,18 +1,68 @@
 import asyncio
 import json
+from typing import TYPE_CHECKING
 from aibot import OpenAi
-from yoast import Yoast
+from yoast import Yoast, YoastPool
 from wordpress import WordPressClient
 from scrape import Scrape
-from config import (
-    validate_environment,
-    api_key,
-    google_api,
-    google_cse,
-    related_article_data,
-)
-from models import SiteInfo, PostData, PostJsonData
-from workflow import generate_post_if_missing, optimize_until_valid
+from config import Settings, load_settings, setup_logging, validate_environment
+from models import SiteInfo, PostData, StopPolicy
+from hedging import Hedger
+from link_check import LinkChecker
+from rate_limit import RateLimiter
+from resilience import Resilience
+from state_store import StateStore
+from site_index import SiteIndex
+from stage_graph import StageGraph
+import tracing
+from workflow import prefetch_top_results, run_pipeline
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
+
+def create_client(
+    settings: Settings,
+    keyphrase: str,
+    site_info: SiteInfo,
+    related_articles: list[dict],
+    rate_limiter: RateLimiter,
+    hedger: Hedger,
+    openai_client: "AsyncOpenAI | None" = None,
+) -> OpenAi:
+    return OpenAi(
+        openai_api_key=settings.api_key,
+        keyword=keyphrase,
+        categories=list(site_info.all_categories.values()),
+        tags=list(site_info.all_tags.values()),
+        related_articles=related_articles,
+        compaction_threshold=settings.compaction_threshold,
+        model_tiers=settings.model_tiers,
+        rate_limiter=rate_limiter,
+        hedger=hedger,
+        llm_cache_mode=settings.llm_cache_mode,
+        llm_cache_dir=settings.llm_cache_dir,
+        openai_client=openai_client,
+    )
+
+
+def create_resilience(settings: Settings) -> Resilience:
+    return Resilience(
+        max_attempts=settings.http_max_attempts,
+        failure_threshold=settings.circuit_failures,
+        reset_timeout=settings.circuit_reset_seconds,
+    )
+
+
+def create_analyzer(pool: YoastPool | None = None) -> Yoast:
+    return Yoast(
+        filters=[
+            "images",
+            "imageKeyphrase",
+            "slugKeyword",
+        ],
+        pool=pool,
+    )
 
 
 # TODO: figure out a way to handle the filters meaning how to determine them automatically or
@@ -25,58 +75,104 @@ from workflow import generate_post_if_missing, optimize_until_valid
 # WARNING: not a lot of error handling. DO NOT PUSH TO PRODUCTION LIKE THIS
 # ps: I know you're not gonna listen to me and push anyway but hey I tried
 async def main() -> None:
+    settings = load_settings()
+    setup_logging(settings)
+    tracer = tracing.configure(settings.trace_file)
     site_info: SiteInfo = SiteInfo()
     post_info: PostData = PostData()
-    validate_environment(site_info, post_info)
+    validate_environment(settings, site_info, post_info)
+    resilience = create_resilience(settings)
     wordpress = WordPressClient(
         username=site_info.wp_api_user,
         password=site_info.wp_api_pass,
         site_url=site_info.site_url,
+        resilience=resilience,
+        taxonomy_ttl=settings.taxonomy_ttl,
     )
-    site_info.all_tags = await wordpress.get_tags()
-    site_info.all_categories = await wordpress.get_categories()
-    print(f"all tags:{site_info.all_tags}")
-    print(f"all categories:{site_info.all_categories}")
-    related_articles = (
-        await wordpress.get_posts_info(related_article_data)
-        if related_article_data
-        else []
-    )
-    print(related_articles)
-
     scraper = Scrape(
-        google_api_key=google_api,
-        google_cse_id=google_cse,
-    )
-    client = OpenAi(
-        openai_api_key=api_key,
-        keyword=post_info.keyphrase,
-        categories=list(site_info.all_categories.values()),
-        tags=list(site_info.all_tags.values()),
-        related_articles=related_articles,
+        google_api_key=settings.google_api,
+        google_cse_id=settings.google_cse,
+        resilience=resilience,
     )
+    store = StateStore(settings.state_db)
+    site_index = SiteIndex(settings.state_db, site_info.site_url)
+    link_checker = LinkChecker(store, settings.link_check)
 
-    json_output, html_output = await generate_post_if_missing(
-        post_info, scraper, client
-    )
-    print(json.dumps(json_output, indent=2, ensure_ascii=False))
-    post_info.html = html_output
-    post_info.json = PostJsonData.from_json(json=json_output, site_info=site_info)
+    async def get_related_articles(
+        tags: dict[int, str], categories: dict[int, str]
+    ) -> list[dict]:
+        if settings.related_article_data:
+            return await wordpress.get_posts_info(settings.related_article_data)
+        if not settings.related_count:
+            return []
+        await site_index.sync(wordpress)
+        return await site_index.related_articles(
+            post_info.keyphrase, categories, tags, settings.related_count
+        )
 
-    client.conversation_id = post_info.json.conversation_id
-    client.html_output = html_output
-    client.json_output = json_output
-    analyzer = Yoast(
-        filters=[
-            "images",
-            "imageKeyphrase",
-            "slugKeyword",
-        ]
-    )
-    await optimize_until_valid(client, analyzer, post_info, site_info)
-    await wordpress.create_post(
-        post_data=post_info,
+    async def run(
+        tags: dict[int, str],
+        categories: dict[int, str],
+        related: list[dict],
+        research: None,
+    ) -> OpenAi:
+        site_info.all_tags = tags
+        site_info.all_categories = categories
+        client = create_client(
+            settings,
+            post_info.keyphrase,
+            site_info,
+            related,
+            RateLimiter(
+                requests_per_minute=settings.openai_rpm,
+                tokens_per_minute=settings.openai_tpm,
+            ),
+            Hedger(
+                percentile=settings.hedge_percentile,
+                max_ratio=settings.hedge_max_ratio,
+            ),
+        )
+        try:
+            await run_pipeline(
+                post_info,
+                site_info,
+                scraper,
+                client,
+                create_analyzer(),
+                wordpress,
+                store,
+                StopPolicy(),
+                edit_mode=settings.improve_mode,
+                link_checker=link_checker,
+            )
+        finally:
+            await link_checker.close()
+        return client
+
+    # taxonomy, related articles and search/scrape do not depend on each other
+    graph = StageGraph()
+    graph.add("tags", wordpress.get_tags)
+    graph.add("categories", wordpress.get_categories)
+    graph.add("related", get_related_articles, deps=["tags", "categories"])
+    graph.add(
+        "research",
+        lambda: prefetch_top_results(post_info.keyphrase, scraper, store),
     )
+    graph.add("pipeline", run, deps=["tags", "categories", "related", "research"])
+    try:
+        client: OpenAi = (await graph.run())["pipeline"]
+    finally:
+        await wordpress.close()
+
+    graph.print_timeline()
+    print(json.dumps(client.tier_stats(), indent=2))
+    print(f"hedging: {client.hedger.stats}")
+    print(f"http: {resilience.metrics()}")
+    if client.llm_store:
+        print(f"llm store: {client.llm_store.stats}")
+    if tracer.enabled:
+        tracing.print_report(tracer.summary())
+        tracer.close()
 
 
 if __name__ == "__main__":
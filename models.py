@@ -1,6 +1,7 @@
 from dataclasses import dataclass, field
 from typing import List, Dict
 from config import get_from_env
+from taxonomy import TaxonomyIndex
 
 
 @dataclass
@@ -10,6 +11,27 @@ class SiteInfo:
     site_url: str = field(default_factory=lambda: get_from_env("SITE_URL"))
     wp_api_user: str = field(default_factory=lambda: get_from_env("WP_API_USER"))
     wp_api_pass: str = field(default_factory=lambda: get_from_env("WP_API_PASS"))
+    # use the closest existing term when a picked tag or category does not exist
+    fuzzy_taxonomy: bool = field(
+        default_factory=lambda: get_from_env("TAXONOMY_FUZZY", "0") == "1"
+    )
+    _indexes: Dict[str, tuple[dict, TaxonomyIndex]] = field(
+        default_factory=dict, init=False, repr=False, compare=False
+    )
+
+    def _index(self, name: str, terms: Dict[int, str]) -> TaxonomyIndex:
+        # rebuilt only when all_tags/all_categories is replaced by a new fetch
+        cached = self._indexes.get(name)
+        if cached is None or cached[0] is not terms:
+            cached = (terms, TaxonomyIndex(terms))
+            self._indexes[name] = cached
+        return cached[1]
+
+    def tag_index(self) -> TaxonomyIndex:
+        return self._index("tags", self.all_tags)
+
+    def category_index(self) -> TaxonomyIndex:
+        return self._index("categories", self.all_categories)
 
 
 @dataclass
@@ -26,14 +48,12 @@ class PostJsonData:
 
     @classmethod
     def from_json(cls, json: dict, site_info: SiteInfo) -> "PostJsonData":
-        picked_category_ids = [
-            cid
-            for cid, name in site_info.all_categories.items()
-            if name in json["categories"]
-        ]
-        picked_tag_ids = [
-            cid for cid, name in site_info.all_tags.items() if name in json["tags"]
-        ]
+        picked_category_ids = site_info.category_index().match(
+            json["categories"], fuzzy=site_info.fuzzy_taxonomy
+        )
+        picked_tag_ids = site_info.tag_index().match(
+            json["tags"], fuzzy=site_info.fuzzy_taxonomy
+        )
         return cls(
             picked_category_ids=picked_category_ids,
             picked_tag_ids=picked_tag_ids,
@@ -52,3 +72,64 @@ class PostData:
     keyphrase: str = field(default_factory=lambda: get_from_env("KEYPHRASE"))
     html: str = field(default_factory=str)
     json: PostJsonData = field(default_factory=PostJsonData)
+
+
+@dataclass
+class StopPolicy:
+    interactive: bool = field(
+        default_factory=lambda: get_from_env("INTERACTIVE", "1") == "1"
+    )
+    target_problems: int = field(
+        default_factory=lambda: int(get_from_env("TARGET_PROBLEMS", "0"))
+    )
+    max_iterations: int = field(
+        default_factory=lambda: int(get_from_env("MAX_ITERATIONS", "100"))
+    )
+    # stop after this many iterations without a better draft (0 = never); when
+    # PLATEAU_WINDOW is unset it is off for interactive runs, where the user
+    # decides when to stop, and 3 otherwise
+    plateau_window: int = field(
+        default_factory=lambda: int(get_from_env("PLATEAU_WINDOW", "-1"))
+    )
+    # wall-clock seconds and tokens the loop may spend (0 = unlimited)
+    time_budget: float = field(
+        default_factory=lambda: float(get_from_env("TIME_BUDGET", "0"))
+    )
+    token_budget: int = field(
+        default_factory=lambda: int(get_from_env("TOKEN_BUDGET", "0"))
+    )
+    # improvements generated from the same draft at once, the best one is kept
+    variants: int = field(
+        default_factory=lambda: int(get_from_env("DRAFT_VARIANTS", "1"))
+    )
+
+    def __post_init__(self) -> None:
+        if self.plateau_window < 0:
+            self.plateau_window = 0 if self.interactive else 3
+
+    def stop_reason(
+        self,
+        iteration: int,
+        problems: int,
+        stalled: int,
+        elapsed: float,
+        tokens: int,
+    ) -> str | None:
+        if problems <= self.target_problems:
+            return "target reached"
+        if iteration >= self.max_iterations:
+            return "iteration limit"
+        if self.plateau_window and stalled >= self.plateau_window:
+            return "plateau"
+        if self.time_budget and elapsed >= self.time_budget:
+            return "time budget"
+        if self.token_budget and tokens >= self.token_budget:
+            return "token budget"
+        return None
+
+    def variant_count(self, tokens: int, tokens_per_variant: int) -> int:
+        """Variants the next round can afford within the token budget, at least one."""
+        if not self.token_budget or not tokens_per_variant:
+            return max(1, self.variants)
+        affordable = (self.token_budget - tokens) // tokens_per_variant
+        return max(1, min(self.variants, affordable))
@@ -0,0 +1,179 @@
+import asyncio
+import heapq
+import itertools
+import re
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Mapping
+
+DURATION_PATTERN = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+DURATION_UNITS: dict[str, float] = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+# lower value runs first
+PRIORITY_FINISH = 0
+PRIORITY_CONTINUE = 1
+PRIORITY_START = 2
+
+
+def parse_reset(value: str | None) -> float:
+    """Parse OpenAI reset durations such as '20ms', '1s' or '6m0s' into seconds."""
+    if not value:
+        return 0.0
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    return sum(
+        float(amount) * DURATION_UNITS[unit]
+        for amount, unit in DURATION_PATTERN.findall(value)
+    )
+
+
+class Reservation:
+    def __init__(self, started: float, tokens: int) -> None:
+        self.started: float = started
+        self.tokens: int = tokens
+
+
+class RateLimiter:
+    """Shared requests/tokens per minute budget with a priority queue of callers.
+
+    A limit of 0 disables that local check, the rate limit headers returned by
+    the API are honored either way.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: int = 0,
+        tokens_per_minute: int = 0,
+        window: float = 60.0,
+    ) -> None:
+        self.requests_per_minute: int = requests_per_minute
+        self.tokens_per_minute: int = tokens_per_minute
+        self.window: float = window
+        self._events: deque[Reservation] = deque()
+        self._queue: list[tuple[int, int]] = []
+        self._counter = itertools.count()
+        self._changed: asyncio.Event | None = None
+        self._blocked_until: float = 0.0
+        self._remaining_tokens: int | None = None
+        self._tokens_reset_at: float = 0.0
+        self.stats: dict[str, Any] = {
+            "requests": 0,
+            "throttled": 0,
+            "waited": 0,
+            "wait_time": 0.0,
+        }
+
+    def _notify(self) -> None:
+        if self._changed:
+            self._changed.set()
+        self._changed = asyncio.Event()
+
+    def _prune(self, now: float) -> None:
+        while self._events and self._events[0].started <= now - self.window:
+            self._events.popleft()
+
+    def _delay_for(self, tokens: int, now: float) -> float:
+        self._prune(now)
+        if now < self._blocked_until:
+            return self._blocked_until - now
+
+        if (
+            self._remaining_tokens is not None
+            and now < self._tokens_reset_at
+            and self._remaining_tokens < tokens
+        ):
+            return self._tokens_reset_at - now
+
+        delay = 0.0
+        if self.requests_per_minute and len(self._events) >= self.requests_per_minute:
+            delay = self._events[0].started + self.window - now
+
+        if self.tokens_per_minute and self._events:
+            used = sum(event.tokens for event in self._events)
+            # let a single oversized request through once the window is empty
+            if used + tokens > self.tokens_per_minute:
+                for event in self._events:
+                    used -= event.tokens
+                    if used + tokens <= self.tokens_per_minute or used <= 0:
+                        delay = max(delay, event.started + self.window - now)
+                        break
+        return max(delay, 0.0)
+
+    async def acquire(
+        self, tokens: int, priority: int = PRIORITY_CONTINUE
+    ) -> Reservation:
+        ticket = (priority, next(self._counter))
+        heapq.heappush(self._queue, ticket)
+        if self._changed is None:
+            self._changed = asyncio.Event()
+        started = time.monotonic()
+        waited = False
+        try:
+            while True:
+                now = time.monotonic()
+                delay: float | None = None
+                if self._queue[0] == ticket:
+                    delay = self._delay_for(tokens, now)
+                    if delay <= 0:
+                        heapq.heappop(self._queue)
+                        reservation = Reservation(now, tokens)
+                        self._events.append(reservation)
+                        if self._remaining_tokens is not None:
+                            self._remaining_tokens -= tokens
+                        self.stats["requests"] += 1
+                        if waited:
+                            self.stats["waited"] += 1
+                            self.stats["wait_time"] += now - started
+                        self._notify()
+                        return reservation
+
+                waited = True
+                changed = self._changed
+                try:
+                    await asyncio.wait_for(changed.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+        except BaseException:
+            if ticket in self._queue:
+                self._queue.remove(ticket)
+                heapq.heapify(self._queue)
+                self._notify()
+            raise
+
+    @asynccontextmanager
+    async def reserve(
+        self, tokens: int, priority: int = PRIORITY_CONTINUE
+    ) -> AsyncIterator[Reservation]:
+        yield await self.acquire(tokens, priority)
+
+    def settle(self, reservation: Reservation, tokens: int) -> None:
+        """Replace a reservation's estimate with the tokens the call actually used."""
+        if tokens > 0:
+            reservation.tokens = tokens
+            self._notify()
+
+    def update_from_headers(
+        self, headers: Mapping[str, str], throttled: bool = False
+    ) -> None:
+        now = time.monotonic()
+        remaining_requests = headers.get("x-ratelimit-remaining-requests")
+        remaining_tokens = headers.get("x-ratelimit-remaining-tokens")
+        reset_requests = parse_reset(headers.get("x-ratelimit-reset-requests"))
+        reset_tokens = parse_reset(headers.get("x-ratelimit-reset-tokens"))
+
+        if remaining_requests is not None and int(remaining_requests) <= 0:
+            self._blocked_until = max(self._blocked_until, now + reset_requests)
+        if remaining_tokens is not None:
+            self._remaining_tokens = int(remaining_tokens)
+            self._tokens_reset_at = now + reset_tokens
+
+        if throttled:
+            self.stats["throttled"] += 1
+            retry_after = parse_reset(headers.get("retry-after")) or max(
+                reset_requests, reset_tokens, 1.0
+            )
+            self._blocked_until = max(self._blocked_until, now + retry_after)
+        self._notify()
@@ -0,0 +1,235 @@
+import asyncio
+import logging
+import random
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Mapping, TypeVar
+from urllib.parse import urlparse
+from tracing import span
+
+log = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+RETRY_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+# statuses that guarantee the server did not act on the request
+SAFE_RETRY_STATUSES = {429, 503}
+
+
+class RetryableError(Exception):
+    def __init__(self, status: int, retry_after: float | None, message: str = ""):
+        super().__init__(message or f"HTTP {status}")
+        self.status: int = status
+        self.retry_after: float | None = retry_after
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """Seconds to wait from a Retry-After header, in delta-seconds or HTTP-date form."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def raise_for_retry(status: int, headers: Mapping[str, str], body: str = "") -> None:
+    if status in RETRY_STATUSES:
+        raise RetryableError(
+            status,
+            parse_retry_after(headers.get("Retry-After")),
+            f"HTTP {status}: {body[:200]}",
+        )
+
+
+class HostState:
+    """Circuit breaker and adaptive concurrency limit of one host.
+
+    The limit is halved on every retryable failure and grows by one after a
+    limit's worth of successes (AIMD). After failure_threshold failures in a
+    row the circuit opens: calls fail at once until reset_timeout has passed,
+    then a single probe decides whether it closes again.
+    """
+
+    def __init__(self, max_concurrency: int) -> None:
+        self.max_concurrency: int = max_concurrency
+        self.limit: int = max_concurrency
+        self.in_flight: int = 0
+        self.state: str = "closed"
+        self.failures: int = 0
+        self.successes: int = 0
+        self.opened_at: float = 0.0
+        self._changed: asyncio.Condition | None = None
+
+    def _condition(self) -> asyncio.Condition:
+        if self._changed is None:
+            self._changed = asyncio.Condition()
+        return self._changed
+
+    async def acquire(self) -> None:
+        async with self._condition():
+            await self._condition().wait_for(lambda: self.in_flight < self.limit)
+            self.in_flight += 1
+
+    async def release(self) -> None:
+        async with self._condition():
+            self.in_flight -= 1
+            self._condition().notify_all()
+
+
+class Resilience:
+    """Retries, circuit breakers and concurrency limits shared by HTTP clients.
+
+    Wrap every attempt of a request in call(); the request raises
+    RetryableError (see raise_for_retry) or a connection error for failures
+    worth retrying. Waits honor Retry-After and otherwise use exponential
+    backoff with full jitter.
+    """
+
+    def __init__(
+        self,
+        max_attempts: int = 4,
+        base_delay: float = 0.5,
+        max_delay: float = 30,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30,
+        max_concurrency: int = 8,
+    ) -> None:
+        self.max_attempts: int = max_attempts
+        self.base_delay: float = base_delay
+        self.max_delay: float = max_delay
+        self.failure_threshold: int = failure_threshold
+        self.reset_timeout: float = reset_timeout
+        self.max_concurrency: int = max_concurrency
+        self.hosts: dict[str, HostState] = {}
+        self.stats: dict[str, int] = {
+            "calls": 0,
+            "retries": 0,
+            "failures": 0,
+            "circuits_opened": 0,
+            "rejected": 0,
+        }
+
+    def host(self, url: str) -> HostState:
+        name = urlparse(url).netloc
+        if name not in self.hosts:
+            self.hosts[name] = HostState(self.max_concurrency)
+        return self.hosts[name]
+
+    def _admit(self, name: str, host: HostState) -> None:
+        if host.state == "closed":
+            return
+        if host.state == "open" and time.time() - host.opened_at >= self.reset_timeout:
+            host.state = "half_open"
+            return
+        self.stats["rejected"] += 1
+        raise CircuitOpenError(f"circuit for {name} is open, not calling it")
+
+    def _succeeded(self, host: HostState) -> None:
+        host.failures = 0
+        host.state = "closed"
+        host.successes += 1
+        if host.successes >= host.limit and host.limit < host.max_concurrency:
+            host.limit += 1
+            host.successes = 0
+
+    def _failed(self, name: str, host: HostState) -> None:
+        self.stats["failures"] += 1
+        host.failures += 1
+        host.successes = 0
+        host.limit = max(1, host.limit // 2)
+        if host.state == "half_open" or (
+            host.state == "closed" and host.failures >= self.failure_threshold
+        ):
+            host.state = "open"
+            host.opened_at = time.time()
+            self.stats["circuits_opened"] += 1
+            log.warning("circuit for %s opened after %d failures", name, host.failures)
+
+    def backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+
+    async def call(
+        self, url: str, request: Callable[[], Awaitable[T]], idempotent: bool = True
+    ) -> T:
+        """Run request against the host of url, retrying transient failures.
+
+        Non-idempotent requests are only retried when the server cannot have
+        acted on them: 429/503 responses and failures to connect.
+        """
+        import aiohttp
+
+        name = urlparse(url).netloc
+        host = self.host(url)
+        self.stats["calls"] += 1
+        attempt = 0
+        # the last attempt always raises, so the loop only ends by returning
+        while True:
+            self._admit(name, host)
+            await host.acquire()
+            try:
+                result = await request()
+            except RetryableError as e:
+                error, retry_after = e, e.retry_after
+                retryable = idempotent or e.status in SAFE_RETRY_STATUSES
+            except aiohttp.ClientConnectorError as e:
+                error, retry_after, retryable = e, None, True
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                error, retry_after, retryable = e, None, idempotent
+            except asyncio.CancelledError:
+                if host.state == "half_open":
+                    # let the next call probe instead
+                    host.state, host.opened_at = "open", 0.0
+                raise
+            except Exception:
+                # the host answered, the request itself was refused or invalid
+                self._succeeded(host)
+                raise
+            else:
+                self._succeeded(host)
+                return result
+            finally:
+                await host.release()
+
+            self._failed(name, host)
+            delay = self.backoff(attempt) if retry_after is None else retry_after
+            if (
+                not retryable
+                or attempt + 1 >= self.max_attempts
+                or host.state == "open"
+                or delay > self.max_delay
+            ):
+                raise error
+            self.stats["retries"] += 1
+            log.warning(
+                "%s: %s, retry %d/%d in %.1fs",
+                name,
+                error,
+                attempt + 1,
+                self.max_attempts - 1,
+                delay,
+            )
+            with span("http.retry", host=name, attempt=attempt + 1, delay=delay):
+                await asyncio.sleep(delay)
+            attempt += 1
+
+    def metrics(self) -> dict[str, Any]:
+        return {
+            **self.stats,
+            "open_circuits": [
+                name for name, host in self.hosts.items() if host.state != "closed"
+            ],
+            "limits": {
+                name: host.limit
+                for name, host in self.hosts.items()
+                if host.limit < host.max_concurrency
+            },
+        }
@@ -1,9 +1,12 @@
-from bs4 import BeautifulSoup
+import asyncio
+import logging
 from urllib.parse import urlparse
 import re
-import aiohttp
-import trafilatura
-from readability import Document
+from config import Truncated
+from resilience import Resilience, raise_for_retry
+from tracing import span
+
+log = logging.getLogger(__name__)
 
 
 class Scrape:
@@ -11,67 +14,68 @@ class Scrape:
         self,
         google_api_key: str = "",
         google_cse_id: str = "",
+        resilience: Resilience | None = None,
     ) -> None:
         self.google_api_key: str = google_api_key
         self.google_cse_id: str = google_cse_id
+        self.resilience: Resilience = resilience or Resilience()
         self.google_search_url: str = "https://www.googleapis.com/customsearch/v1"
 
     async def get_top_results_info(self, query: str) -> list[dict[str, str]]:
+        search_results = await self.get_search_links(query)
+        return await self.get_results_info(search_results)
+
+    async def get_search_links(self, query: str) -> list[str]:
         if not self.google_cse_id or not self.google_api_key:
             raise Exception("google cse id and api key are needed for this action!")
         search_results = await self._google_search(query)
+        if not search_results:
+            raise Exception("no search results found")
+        return search_results
+
+    async def get_results_info(self, search_results: list[str]) -> list[dict[str, str]]:
+        import trafilatura
+
         data = []
         if search_results:
             for result in search_results:
                 if len(data) >= 5:
                     break
-                response = trafilatura.fetch_url(result)
+                with span("scrape.fetch", url=result) as fetch_span:
+                    response = await asyncio.to_thread(trafilatura.fetch_url, result)
+                    fetch_span["bytes"] = len(response) if response else 0
                 if not response:
-                    print(f"[-] No response for url: {result}")
+                    log.warning("no response for %s", result)
                     continue
-                print(response[:500])
+                log.debug("page %s: %s", result, Truncated(response))
                 response = re.sub(r"[\x00-\x08\x0B\x0C\x0E-\x1F]", "", response)
                 replacement_character_ratio = response.count("\ufffd") / len(response)
                 if replacement_character_ratio > 0.01:  # e.g., >1% replacement chars
-                    print(f"[!] Skipping replacement garbled page: {result}")
+                    log.warning("skipping garbled page %s", result)
                     continue
 
-                print(
-                    f"[+] Response type: {type(response)} | length: {len(response)} | url: {result}"
-                )
+                log.info("fetched %s (%d chars)", result, len(response))
 
                 try:
-                    doc = Document(response)
-                    summary = doc.summary()
-                    title = doc.title()
-
-                    soup = BeautifulSoup(summary, "lxml")
-                    plain_text = trafilatura.extract(response)
-
-                    info = {
-                        "main_title": str(title),
-                        "headings": str(soup.find_all(["h1", "h2", "h3"])),
-                        "word_count": str(len(plain_text.split()) if plain_text else 0),
-                        "heading_count": str(len(soup.find_all(["h1", "h2", "h3"]))),
-                        "image_count": str(len(soup.find_all("img"))),
-                        "link_count": str(len(soup.find_all("a"))),
-                        "audio_count": str(len(soup.find_all("audio"))),
-                        "video_count": str(len(soup.find_all(["video", "iframe"]))),
-                        "article_body": str(summary),
-                    }
-
+                    with span(
+                        "scrape.parse", url=result, bytes=len(response)
+                    ) as attributes:
+                        info = extract_page_info(response)
+                        attributes["words"] = int(info["word_count"])
                     data.append(info)
 
                 except Exception as e:
-                    print(f"[ERROR] Failed to process {result}: {e}")
+                    log.error("failed to process %s: %s", result, e)
                     continue
         else:
             raise Exception("no search results found")
-        print(f"data len: {len(data)}")
+        log.info("scraped %d pages", len(data))
         return data
 
     async def _google_search(self, query: str, num_results=5) -> list[str]:
-        print("searching google")
+        import aiohttp
+
+        log.info("searching google for %s", query)
         params = {
             "q": query,
             "cx": self.google_cse_id,
@@ -79,10 +83,20 @@ class Scrape:
             "num": 10,
         }
 
-        async with aiohttp.ClientSession() as session:
-            async with session.get(self.google_search_url, params=params) as response:
-                response.raise_for_status()
-                results = await response.json()
+        with span("google.search", query=query) as attributes:
+            async with aiohttp.ClientSession() as session:
+
+                async def search() -> dict:
+                    async with session.get(
+                        self.google_search_url, params=params
+                    ) as response:
+                        attributes["status"] = response.status
+                        raise_for_retry(response.status, response.headers)
+                        response.raise_for_status()
+                        return await response.json()
+
+                results = await self.resilience.call(self.google_search_url, search)
+            attributes["results"] = len(results.get("items", []))
 
         links = []
         for item in results.get("items", []):
@@ -95,13 +109,27 @@ class Scrape:
         return links
 
 
-async def is_valid_image(session, url: str) -> bool:
-    try:
-        async with session.head(url, allow_redirects=True) as resp:
-            if resp.status == 200:
-                content_type = resp.headers.get("Content-Type", "")
-                return content_type.startswith("image/")
-    except Exception as e:
-        print(e)
-        return False
-    return False
+def extract_page_info(response: str) -> dict[str, str]:
+    # heavy parsers are only imported by the stage that scrapes
+    import trafilatura
+    from bs4 import BeautifulSoup
+    from readability import Document
+
+    doc = Document(response)
+    summary = doc.summary()
+    title = doc.title()
+
+    soup = BeautifulSoup(summary, "lxml")
+    plain_text = trafilatura.extract(response)
+
+    return {
+        "main_title": str(title),
+        "headings": str(soup.find_all(["h1", "h2", "h3"])),
+        "word_count": str(len(plain_text.split()) if plain_text else 0),
+        "heading_count": str(len(soup.find_all(["h1", "h2", "h3"]))),
+        "image_count": str(len(soup.find_all("img"))),
+        "link_count": str(len(soup.find_all("a"))),
+        "audio_count": str(len(soup.find_all("audio"))),
+        "video_count": str(len(soup.find_all(["video", "iframe"]))),
+        "article_body": str(summary),
+    }
@@ -0,0 +1,307 @@
+"""Long-running generation service with a local HTTP job API.
+
+    python service.py --port 8780
+    python service.py --socket /run/aibot.sock
+
+A cold `python main.py` re-imports the SDKs, refetches the taxonomy, starts
+node for every Yoast analysis and begins with empty caches. The service pays
+that once: the OpenAI client, the WordPress and link check sessions, the
+taxonomy indexes and the Yoast node processes stay warm between jobs.
+
+    POST /jobs       {"keyphrases": ["..."], "site": "", "max_attempts": 3}
+    GET  /jobs       all jobs, ?status=running to filter
+    GET  /jobs/{id}  status, last checkpointed stage, timings of finished stages
+    POST /analyze    {"keyword", "title", "meta", "slug", "text", ...} -> problems
+    GET  /status     sites, queue counts and client statistics
+
+Jobs go through the STATE_DB queue of worker.py, so `worker.py status` lists
+them and jobs of a stopped service are claimed again once their lease runs
+out. The API has no authentication; bind it to localhost or a unix socket.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import socket
+import time
+from typing import Any
+from aiohttp import web
+import tracing
+from config import Settings, load_settings, setup_logging, validate_environment
+from job_queue import STATUSES, JobQueue
+from main import create_analyzer
+from sites import SiteRegistry
+from worker import process_job
+
+log = logging.getLogger(__name__)
+
+
+def error_response(message: str, status: int = 400) -> web.Response:
+    return web.json_response({"error": message}, status=status)
+
+
+async def read_body(request: web.Request) -> dict[str, Any] | None:
+    """The JSON object of the request body, or None when it is not one."""
+    try:
+        body = await request.json()
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return None
+    return body if isinstance(body, dict) else None
+
+
+class Service:
+    def __init__(
+        self,
+        settings: Settings,
+        publish: bool = True,
+        concurrency: int = 2,
+        poll_interval: float = 10,
+        retry_delay: float = 60,
+        refresh_interval: float = 3600,
+    ) -> None:
+        self.settings: Settings = settings
+        self.publish: bool = publish
+        self.concurrency: int = concurrency
+        self.poll_interval: float = poll_interval
+        self.retry_delay: float = retry_delay
+        # seconds between taxonomy and site index refreshes (0 = never)
+        self.refresh_interval: float = refresh_interval
+        self.owner: str = f"{socket.gethostname()}:{os.getpid()}:service"
+        self.queue = JobQueue(
+            settings.state_db, lease_seconds=settings.job_lease_seconds
+        )
+        self._registry: SiteRegistry | None = None
+        # stage timings of the jobs this process is running, filled in as stages end
+        self.progress: dict[int, dict[str, float]] = {}
+        self.started: float = time.time()
+        self._wake = asyncio.Event()
+        self._tasks: list[asyncio.Task] = []
+
+    @property
+    def registry(self) -> SiteRegistry:
+        if self._registry is None:
+            raise RuntimeError("The service has not started")
+        return self._registry
+
+    async def start(self, app: web.Application | None = None) -> None:
+        self._registry = SiteRegistry(self.settings, self.publish, self.concurrency)
+        for runner in self.registry.runners.values():
+            validate_environment(self.settings, runner.site_info)
+        await self.registry.prepare()
+        self._tasks = [
+            asyncio.create_task(self._work_loop(site))
+            for site, limit in self.registry.concurrency.items()
+            for _ in range(limit)
+        ]
+        if self.refresh_interval:
+            self._tasks.append(asyncio.create_task(self._refresh_loop()))
+        log.info("service %s started for sites %s", self.owner, self.registry.names)
+
+    async def stop(self, app: web.Application | None = None) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._registry is not None:
+            await self._registry.close()
+        self.queue.close()
+
+    async def _work_loop(self, site: str) -> None:
+        runner = self.registry.get(site)
+        while True:
+            job = await self.queue.claim(self.owner, sites=[site])
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), self.poll_interval)
+                except TimeoutError:
+                    pass
+                continue
+            log.info(
+                "%s %s (attempt %d)",
+                job["site"] or "-",
+                job["keyphrase"],
+                job["attempts"],
+            )
+            timings = self.progress[job["id"]] = {}
+            try:
+                await process_job(
+                    self.queue, runner, job, self.owner, self.retry_delay, timings
+                )
+            except Exception:
+                # the job is claimed again once its lease runs out
+                log.exception("job %d of %s crashed", job["id"], job["keyphrase"])
+            finally:
+                self.progress.pop(job["id"], None)
+
+    async def _refresh_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            for runner in self.registry.runners.values():
+                runner.wordpress.clear_taxonomy_cache()
+            try:
+                await self.registry.prepare()
+            except Exception as e:
+                log.warning("taxonomy refresh failed, keeping the old one: %s", e)
+
+    async def enqueue(
+        self, keyphrases: list[str], site: str = "", max_attempts: int = 3
+    ) -> dict[str, int]:
+        self.registry.get(site)
+        await self.queue.enqueue(keyphrases, max_attempts=max_attempts, site=site)
+        # wake the idle loops instead of waiting for their next poll
+        self._wake.set()
+        self._wake.clear()
+        return await self.queue.job_ids(keyphrases, site)
+
+    async def job(self, job_id: int) -> dict[str, Any] | None:
+        job = await self.queue.job(job_id)
+        if job is None:
+            return None
+        runner = self.registry.runners.get(job["site"])
+        if runner is not None:
+            job["stage"] = await runner.store.get_stage(job["keyphrase"])
+        if job_id in self.progress:
+            job["timings"] = dict(self.progress[job_id])
+        return job
+
+    async def analyze(self, body: dict[str, Any]) -> list[dict[str, Any]]:
+        analyzer = create_analyzer(self.registry.yoast_pool)
+        error = await asyncio.to_thread(
+            analyzer.analyze,
+            keyword=body.get("keyword", ""),
+            synonyms=body.get("synonyms", ""),
+            title=body.get("title", ""),
+            meta=body.get("meta", ""),
+            slug=body.get("slug", ""),
+            text=body["text"],
+            permalink=body.get("permalink", ""),
+            locale=body.get("locale", "fa"),
+        )
+        if error:
+            raise RuntimeError(error)
+        return analyzer.get_analysis()
+
+    async def status(self) -> dict[str, Any]:
+        return {
+            "owner": self.owner,
+            "uptime": round(time.time() - self.started, 1),
+            "sites": self.registry.names,
+            "queue": await self.queue.counts(),
+            "running": sorted(self.progress),
+            "http": self.registry.resilience.metrics(),
+            "hedging": self.registry.hedger.stats,
+            "links": self.registry.link_checker.stats,
+            "yoast": self.registry.yoast_pool.stats,
+            "llm_store": (
+                self.registry.llm_store.stats if self.registry.llm_store else None
+            ),
+        }
+
+    def app(self) -> web.Application:
+        app = web.Application(client_max_size=16 * 1024**2)
+        app.on_startup.append(self.start)
+        app.on_cleanup.append(self.stop)
+        app.router.add_post("/jobs", self.handle_enqueue)
+        app.router.add_get("/jobs", self.handle_jobs)
+        app.router.add_get("/jobs/{id:\\d+}", self.handle_job)
+        app.router.add_post("/analyze", self.handle_analyze)
+        app.router.add_get("/status", self.handle_status)
+        return app
+
+    async def handle_enqueue(self, request: web.Request) -> web.Response:
+        body = await read_body(request)
+        if body is None:
+            return error_response("the body must be a JSON object")
+        keyphrases = body.get("keyphrases") or (
+            [body["keyphrase"]] if body.get("keyphrase") else []
+        )
+        if not isinstance(keyphrases, list) or not all(
+            isinstance(k, str) and k for k in keyphrases
+        ):
+            return error_response("keyphrases must be a list of strings")
+        if not keyphrases:
+            return error_response("keyphrases must not be empty")
+        try:
+            max_attempts = int(body.get("max_attempts", 3))
+        except (TypeError, ValueError):
+            return error_response("max_attempts must be an integer")
+        try:
+            ids = await self.enqueue(keyphrases, body.get("site", ""), max_attempts)
+        except KeyError as e:
+            return error_response(e.args[0], status=404)
+        return web.json_response({"jobs": ids}, status=202)
+
+    async def handle_jobs(self, request: web.Request) -> web.Response:
+        status = request.query.get("status")
+        if status is not None and status not in STATUSES:
+            return error_response(f"status must be one of {STATUSES}")
+        return web.json_response({"jobs": await self.queue.jobs(status)})
+
+    async def handle_job(self, request: web.Request) -> web.Response:
+        try:
+            job_id = int(request.match_info["id"])
+        except ValueError:
+            return error_response("the job id must be an integer")
+        job = await self.job(job_id)
+        if job is None:
+            return error_response("no such job", status=404)
+        return web.json_response(job)
+
+    async def handle_analyze(self, request: web.Request) -> web.Response:
+        body = await read_body(request)
+        if body is None or not isinstance(body.get("text"), str):
+            return error_response("text is required")
+        try:
+            problems = await self.analyze(body)
+        except RuntimeError as e:
+            return error_response(str(e), status=502)
+        return web.json_response({"problems": problems})
+
+    async def handle_status(self, request: web.Request) -> web.Response:
+        return web.json_response(await self.status())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Generation service with a local job API"
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8780)
+    parser.add_argument("--socket", help="listen on this unix socket instead")
+    parser.add_argument(
+        "--concurrency", type=int, default=2, help="jobs per site at a time"
+    )
+    parser.add_argument("--no-publish", action="store_true")
+    parser.add_argument("--poll-interval", type=float, default=10)
+    parser.add_argument("--retry-delay", type=float, default=60)
+    parser.add_argument(
+        "--refresh-interval",
+        type=float,
+        default=3600,
+        help="seconds between taxonomy refreshes (0 = never)",
+    )
+    args = parser.parse_args()
+
+    settings = load_settings()
+    setup_logging(settings)
+    tracer = tracing.configure(settings.trace_file)
+    service = Service(
+        settings,
+        publish=not args.no_publish,
+        concurrency=args.concurrency,
+        poll_interval=args.poll_interval,
+        retry_delay=args.retry_delay,
+        refresh_interval=args.refresh_interval,
+    )
+    if args.socket:
+        web.run_app(service.app(), path=args.socket)
+    else:
+        web.run_app(service.app(), host=args.host, port=args.port)
+    if tracer.enabled:
+        tracing.print_report(tracer.summary())
+        tracer.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+import asyncio
+import json
+import logging
+import math
+import re
+import sqlite3
+import threading
+from collections import Counter
+from html import unescape
+from typing import Any, Callable
+from taxonomy import normalize_term
+from tracing import span
+from wordpress import WordPressClient
+
+log = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS site_posts (
+    site TEXT NOT NULL,
+    id INTEGER NOT NULL,
+    title TEXT NOT NULL,
+    excerpt TEXT NOT NULL,
+    link TEXT NOT NULL,
+    categories TEXT NOT NULL,
+    tags TEXT NOT NULL,
+    modified_gmt TEXT NOT NULL,
+    focus_keyword TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (site, id)
+);
+"""
+TOKEN_PATTERN = re.compile(r"\w+(?:\u200c\w+)*")
+TAG_PATTERN = re.compile(r"<[^>]+>")
+STOPWORDS = {
+    normalize_term(word)
+    for word in "و در به از که این آن را با برای است یک تا های ها می هم یا بر".split()
+}
+
+
+def tokenize(text: str) -> list[str]:
+    tokens = (normalize_term(token) for token in TOKEN_PATTERN.findall(text))
+    return [token for token in tokens if token and token not in STOPWORDS]
+
+
+def html_to_text(html: str) -> str:
+    return " ".join(unescape(TAG_PATTERN.sub(" ", html)).split())
+
+
+def field_text(value: Any) -> str:
+    # core routes send {"rendered": html}, the snapshot route plain text
+    return html_to_text(value.get("rendered", "") if isinstance(value, dict) else value)
+
+
+class SiteIndex:
+    """Local copy of a site's published posts, searched with BM25.
+
+    sync() pulls every post once and afterwards only the posts modified since
+    the newest one stored, so picking related articles needs no REST calls.
+    Sites with the yoast-rest-api snapshot route are synced through it, which
+    also brings each post's focus keyword.
+    """
+
+    def __init__(
+        self, path: str, site_url: str, k1: float = 1.5, b: float = 0.75
+    ) -> None:
+        self.path: str = path
+        self.site_url: str = site_url
+        self.k1: float = k1
+        self.b: float = b
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        columns = [
+            row[1] for row in self._conn.execute("PRAGMA table_info(site_posts)")
+        ]
+        if "focus_keyword" not in columns:
+            self._conn.execute(
+                "ALTER TABLE site_posts "
+                "ADD COLUMN focus_keyword TEXT NOT NULL DEFAULT ''"
+            )
+        self._conn.commit()
+        self._sync_lock = asyncio.Lock()
+        self._posts: list[dict[str, Any]] | None = None
+        self._postings: dict[str, list[tuple[int, int]]] = {}
+        self._lengths: list[int] = []
+
+    def _execute(self, fn: Callable[[sqlite3.Connection], Any]) -> Any:
+        with self._lock:
+            try:
+                result = fn(self._conn)
+                self._conn.commit()
+                return result
+            except Exception:
+                self._conn.rollback()
+                raise
+
+    async def _run(self, fn: Callable[[sqlite3.Connection], Any]) -> Any:
+        return await asyncio.to_thread(self._execute, fn)
+
+    def close(self) -> None:
+        self._conn.close()
+
+    async def last_modified(self) -> str | None:
+        row = await self._run(
+            lambda conn: conn.execute(
+                "SELECT MAX(modified_gmt) FROM site_posts WHERE site = ?",
+                (self.site_url,),
+            ).fetchone()
+        )
+        return row[0]
+
+    async def sync(self, wordpress: WordPressClient, full: bool = False) -> int:
+        """Store new and changed posts; returns how many were fetched.
+
+        Posts modified in the second of the newest stored one are fetched
+        again and replaced. Posts that were unpublished or deleted are only
+        dropped by a full sync.
+        """
+        async with self._sync_lock:
+            with span("site_index.sync", full=full) as attributes:
+                modified_after = None if full else await self.last_modified()
+                snapshot = await wordpress.get_snapshot(
+                    modified_after, taxonomies=False
+                )
+                posts = (
+                    snapshot["posts"]
+                    if snapshot is not None
+                    else await wordpress.get_published_posts(modified_after)
+                )
+                attributes["snapshot"] = snapshot is not None
+                rows = [
+                    (
+                        self.site_url,
+                        post["id"],
+                        field_text(post.get("title", "")),
+                        field_text(post.get("excerpt", "")),
+                        post.get("link", ""),
+                        json.dumps(post.get("categories", [])),
+                        json.dumps(post.get("tags", [])),
+                        post.get("modified_gmt", ""),
+                        post.get("focus_keyword") or "",
+                    )
+                    for post in posts
+                ]
+
+                def store(conn: sqlite3.Connection) -> None:
+                    if full:
+                        conn.execute(
+                            "DELETE FROM site_posts WHERE site = ?", (self.site_url,)
+                        )
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO site_posts "
+                        "(site, id, title, excerpt, link, categories, tags, "
+                        "modified_gmt, focus_keyword) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        rows,
+                    )
+
+                await self._run(store)
+                attributes["posts"] = len(rows)
+                if rows or full:
+                    self._posts = None
+                log.info(
+                    "site index: %d posts synced from %s", len(rows), self.site_url
+                )
+                return len(rows)
+
+    async def _load(self) -> list[dict[str, Any]]:
+        if self._posts is not None:
+            return self._posts
+        rows = await self._run(
+            lambda conn: conn.execute(
+                "SELECT id, title, excerpt, link, categories, tags, focus_keyword "
+                "FROM site_posts WHERE site = ? ORDER BY id",
+                (self.site_url,),
+            ).fetchall()
+        )
+        posts = [
+            {
+                "id": post_id,
+                "title": title,
+                "excerpt": excerpt,
+                "link": link,
+                "categories": json.loads(categories),
+                "tags": json.loads(tags),
+                "focus_keyword": focus_keyword,
+            }
+            for post_id, title, excerpt, link, categories, tags, focus_keyword in rows
+        ]
+        postings: dict[str, list[tuple[int, int]]] = {}
+        lengths: list[int] = []
+        for doc, post in enumerate(posts):
+            # title and focus keyword say more about the topic than the excerpt
+            tokens = (
+                tokenize(post["title"]) * 2
+                + tokenize(post["focus_keyword"]) * 2
+                + tokenize(post["excerpt"])
+            )
+            lengths.append(len(tokens))
+            for token, count in Counter(tokens).items():
+                postings.setdefault(token, []).append((doc, count))
+        self._posts, self._postings, self._lengths = posts, postings, lengths
+        return posts
+
+    async def search(self, query: str, limit: int = 5) -> list[dict[str, Any]]:
+        posts = await self._load()
+        if not posts:
+            return []
+        average = sum(self._lengths) / len(self._lengths) or 1
+        scores: dict[int, float] = {}
+        for token in set(tokenize(query)):
+            postings = self._postings.get(token, [])
+            if not postings:
+                continue
+            idf = math.log(
+                1 + (len(posts) - len(postings) + 0.5) / (len(postings) + 0.5)
+            )
+            for doc, count in postings:
+                norm = self.k1 * (1 - self.b + self.b * self._lengths[doc] / average)
+                scores[doc] = scores.get(doc, 0.0) + idf * count * (self.k1 + 1) / (
+                    count + norm
+                )
+        ranked = sorted(scores, key=scores.__getitem__, reverse=True)[:limit]
+        return [{**posts[doc], "score": round(scores[doc], 4)} for doc in ranked]
+
+    async def related_articles(
+        self,
+        keyphrase: str,
+        categories: dict[int, str],
+        tags: dict[int, str],
+        limit: int = 5,
+    ) -> list[dict[str, Any]]:
+        """Top posts for the keyphrase in the format of WordPressClient.get_posts_info."""
+        return [
+            {
+                "title": post["title"],
+                "first_paragraphs": post["excerpt"],
+                "categories": [
+                    categories.get(cid, str(cid)) for cid in post["categories"]
+                ],
+                "tags": [tags.get(tid, str(tid)) for tid in post["tags"]],
+                "url": post["link"],
+            }
+            for post in await self.search(keyphrase, limit)
+        ]
@@ -0,0 +1,153 @@
+"""Several WordPress sites served by one process.
+
+The sites file is a JSON list, one entry per site:
+
+    [
+        {
+            "name": "coffee",
+            "site_url": "https://coffee.example/",
+            "wp_api_user": "bot",
+            "wp_api_pass_env": "COFFEE_WP_PASS",
+            "concurrency": 2,
+            "related_article_ids": "12,40"
+        }
+    ]
+
+wp_api_pass may be given directly instead of wp_api_pass_env. Every site gets
+its own WordPress connection pool, taxonomy and state; the scraper, the
+OpenAI client and scheduler, the link checker and the Yoast node processes
+are shared, so SERP and scrape results of a keyphrase are reused by every
+site that writes about it.
+"""
+
+import asyncio
+import json
+from typing import Any
+from aibot import create_openai_client
+from batch import KeyphraseRunner
+from config import Settings, get_from_env, parse_related_article_data
+from hedging import Hedger
+from link_check import LinkChecker
+from models import SiteInfo
+from main import create_resilience
+from rate_limit import RateLimiter
+from scrape import Scrape
+from state_store import StateStore
+from yoast import YoastPool
+
+
+def read_sites_file(path: str) -> list[dict[str, Any]]:
+    with open(path, "r", encoding="utf-8") as f:
+        entries = json.load(f)
+    names: set[str] = set()
+    for entry in entries:
+        for key in ("name", "site_url", "wp_api_user"):
+            if not entry.get(key):
+                raise ValueError(f"Site entry {entry} in {path} has no {key}")
+        if entry["name"] in names:
+            raise ValueError(f"Site '{entry['name']}' is listed twice in {path}")
+        if "/" in entry["name"]:
+            raise ValueError(f"Site name '{entry['name']}' must not contain '/'")
+        names.add(entry["name"])
+    return entries
+
+
+class SiteRegistry:
+    """One KeyphraseRunner per site plus the clients the sites share."""
+
+    def __init__(
+        self, settings: Settings, publish: bool = True, concurrency: int = 2
+    ) -> None:
+        self.settings: Settings = settings
+        # per-host breakers and limits, shared so every site sees Google's state
+        self.resilience = create_resilience(settings)
+        self.scraper = Scrape(
+            google_api_key=settings.google_api,
+            google_cse_id=settings.google_cse,
+            resilience=self.resilience,
+        )
+        self.rate_limiter = RateLimiter(
+            requests_per_minute=settings.openai_rpm,
+            tokens_per_minute=settings.openai_tpm,
+        )
+        self.hedger = Hedger(
+            percentile=settings.hedge_percentile, max_ratio=settings.hedge_max_ratio
+        )
+        self.link_checker = LinkChecker(
+            StateStore(settings.state_db), settings.link_check
+        )
+        self.openai_client, self.llm_store = create_openai_client(
+            settings.api_key, settings.llm_cache_mode, settings.llm_cache_dir
+        )
+        self.yoast_pool = YoastPool(settings.yoast_workers)
+        self.runners: dict[str, KeyphraseRunner] = {}
+        # jobs of a site that run at once, so a slow host only holds up its own jobs
+        self.concurrency: dict[str, int] = {}
+
+        entries = (
+            read_sites_file(settings.sites_file)
+            if settings.sites_file
+            else [{"name": ""}]
+        )
+        for entry in entries:
+            self.add(entry, publish, concurrency)
+
+    def add(
+        self, entry: dict[str, Any], publish: bool = True, concurrency: int = 2
+    ) -> KeyphraseRunner:
+        if entry["name"]:
+            site_info = SiteInfo(
+                site_url=entry["site_url"],
+                wp_api_user=entry["wp_api_user"],
+                wp_api_pass=(
+                    get_from_env(entry["wp_api_pass_env"])
+                    if entry.get("wp_api_pass_env")
+                    else entry.get("wp_api_pass", "")
+                ),
+            )
+        else:
+            # no sites file: the single site of SITE_URL/WP_API_USER/WP_API_PASS
+            site_info = SiteInfo()
+        related = entry.get("related_article_ids")
+        runner = KeyphraseRunner(
+            self.settings,
+            site_info,
+            publish,
+            site=entry["name"],
+            related_article_data=(
+                parse_related_article_data(str(related))
+                if related is not None
+                else None
+            ),
+            scraper=self.scraper,
+            rate_limiter=self.rate_limiter,
+            hedger=self.hedger,
+            link_checker=self.link_checker,
+            resilience=self.resilience,
+            max_connections=int(entry.get("max_connections", 8)),
+            openai_client=self.openai_client,
+            yoast_pool=self.yoast_pool,
+        )
+        self.runners[entry["name"]] = runner
+        self.concurrency[entry["name"]] = int(entry.get("concurrency", concurrency))
+        return runner
+
+    @property
+    def names(self) -> list[str]:
+        return list(self.runners)
+
+    def get(self, name: str) -> KeyphraseRunner:
+        if name not in self.runners:
+            raise KeyError(f"Unknown site '{name}', expected one of {self.names}")
+        return self.runners[name]
+
+    async def prepare(self) -> None:
+        """Fetch taxonomy and related articles of every site at once."""
+        await asyncio.gather(*(runner.prepare() for runner in self.runners.values()))
+
+    async def close(self) -> None:
+        for runner in self.runners.values():
+            await runner.wordpress.close()
+        await self.link_checker.close()
+        await self.openai_client.close()
+        await asyncio.to_thread(self.yoast_pool.close)
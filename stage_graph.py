@@ -0,0 +1,80 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Sequence
+
+
+class StageGraph:
+    """Run async stages as soon as the stages they depend on are finished.
+
+    Each stage function is called with the results of its dependencies as
+    keyword arguments named after those stages. Start and end times of every
+    stage are kept in timeline so the critical path can be inspected.
+    """
+
+    def __init__(self) -> None:
+        self._stages: dict[str, tuple[Callable[..., Awaitable[Any]], list[str]]] = {}
+        self.timeline: dict[str, dict[str, Any]] = {}
+
+    def add(
+        self,
+        name: str,
+        fn: Callable[..., Awaitable[Any]],
+        deps: Sequence[str] = (),
+    ) -> None:
+        if name in self._stages:
+            raise ValueError(f"Stage '{name}' is already defined")
+        missing = [dep for dep in deps if dep not in self._stages]
+        if missing:
+            # dependencies must be added first, which also rules out cycles
+            raise ValueError(f"Stage '{name}' depends on unknown stages: {missing}")
+        self._stages[name] = (fn, list(deps))
+
+    async def run(self) -> dict[str, Any]:
+        started = time.perf_counter()
+        tasks: dict[str, asyncio.Task] = {}
+
+        async def run_stage(name: str) -> Any:
+            fn, deps = self._stages[name]
+            inputs = {dep: await tasks[dep] for dep in deps}
+            begin = time.perf_counter()
+            try:
+                return await fn(**inputs)
+            finally:
+                self.timeline[name] = {
+                    "start": begin - started,
+                    "end": time.perf_counter() - started,
+                    "deps": deps,
+                }
+
+        for name in self._stages:
+            tasks[name] = asyncio.create_task(run_stage(name))
+        try:
+            results = await asyncio.gather(*tasks.values())
+        except BaseException:
+            for task in tasks.values():
+                task.cancel()
+            raise
+        return dict(zip(tasks, results))
+
+    def critical_path(self) -> list[str]:
+        if not self.timeline:
+            return []
+        name = max(self.timeline, key=lambda stage: self.timeline[stage]["end"])
+        path = [name]
+        while self.timeline[name]["deps"]:
+            name = max(
+                self.timeline[name]["deps"],
+                key=lambda stage: self.timeline[stage]["end"],
+            )
+            path.append(name)
+        return path[::-1]
+
+    def print_timeline(self) -> None:
+        critical = self.critical_path()
+        for name, span in sorted(self.timeline.items(), key=lambda s: s[1]["start"]):
+            marker = "*" if name in critical else " "
+            print(
+                f"{marker} {name:<12} {span['start']:>8.2f}s -> {span['end']:>8.2f}s "
+                f"({span['end'] - span['start']:.2f}s)"
+            )
+        print(f"critical path: {' -> '.join(critical)}")
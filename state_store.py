@@ -0,0 +1,267 @@
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from typing import Any, Callable
+from tracing import span
+
+# checkpoints in the order the pipeline reaches them
+STAGES: list[str] = ["searched", "scraped", "generated", "optimized", "published"]
+
+
+def _stage_rank(column: str) -> str:
+    """SQL position of the stage in column within STAGES, -1 when it has none."""
+    ranks = " ".join(f"WHEN '{stage}' THEN {i}" for i, stage in enumerate(STAGES))
+    return f"CASE {column} {ranks} ELSE -1 END"
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS keyphrases (
+    keyphrase TEXT PRIMARY KEY,
+    stage TEXT,
+    post_id INTEGER,
+    updated_at REAL
+);
+CREATE TABLE IF NOT EXISTS serp_results (
+    keyphrase TEXT PRIMARY KEY,
+    links TEXT NOT NULL,
+    created_at REAL
+);
+CREATE TABLE IF NOT EXISTS scraped_pages (
+    keyphrase TEXT PRIMARY KEY,
+    results TEXT NOT NULL,
+    created_at REAL
+);
+CREATE TABLE IF NOT EXISTS drafts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    keyphrase TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    json TEXT NOT NULL,
+    html TEXT NOT NULL,
+    created_at REAL,
+    UNIQUE (keyphrase, version)
+);
+CREATE TABLE IF NOT EXISTS link_checks (
+    url TEXT PRIMARY KEY,
+    result TEXT NOT NULL,
+    checked_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS analyses (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    keyphrase TEXT NOT NULL,
+    draft_version INTEGER NOT NULL,
+    problems INTEGER NOT NULL,
+    analysis TEXT NOT NULL,
+    created_at REAL
+);
+"""
+
+
+class StateStore:
+    """Pipeline state of every keyphrase in an embedded sqlite database.
+
+    Holds SERP links, scraped pages, every draft version, every Yoast analysis
+    and the publish status, plus the last completed stage so an interrupted run
+    can resume where it stopped.
+    """
+
+    def __init__(self, path: str = "pipeline.db", site: str = "") -> None:
+        self.path: str = path
+        # drafts, analyses and stages are kept per site, SERP links and
+        # scraped pages are shared by every site that uses the keyphrase
+        self.site: str = site
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+
+    def _execute(self, fn: Callable[[sqlite3.Connection], Any]) -> Any:
+        with self._lock:
+            try:
+                result = fn(self._conn)
+                self._conn.commit()
+                return result
+            except Exception:
+                self._conn.rollback()
+                raise
+
+    async def _run(self, fn: Callable[[sqlite3.Connection], Any]) -> Any:
+        with span("store.query", path=self.path):
+            return await asyncio.to_thread(self._execute, fn)
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def _key(self, keyphrase: str) -> str:
+        return f"{self.site}/{keyphrase}" if self.site else keyphrase
+
+    async def get_stage(self, keyphrase: str) -> str | None:
+        row = await self._run(
+            lambda conn: conn.execute(
+                "SELECT stage FROM keyphrases WHERE keyphrase = ?",
+                (self._key(keyphrase),),
+            ).fetchone()
+        )
+        return row[0] if row else None
+
+    async def stage_done(self, keyphrase: str, stage: str) -> bool:
+        current = await self.get_stage(keyphrase)
+        return current is not None and STAGES.index(current) >= STAGES.index(stage)
+
+    async def set_stage(
+        self, keyphrase: str, stage: str, post_id: int | None = None
+    ) -> None:
+        """Record that keyphrase reached stage; a stage never moves backwards."""
+        if stage not in STAGES:
+            raise ValueError(f"Unknown stage '{stage}'")
+        await self._run(
+            lambda conn: conn.execute(
+                "INSERT INTO keyphrases (keyphrase, stage, post_id, updated_at) "
+                "VALUES (?, ?, ?, ?) ON CONFLICT(keyphrase) DO UPDATE SET "
+                f"stage = CASE WHEN {_stage_rank('excluded.stage')} > "
+                f"{_stage_rank('keyphrases.stage')} "
+                "THEN excluded.stage ELSE keyphrases.stage END, "
+                "post_id = COALESCE(excluded.post_id, keyphrases.post_id), "
+                "updated_at = excluded.updated_at",
+                (self._key(keyphrase), stage, post_id, time.time()),
+            )
+        )
+
+    async def get_post_id(self, keyphrase: str) -> int | None:
+        row = await self._run(
+            lambda conn: conn.execute(
+                "SELECT post_id FROM keyphrases WHERE keyphrase = ?",
+                (self._key(keyphrase),),
+            ).fetchone()
+        )
+        return row[0] if row else None
+
+    async def save_serp(self, keyphrase: str, links: list[str]) -> None:
+        await self._run(
+            lambda conn: conn.execute(
+                "INSERT OR REPLACE INTO serp_results VALUES (?, ?, ?)",
+                (keyphrase, json.dumps(links, ensure_ascii=False), time.time()),
+            )
+        )
+        await self.set_stage(keyphrase, "searched")
+
+    async def get_serp(self, keyphrase: str) -> list[str] | None:
+        row = await self._run(
+            lambda conn: conn.execute(
+                "SELECT links FROM serp_results WHERE keyphrase = ?", (keyphrase,)
+            ).fetchone()
+        )
+        return json.loads(row[0]) if row else None
+
+    async def save_scraped(self, keyphrase: str, results: list[dict]) -> None:
+        await self._run(
+            lambda conn: conn.execute(
+                "INSERT OR REPLACE INTO scraped_pages VALUES (?, ?, ?)",
+                (keyphrase, json.dumps(results, ensure_ascii=False), time.time()),
+            )
+        )
+        await self.set_stage(keyphrase, "scraped")
+
+    async def get_scraped(self, keyphrase: str) -> list[dict] | None:
+        row = await self._run(
+            lambda conn: conn.execute(
+                "SELECT results FROM scraped_pages WHERE keyphrase = ?", (keyphrase,)
+            ).fetchone()
+        )
+        return json.loads(row[0]) if row else None
+
+    async def save_draft(self, keyphrase: str, json_output: dict, html: str) -> int:
+        def insert(conn: sqlite3.Connection) -> int:
+            # the version is computed in the INSERT itself so two processes
+            # sharing the database cannot both take the same one
+            (version,) = conn.execute(
+                "INSERT INTO drafts (keyphrase, version, json, html, created_at) "
+                "SELECT ?, COALESCE(MAX(version) + 1, 0), ?, ?, ? "
+                "FROM drafts WHERE keyphrase = ? RETURNING version",
+                (
+                    self._key(keyphrase),
+                    json.dumps(json_output, ensure_ascii=False),
+                    html,
+                    time.time(),
+                    self._key(keyphrase),
+                ),
+            ).fetchone()
+            return version
+
+        with span("store.write", table="drafts", bytes=len(html)):
+            return await self._run(insert)
+
+    async def get_latest_draft(self, keyphrase: str) -> tuple[dict, str, int] | None:
+        row = await self._run(
+            lambda conn: conn.execute(
+                "SELECT json, html, version FROM drafts WHERE keyphrase = ? "
+                "ORDER BY version DESC LIMIT 1",
+                (self._key(keyphrase),),
+            ).fetchone()
+        )
+        return (json.loads(row[0]), row[1], row[2]) if row else None
+
+    async def get_drafts(self, keyphrase: str) -> list[dict[str, Any]]:
+        rows = await self._run(
+            lambda conn: conn.execute(
+                "SELECT version, json, html, created_at FROM drafts "
+                "WHERE keyphrase = ? ORDER BY version",
+                (self._key(keyphrase),),
+            ).fetchall()
+        )
+        return [
+            {"version": v, "json": json.loads(j), "html": h, "created_at": c}
+            for v, j, h, c in rows
+        ]
+
+    async def save_analysis(
+        self, keyphrase: str, draft_version: int, analysis: list[dict]
+    ) -> None:
+        data = json.dumps(analysis, ensure_ascii=False)
+        with span("store.write", table="analyses", bytes=len(data)):
+            await self._run(
+                lambda conn: conn.execute(
+                    "INSERT INTO analyses "
+                    "(keyphrase, draft_version, problems, analysis, created_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (
+                        self._key(keyphrase),
+                        draft_version,
+                        len(analysis),
+                        data,
+                        time.time(),
+                    ),
+                )
+            )
+
+    async def get_link_checks(self, urls: list[str]) -> dict[str, dict]:
+        def select(conn: sqlite3.Connection) -> list[tuple[str, str]]:
+            rows: list[tuple[str, str]] = []
+            # stay below sqlite's limit on bound parameters
+            for i in range(0, len(urls), 500):
+                chunk = urls[i : i + 500]
+                rows += conn.execute(
+                    "SELECT url, result FROM link_checks WHERE url IN "
+                    f"({', '.join('?' * len(chunk))})",
+                    chunk,
+                ).fetchall()
+            return rows
+
+        return {url: json.loads(result) for url, result in await self._run(select)}
+
+    async def save_link_checks(self, results: list[dict]) -> None:
+        await self._run(
+            lambda conn: conn.executemany(
+                "INSERT OR REPLACE INTO link_checks VALUES (?, ?, ?)",
+                [
+                    (
+                        result["url"],
+                        json.dumps(result, ensure_ascii=False),
+                        result["checked_at"],
+                    )
+                    for result in results
+                ],
+            )
+        )
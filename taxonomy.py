@@ -0,0 +1,103 @@
+import logging
+import re
+import unicodedata
+from difflib import SequenceMatcher
+
+log = logging.getLogger(__name__)
+
+# Arabic code points that models and editors use for their Persian look-alikes
+CHARACTER_MAP = str.maketrans(
+    {
+        "ي": "ی",
+        "ى": "ی",
+        "ئ": "ی",
+        "ك": "ک",
+        "ة": "ه",
+        "ۀ": "ه",
+        "أ": "ا",
+        "إ": "ا",
+        "ٱ": "ا",
+        "آ": "ا",
+        "ؤ": "و",
+        **{chr(0x06F0 + i): str(i) for i in range(10)},
+        **{chr(0x0660 + i): str(i) for i in range(10)},
+    }
+)
+# diacritics, tatweel, ZWNJ/ZWJ and other invisible marks
+IGNORED_PATTERN = re.compile(r"[\u064B-\u065F\u0670\u0640\u200B-\u200F\u00AD\uFEFF]")
+SPACE_PATTERN = re.compile(r"[\s\-_]+")
+
+
+def normalize_term(name: str) -> str:
+    """Key under which spelling variants of a Persian term compare equal.
+
+    ی/ي, ک/ك, diacritics, ZWNJ and spacing differences are all folded, so
+    "می‌خواهم", "مي خواهم" and "میخواهم" share one key.
+    """
+    text = unicodedata.normalize("NFKC", name).translate(CHARACTER_MAP).lower()
+    text = IGNORED_PATTERN.sub("", text)
+    return SPACE_PATTERN.sub("", text)
+
+
+def _bigrams(key: str) -> set[str]:
+    return {key[i : i + 2] for i in range(len(key) - 1)} or {key}
+
+
+class TaxonomyIndex:
+    """Name to id lookup of one site's tags or categories.
+
+    Built once per taxonomy; exact lookups are a dict access on the normalized
+    name. fuzzy lookups only run for names without an exact match and narrow
+    the candidates through a bigram index before comparing strings.
+    """
+
+    def __init__(self, terms: dict[int, str]) -> None:
+        self.terms: dict[int, str] = terms
+        self._ids: dict[str, list[int]] = {}
+        for term_id, name in terms.items():
+            self._ids.setdefault(normalize_term(name), []).append(term_id)
+        self._bigrams: dict[str, set[str]] | None = None
+
+    def lookup(self, name: str) -> list[int]:
+        return self._ids.get(normalize_term(name), [])
+
+    def _bigram_index(self) -> dict[str, set[str]]:
+        if self._bigrams is None:
+            self._bigrams = {}
+            for key in self._ids:
+                for bigram in _bigrams(key):
+                    self._bigrams.setdefault(bigram, set()).add(key)
+        return self._bigrams
+
+    def suggest(
+        self, name: str, cutoff: float = 0.75, candidates: int = 20
+    ) -> str | None:
+        """Closest existing term name, or None when nothing is similar enough."""
+        key = normalize_term(name)
+        if not key:
+            return None
+        index = self._bigram_index()
+        shared: dict[str, int] = {}
+        for bigram in _bigrams(key):
+            for other in index.get(bigram, ()):
+                shared[other] = shared.get(other, 0) + 1
+        best, best_ratio = None, cutoff
+        for other in sorted(shared, key=shared.__getitem__, reverse=True)[:candidates]:
+            ratio = SequenceMatcher(None, key, other).ratio()
+            if ratio >= best_ratio:
+                best, best_ratio = other, ratio
+        return self.terms[self._ids[best][0]] if best else None
+
+    def match(self, names: list[str], fuzzy: bool = False) -> list[int]:
+        picked: list[int] = []
+        for name in names:
+            ids = self.lookup(name)
+            if not ids:
+                suggestion = self.suggest(name) if fuzzy else None
+                if suggestion is None:
+                    log.warning("no term named '%s'", name)
+                    continue
+                log.warning("no term named '%s', using '%s'", name, suggestion)
+                ids = self.lookup(suggestion)
+            picked.extend(term_id for term_id in ids if term_id not in picked)
+        return picked
@@ -0,0 +1,54 @@
+import unittest
+from html_blocks import apply_block_patches, split_blocks
+
+HTML = (
+    "<h2>عنوان</h2>"
+    "<ul><li>یک<ul><li>دو</li></ul> ادامه</li><li>سه</li></ul>"
+    "<blockquote><p>نقل</p><blockquote>درونی</blockquote>پایان</blockquote>"
+    "<p>آخر</p>"
+)
+
+
+class ApplyBlockPatchesTest(unittest.TestCase):
+    def test_nested_blocks_belong_to_the_outermost_block(self) -> None:
+        self.assertEqual(
+            [block["html"] for block in split_blocks(HTML)],
+            [
+                "<h2>عنوان</h2>",
+                "<li>یک<ul><li>دو</li></ul> ادامه</li>",
+                "<li>سه</li>",
+                "<blockquote><p>نقل</p><blockquote>درونی</blockquote>پایان</blockquote>",
+                "<p>آخر</p>",
+            ],
+        )
+
+    def test_patches_replace_whole_blocks(self) -> None:
+        patched = apply_block_patches(
+            HTML,
+            [
+                {"id": 1, "html": "<li>تازه</li>"},
+                {"id": 3, "html": " <blockquote>کوتاه</blockquote> "},
+            ],
+        )
+        self.assertEqual(
+            patched,
+            "<h2>عنوان</h2><ul><li>تازه</li><li>سه</li></ul>"
+            "<blockquote>کوتاه</blockquote><p>آخر</p>",
+        )
+
+    def test_malformed_and_unknown_patches_are_skipped(self) -> None:
+        with self.assertLogs("html_blocks", "WARNING"):
+            patched = apply_block_patches(
+                HTML, [{"id": "1", "html": "<p>x</p>"}, {"id": 9, "html": "<p>x</p>"}]
+            )
+        self.assertEqual(patched, HTML)
+
+    def test_unclosed_inner_tags_end_with_their_parent(self) -> None:
+        self.assertEqual(
+            [block["html"] for block in split_blocks("<li>یک <p>دو</li><p>سه</p>")],
+            ["<li>یک <p>دو</li>", "<p>سه</p>"],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,78 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from job_queue import JobQueue
+
+
+class JobQueueTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "queue.db")
+        self.queues: list[JobQueue] = []
+
+    def tearDown(self) -> None:
+        for queue in self.queues:
+            queue.close()
+        self.directory.cleanup()
+
+    def open(self, lease_seconds: float = 300) -> JobQueue:
+        # one connection per queue, like separate worker processes
+        queue = JobQueue(self.path, lease_seconds=lease_seconds)
+        self.queues.append(queue)
+        return queue
+
+    async def test_claim_is_exclusive(self) -> None:
+        first, second = self.open(), self.open()
+        await first.enqueue(["قهوه دمی"])
+        jobs = await asyncio.gather(first.claim("a"), second.claim("b"))
+        claimed = [job for job in jobs if job is not None]
+        self.assertEqual(len(claimed), 1)
+        self.assertEqual(claimed[0]["keyphrase"], "قهوه دمی")
+        self.assertIsNone(await first.claim("c"))
+
+    async def test_expired_lease_is_reclaimed(self) -> None:
+        first, second = self.open(lease_seconds=0.05), self.open(lease_seconds=0.05)
+        await first.enqueue(["قهوه دمی"])
+        job = await first.claim("a")
+        assert job is not None
+        self.assertIsNone(await second.claim("b"))
+        await asyncio.sleep(0.1)
+        reclaimed = await second.claim("b")
+        assert reclaimed is not None
+        self.assertEqual(reclaimed["id"], job["id"])
+        self.assertEqual(reclaimed["attempts"], 2)
+        # the worker that lost the lease cannot finish the job any more
+        self.assertFalse(await first.complete(job["id"], "a", {}))
+        self.assertFalse(await first.heartbeat(job["id"], "a"))
+        self.assertTrue(await second.complete(job["id"], "b", {"status": "done"}))
+
+    async def test_fail_respects_max_attempts(self) -> None:
+        queue = self.open()
+        await queue.enqueue(["قهوه دمی"], max_attempts=2)
+        for attempt, status in ((1, "pending"), (2, "failed")):
+            job = await queue.claim("a")
+            assert job is not None
+            self.assertEqual(job["attempts"], attempt)
+            self.assertTrue(await queue.fail(job["id"], "a", "boom", retry_delay=0))
+            stored = await queue.job(job["id"])
+            assert stored is not None
+            self.assertEqual(stored["status"], status)
+            self.assertEqual(stored["last_error"], "boom")
+        self.assertIsNone(await queue.claim("a"))
+
+    async def test_expired_lease_on_last_attempt_fails(self) -> None:
+        queue = self.open(lease_seconds=0.05)
+        await queue.enqueue(["قهوه دمی"], max_attempts=1)
+        job = await queue.claim("a")
+        assert job is not None
+        await asyncio.sleep(0.1)
+        self.assertIsNone(await queue.claim("b"))
+        stored = await queue.job(job["id"])
+        assert stored is not None
+        self.assertEqual(stored["status"], "failed")
+        self.assertEqual(stored["last_error"], "lease expired")
+
+
+if __name__ == "__main__":
+    unittest.main()
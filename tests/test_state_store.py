@@ -0,0 +1,37 @@
+import os
+import tempfile
+import unittest
+from state_store import StateStore
+
+
+class StateStoreTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.store = StateStore(os.path.join(self.directory.name, "state.db"))
+
+    def tearDown(self) -> None:
+        self.store.close()
+        self.directory.cleanup()
+
+    async def test_stage_only_advances(self) -> None:
+        await self.store.set_stage("قهوه دمی", "optimized")
+        await self.store.set_stage("قهوه دمی", "generated")
+        self.assertEqual(await self.store.get_stage("قهوه دمی"), "optimized")
+        await self.store.set_stage("قهوه دمی", "published", post_id=7)
+        await self.store.set_stage("قهوه دمی", "scraped")
+        self.assertEqual(await self.store.get_stage("قهوه دمی"), "published")
+        self.assertEqual(await self.store.get_post_id("قهوه دمی"), 7)
+
+    async def test_draft_versions_count_up(self) -> None:
+        versions = [
+            await self.store.save_draft("قهوه دمی", {"n": n}, "<p>x</p>")
+            for n in range(3)
+        ]
+        self.assertEqual(versions, [0, 1, 2])
+        latest = await self.store.get_latest_draft("قهوه دمی")
+        assert latest is not None
+        self.assertEqual(latest[0], {"n": 2})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,23 @@
+import unittest
+from taxonomy import normalize_term
+
+
+class NormalizeTermTest(unittest.TestCase):
+    def test_spelling_variants_share_a_key(self) -> None:
+        variants = ["می\u200cخواهم", "مي خواهم", "میخواهم", "مي\u200cخواهم"]
+        self.assertEqual(len({normalize_term(name) for name in variants}), 1)
+
+    def test_arabic_letters_fold_to_persian(self) -> None:
+        self.assertEqual(normalize_term("كتاب"), normalize_term("کتاب"))
+        self.assertEqual(normalize_term("خانة"), normalize_term("خانه"))
+
+    def test_digits_case_and_separators(self) -> None:
+        self.assertEqual(normalize_term("Coffee-Shop ۱۴۰۴"), "coffeeshop1404")
+        self.assertEqual(normalize_term("coffee_shop ١٤٠٤"), "coffeeshop1404")
+
+    def test_different_terms_stay_apart(self) -> None:
+        self.assertNotEqual(normalize_term("قهوه"), normalize_term("چای"))
+
+
+if __name__ == "__main__":
+    unittest.main()
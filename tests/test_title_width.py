@@ -0,0 +1,32 @@
+import json
+import os
+import unittest
+from title_width import title_width
+
+FIXTURE = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "benchmarks",
+    "fixtures",
+    "title_widths.json",
+)
+# percent; Yoast's title width limit is 600px, so 1.5% is about 9px
+TOLERANCE = 1.5
+
+
+class TitleWidthTest(unittest.TestCase):
+    def test_widths_match_the_measured_reference(self) -> None:
+        with open(FIXTURE, "r", encoding="utf-8") as f:
+            fixture = json.load(f)
+        for item in fixture["titles"]:
+            with self.subTest(title=item["title"]):
+                width = title_width(item["title"], fixture["size"])
+                self.assertLessEqual(
+                    abs(width - item["width"]) / item["width"] * 100, TOLERANCE
+                )
+
+    def test_kerning_applies_to_latin_pairs(self) -> None:
+        self.assertLess(title_width("AV"), title_width("A") + title_width("V"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,298 @@
+"""Pixel width of SEO titles from a table of glyph advances.
+
+yoast_seo.js used to create a node-canvas for every analysis only to measure
+the title. The same number comes from glyph_advances.json: the advance widths
+of DejaVu Sans, the font node-canvas resolves "sans-serif" to on Linux, for
+Latin, punctuation and every Persian/Arabic letter in each of its joining
+forms, plus the pair kerning of the font's kern table outside the Arabic
+block. benchmarks/fixtures/title_widths.json holds reference widths that
+tests/test_title_width.py checks against; benchmarks/title_width_check.py
+measures them again.
+
+    python title_width.py measure "عنوان مقاله"
+    python title_width.py build /usr/share/fonts/truetype/dejavu/DejaVuSans.ttf
+"""
+
+import argparse
+import json
+import os
+import struct
+import unicodedata
+from functools import lru_cache
+from typing import Any
+
+TABLE_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "glyph_advances.json"
+)
+# the font yoast_seo.js measured with
+FONT_SIZE = 22.0
+FORMS = ("isolated", "final", "initial", "medial")
+ZWNJ, ZWJ = "\u200c", "\u200d"
+COVERED_RANGES = (
+    (0x0020, 0x007F),
+    (0x00A0, 0x0100),
+    (0x0600, 0x0700),
+    (0x2000, 0x2070),
+    (0x20AC, 0x20AD),
+)
+
+
+@lru_cache(maxsize=1)
+def load_table(path: str = TABLE_PATH) -> dict[str, Any]:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _joining(table: dict[str, Any], char: str) -> str:
+    if char == ZWJ:
+        return "C"
+    if unicodedata.category(char) in ("Mn", "Me"):
+        return "T"
+    return table["joining"].get(char, "U")
+
+
+def _form(joins_previous: bool, joins_next: bool) -> int:
+    return FORMS.index(
+        ("medial" if joins_next else "final")
+        if joins_previous
+        else ("initial" if joins_next else "isolated")
+    )
+
+
+def glyph_advances(text: str, table: dict[str, Any] | None = None) -> list[int]:
+    """Advance of every glyph of text in font units, after Arabic joining."""
+    table = table or load_table()
+    joining = [_joining(table, char) for char in text]
+    advances: list[int] = []
+    previous = "U"
+    i = 0
+    while i < len(text):
+        char, kind = text[i], joining[i]
+        if kind == "T":
+            advances.append(table["advances"].get(char, 0))
+            i += 1
+            continue
+        following = next(
+            (j for j in range(i + 1, len(text)) if joining[j] != "T"), None
+        )
+        next_kind = joining[following] if following is not None else "U"
+        joins_previous = previous in ("D", "C") and kind in ("D", "R", "C")
+        ligature = table["ligatures"].get(
+            text[i : following + 1] if following is not None else ""
+        )
+        if ligature and following == i + 1:
+            # lam followed by alef is drawn as one glyph
+            advances.append(ligature[1 if joins_previous else 0])
+            previous = "R"
+            i += 2
+            continue
+        joins_next = kind in ("D", "C") and next_kind in ("D", "R", "C")
+        forms = table["forms"].get(char)
+        if forms:
+            advances.append(forms[_form(joins_previous, joins_next)])
+        else:
+            advances.append(
+                table["advances"].get(char, table["fallback"])
+                + table.get("kerning", {}).get(text[i : i + 2], 0)
+            )
+        previous = kind
+        i += 1
+    return advances
+
+
+@lru_cache(maxsize=4096)
+def title_width(text: str, size: float = FONT_SIZE) -> float:
+    """Width in pixels the title takes at size px, as canvas measureText reports it."""
+    table = load_table()
+    return round(sum(glyph_advances(text, table)) * size / table["units_per_em"], 2)
+
+
+def _read_kerning(data: bytes, offset: int) -> dict[tuple[int, int], int]:
+    """Glyph pair adjustments of the horizontal format 0 subtables of a kern table."""
+    pairs: dict[tuple[int, int], int] = {}
+    (subtables,) = struct.unpack(">H", data[offset + 2 : offset + 4])
+    start = offset + 4
+    for _ in range(subtables):
+        _, length, coverage = struct.unpack(">HHH", data[start : start + 6])
+        # format 0, horizontal, not minimum or cross-stream values
+        if coverage >> 8 == 0 and coverage & 0x7 == 0x1:
+            (count,) = struct.unpack(">H", data[start + 6 : start + 8])
+            for j in range(count):
+                left, right, value = struct.unpack(
+                    ">HHh", data[start + 14 + 6 * j :][:6]
+                )
+                pairs[(left, right)] = value
+        start += length
+    return pairs
+
+
+def _read_font(
+    path: str,
+) -> tuple[int, dict[int, int], list[int], dict[tuple[int, int], int]]:
+    """unitsPerEm, Unicode cmap, glyph advances and kerning pairs of a TrueType font."""
+    with open(path, "rb") as f:
+        data = f.read()
+    (num_tables,) = struct.unpack(">H", data[4:6])
+    tables: dict[bytes, int] = {}
+    for i in range(num_tables):
+        tag, _, offset, _ = struct.unpack(">4sIII", data[12 + 16 * i : 28 + 16 * i])
+        tables[tag] = offset
+    (units_per_em,) = struct.unpack(">H", data[tables[b"head"] + 18 :][:2])
+    (metrics,) = struct.unpack(">H", data[tables[b"hhea"] + 34 :][:2])
+    (glyphs,) = struct.unpack(">H", data[tables[b"maxp"] + 4 :][:2])
+    hmtx = tables[b"hmtx"]
+    advances = [
+        struct.unpack(">H", data[hmtx + 4 * i :][:2])[0] for i in range(metrics)
+    ]
+    advances += [advances[-1]] * (glyphs - metrics)
+
+    cmap_offset = tables[b"cmap"]
+    (subtables,) = struct.unpack(">H", data[cmap_offset + 2 :][:2])
+    cmap: dict[int, int] = {}
+    for i in range(subtables):
+        platform, encoding, offset = struct.unpack(
+            ">HHI", data[cmap_offset + 4 + 8 * i :][:8]
+        )
+        if (platform, encoding) not in ((3, 1), (3, 10), (0, 3), (0, 4)):
+            continue
+        start = cmap_offset + offset
+        (fmt,) = struct.unpack(">H", data[start : start + 2])
+        if fmt == 4:
+            (seg_x2,) = struct.unpack(">H", data[start + 6 : start + 8])
+            ends = start + 14
+            starts = ends + seg_x2 + 2
+            deltas = starts + seg_x2
+            range_offsets = deltas + seg_x2
+            for s in range(seg_x2 // 2):
+                (end,) = struct.unpack(">H", data[ends + 2 * s :][:2])
+                (first,) = struct.unpack(">H", data[starts + 2 * s :][:2])
+                (delta,) = struct.unpack(">h", data[deltas + 2 * s :][:2])
+                (range_offset,) = struct.unpack(">H", data[range_offsets + 2 * s :][:2])
+                for code in range(first, min(end, 0xFFFE) + 1):
+                    if range_offset == 0:
+                        glyph = (code + delta) & 0xFFFF
+                    else:
+                        at = range_offsets + 2 * s + range_offset + 2 * (code - first)
+                        (glyph,) = struct.unpack(">H", data[at : at + 2])
+                        glyph = (glyph + delta) & 0xFFFF if glyph else 0
+                    if glyph:
+                        cmap.setdefault(code, glyph)
+        elif fmt == 12:
+            (groups,) = struct.unpack(">I", data[start + 12 : start + 16])
+            for g in range(groups):
+                first, end, glyph = struct.unpack(
+                    ">III", data[start + 16 + 12 * g :][:12]
+                )
+                for code in range(first, end + 1):
+                    cmap.setdefault(code, glyph + code - first)
+    kerning = _read_kerning(data, tables[b"kern"]) if b"kern" in tables else {}
+    return units_per_em, cmap, advances, kerning
+
+
+def build_table(font_path: str) -> dict[str, Any]:
+    units_per_em, cmap, glyph_advance, glyph_kerning = _read_font(font_path)
+
+    def advance(code: int) -> int | None:
+        return glyph_advance[cmap[code]] if code in cmap else None
+
+    advances: dict[str, int] = {}
+    for first, end in COVERED_RANGES:
+        for code in range(first, end):
+            if (width := advance(code)) is not None:
+                advances[chr(code)] = width
+    advances[ZWNJ] = advances[ZWJ] = 0
+
+    # joining forms and lam-alef ligatures from the presentation form blocks
+    forms: dict[str, dict[str, int]] = {}
+    ligatures: dict[str, dict[str, int]] = {}
+    for code in list(range(0xFB50, 0xFE00)) + list(range(0xFE70, 0xFF00)):
+        decomposition = unicodedata.decomposition(chr(code)).split()
+        width = advance(code)
+        if len(decomposition) < 2 or width is None:
+            continue
+        form = decomposition[0].strip("<>")
+        base = "".join(chr(int(part, 16)) for part in decomposition[1:])
+        if form not in FORMS:
+            continue
+        if len(base) == 1:
+            forms.setdefault(base, {})[form] = width
+        elif base[0] == "ل" and form in ("isolated", "final"):
+            ligatures.setdefault(base, {})[form] = width
+
+    joining: dict[str, str] = {}
+    form_table: dict[str, list[int]] = {}
+    for char, char_forms in sorted(forms.items()):
+        isolated = char_forms.get("isolated", advances.get(char))
+        if isolated is None:
+            continue
+        final = char_forms.get("final", isolated)
+        if "initial" in char_forms or "medial" in char_forms:
+            joining[char] = "D"
+            initial = char_forms.get("initial", isolated)
+            form_table[char] = [
+                isolated,
+                final,
+                initial,
+                char_forms.get("medial", initial),
+            ]
+        elif "final" in char_forms:
+            joining[char] = "R"
+            form_table[char] = [isolated, final, isolated, final]
+    # tatweel joins on both sides but has no presentation forms
+    joining["ـ"] = "D"
+
+    # Arabic letters are drawn with their joining forms, not the glyphs the
+    # pairs are defined for
+    kerned = [char for char in advances if not 0x0600 <= ord(char) < 0x0700]
+    kerning = {
+        left + right: glyph_kerning[pair]
+        for left in kerned
+        for right in kerned
+        if (pair := (cmap.get(ord(left), 0), cmap.get(ord(right), 0))) in glyph_kerning
+    }
+
+    letters = [advances[c] for c in "abcdefghijklmnopqrstuvwxyz" if c in advances]
+    return {
+        "font": os.path.basename(font_path),
+        "units_per_em": units_per_em,
+        "fallback": (
+            round(sum(letters) / len(letters)) if letters else units_per_em // 2
+        ),
+        "advances": advances,
+        "joining": joining,
+        "forms": form_table,
+        "kerning": kerning,
+        "ligatures": {
+            text: [forms.get("isolated", 0), forms.get("final", 0)]
+            for text, forms in sorted(ligatures.items())
+            if len(text) == 2
+        },
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Pixel width of SEO titles")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="write glyph_advances.json from a font")
+    build.add_argument("font")
+    build.add_argument("-o", "--output", default=TABLE_PATH)
+    measure = commands.add_parser("measure", help="print the width of titles")
+    measure.add_argument("titles", nargs="+")
+    measure.add_argument("--size", type=float, default=FONT_SIZE)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        table = build_table(args.font)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(table, f, ensure_ascii=False, indent=1, sort_keys=True)
+        print(
+            f"{len(table['advances'])} characters, {len(table['forms'])} with "
+            f"joining forms written to {args.output}"
+        )
+    else:
+        for title in args.titles:
+            print(f"{title_width(title, args.size):8.2f}px  {title}")
+
+
+if __name__ == "__main__":
+    main()
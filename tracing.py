@@ -0,0 +1,203 @@
+"""Spans for every stage of the pipeline, exported as JSON lines.
+
+    with span("scrape.fetch", url=url) as s:
+        html = fetch(url)
+        s["bytes"] = len(html)
+
+Tracing is off until configure() is given a file; span() is then a cheap
+no-op. Summarize an exported file with:
+
+    python tracing.py trace.jsonl
+"""
+
+import argparse
+import atexit
+import json
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Iterator
+
+_current_span: ContextVar[str | None] = ContextVar("current_span", default=None)
+# spans buffered before they are appended to the export file
+FLUSH_EVERY = 64
+
+
+class Tracer:
+    def __init__(self, path: str = "") -> None:
+        self.path: str = path
+        self.trace_id: str = uuid.uuid4().hex
+        self._lock = threading.Lock()
+        self._lines: list[str] = []
+        self._closed: bool = False
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path) and not self._closed
+
+    @contextmanager
+    def span(self, name: str, **attributes: Any) -> Iterator[dict[str, Any]]:
+        """Time the block; keys added to the yielded dict become span attributes."""
+        if not self.enabled:
+            yield attributes
+            return
+        span_id = uuid.uuid4().hex[:16]
+        parent_id = _current_span.get()
+        token = _current_span.set(span_id)
+        start = time.time()
+        started = time.perf_counter()
+        status = "ok"
+        try:
+            yield attributes
+        except BaseException as e:
+            status = "error"
+            attributes.setdefault("error", f"{type(e).__name__}: {e}")
+            raise
+        finally:
+            duration = time.perf_counter() - started
+            _current_span.reset(token)
+            self._write(
+                {
+                    "trace_id": self.trace_id,
+                    "span_id": span_id,
+                    "parent_id": parent_id,
+                    "name": name,
+                    "start": start,
+                    "duration": round(duration, 6),
+                    "status": status,
+                    "attributes": attributes,
+                }
+            )
+
+    def _write(self, record: dict[str, Any]) -> None:
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        # spans also end on the worker threads of asyncio.to_thread
+        with self._lock:
+            if self._closed:
+                return
+            self._lines.append(line + "\n")
+            if len(self._lines) >= FLUSH_EVERY:
+                self._flush()
+
+    def _flush(self) -> None:
+        # called with the lock held; the file is only open while writing
+        if not self._lines:
+            return
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.writelines(self._lines)
+        self._lines = []
+
+    def flush(self) -> None:
+        with self._lock:
+            if self.path:
+                self._flush()
+
+    def summary(self) -> dict[str, dict[str, float]]:
+        """p50/p95 per span type of the spans this tracer has written so far."""
+        if not self.path:
+            return {}
+        self.flush()
+        spans = [
+            record
+            for record in read_spans(self.path)
+            if record["trace_id"] == self.trace_id
+        ]
+        return summarize(spans)
+
+    def close(self) -> None:
+        with self._lock:
+            if self.path and not self._closed:
+                self._flush()
+            self._closed = True
+
+
+_tracer: Tracer = Tracer()
+
+
+def configure(path: str) -> Tracer:
+    """Send the spans of this process to path (appended); an empty path turns tracing off."""
+    global _tracer
+    _tracer.close()
+    _tracer = Tracer(path)
+    # a run that exits before close() still exports its buffered spans
+    atexit.register(_tracer.close)
+    return _tracer
+
+
+def get_tracer() -> Tracer:
+    return _tracer
+
+
+def span(name: str, **attributes: Any):
+    return _tracer.span(name, **attributes)
+
+
+def read_spans(path: str) -> list[dict[str, Any]]:
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def percentile(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def summarize(spans: list[dict[str, Any]]) -> dict[str, dict[str, float]]:
+    durations: dict[str, list[float]] = {}
+    errors: dict[str, int] = {}
+    for record in spans:
+        durations.setdefault(record["name"], []).append(record["duration"])
+        if record.get("status") == "error":
+            errors[record["name"]] = errors.get(record["name"], 0) + 1
+    return {
+        name: {
+            "count": len(values),
+            "errors": errors.get(name, 0),
+            "total": round(sum(values), 3),
+            "p50": round(percentile(values, 0.5), 3),
+            "p95": round(percentile(values, 0.95), 3),
+            "max": round(max(values), 3),
+        }
+        for name, values in sorted(
+            durations.items(), key=lambda item: sum(item[1]), reverse=True
+        )
+    }
+
+
+def print_report(summary: dict[str, dict[str, float]]) -> None:
+    print(
+        f"{'span':<22} {'count':>6} {'errors':>6} {'total':>10} "
+        f"{'p50':>9} {'p95':>9} {'max':>9}"
+    )
+    for name, row in summary.items():
+        print(
+            f"{name:<22} {row['count']:>6} {row['errors']:>6} {row['total']:>9.2f}s "
+            f"{row['p50']:>8.3f}s {row['p95']:>8.3f}s {row['max']:>8.3f}s"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="p50/p95 per span type")
+    parser.add_argument("path", help="JSON lines file written by the tracer")
+    parser.add_argument("--trace-id", help="only the spans of this run")
+    parser.add_argument("--json", action="store_true", help="print the summary as JSON")
+    args = parser.parse_args()
+    spans = read_spans(args.path)
+    if args.trace_id:
+        spans = [record for record in spans if record["trace_id"] == args.trace_id]
+    summary = summarize(spans)
+    if args.json:
+        print(json.dumps(summary, indent=2))
+    else:
+        print_report(summary)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,75 @@
-import aiohttp
+import asyncio
 import json
+import logging
+import time
+from datetime import datetime, timedelta
 from html import unescape
-from bs4 import BeautifulSoup
-from typing import Any
+from typing import Any, Callable, Coroutine, Sequence
 from urllib.parse import urlparse
 from models import PostData
+from resilience import Resilience, raise_for_retry
+from tracing import span
+
+log = logging.getLogger(__name__)
 
 
 class WordPressClient:
-    def __init__(self, username: str, password: str, site_url: str) -> None:
+    def __init__(
+        self,
+        username: str,
+        password: str,
+        site_url: str,
+        max_connections: int = 8,
+        resilience: Resilience | None = None,
+        taxonomy_ttl: float = 600,
+    ) -> None:
         self.username: str = username
         self.password: str = password
         self.site_url: str = site_url
+        self.max_connections: int = max_connections
+        self.resilience: Resilience = resilience or Resilience(
+            max_concurrency=max_connections
+        )
+        # in-flight and finished taxonomy requests with their start time, shared
+        # by concurrent callers and fetched again once older than taxonomy_ttl
+        self.taxonomy_ttl: float = taxonomy_ttl
+        self._taxonomy_tasks: dict[str, tuple[asyncio.Task, float]] = {}
+        self._session = None
+        # False once the site answered that the plugin's snapshot route is missing
+        self._snapshot_supported: bool | None = None
+
+    def _get_session(self):
+        """One pooled session per site, opened on the first request."""
+        import aiohttp
+
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                auth=(
+                    aiohttp.BasicAuth(self.username, self.password)
+                    if self.username and self.password
+                    else None
+                ),
+                connector=aiohttp.TCPConnector(limit_per_host=self.max_connections),
+            )
+        return self._session
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+
+    async def _request(
+        self, method: str, url: str, **kwargs: Any
+    ) -> tuple[int, Any, str]:
+        """Status, headers and body of a request, retried on transient failures."""
+        session = self._get_session()
+
+        async def send() -> tuple[int, Any, str]:
+            async with session.request(method, url, **kwargs) as resp:
+                body = await resp.text()
+                raise_for_retry(resp.status, resp.headers, body)
+                return resp.status, resp.headers, body
+
+        return await self.resilience.call(url, send, idempotent=method != "POST")
 
     def _is_url(self, item: str) -> bool:
         try:
@@ -20,7 +78,7 @@ class WordPressClient:
         except Exception:
             return False
 
-    async def _resolve_page_hierarchy(self, url: str, session) -> dict[str, Any]:
+    async def _resolve_page_hierarchy(self, url: str) -> dict[str, Any]:
         path: str = urlparse(url).path.strip("/")
         segments: list[str] = path.split("/")
         if not segments:
@@ -34,37 +92,38 @@ class WordPressClient:
                 f"{self.site_url}/wp-json/wp/v2/pages?slug={segment}&parent={parent_id}"
             )
 
-            async with session.get(api) as resp:
-                resp.raise_for_status()
-                data = await resp.json()
+            status, _, body = await self._request("GET", api)
+            if status != 200:
+                raise Exception(f"Failed to get pages: {status}, {body}")
+            data = json.loads(body)
 
-                if not data:
-                    raise ValueError(
-                        f"Could not resolve segment '{segment}' under parent '{parent_id}'"
-                    )
+            if not data:
+                raise ValueError(
+                    f"Could not resolve segment '{segment}' under parent '{parent_id}'"
+                )
 
-                page = data[0]
-                parent_id = page["id"]
+            page = data[0]
+            parent_id = page["id"]
 
         return page
 
     async def _resolve_post_or_page(
-        self, *, post_id: int, post_slug: str, post_url: str, session
+        self, *, post_id: int, post_slug: str, post_url: str
     ) -> dict[str, Any]:
         if post_id != -1:
             for ep in [
                 f"{self.site_url}/wp-json/wp/v2/pages/{post_id}",
                 f"{self.site_url}/wp-json/wp/v2/posts/{post_id}",
             ]:
-                async with session.get(ep) as resp:
-                    if resp.status == 200:
-                        return await resp.json()
+                status, _, body = await self._request("GET", ep)
+                if status == 200:
+                    return json.loads(body)
 
             raise ValueError(f"No post/page found for ID={post_id}")
 
         if post_url:
             try:
-                return await self._resolve_page_hierarchy(post_url, session)
+                return await self._resolve_page_hierarchy(post_url)
             except Exception:
                 pass
 
@@ -72,21 +131,21 @@ class WordPressClient:
             post_slug = slug
 
         if post_slug:
-            async with session.get(
-                f"{self.site_url}/wp-json/wp/v2/pages?slug={post_slug}"
-            ) as resp:
-                if resp.status == 200:
-                    data = await resp.json()
-                    if data:
-                        return data[0]
-
-            async with session.get(
-                f"{self.site_url}/wp-json/wp/v2/posts?slug={post_slug}"
-            ) as resp:
-                if resp.status == 200:
-                    data = await resp.json()
-                    if data:
-                        return data[0]
+            status, _, body = await self._request(
+                "GET", f"{self.site_url}/wp-json/wp/v2/pages?slug={post_slug}"
+            )
+            if status == 200:
+                data = json.loads(body)
+                if data:
+                    return data[0]
+
+            status, _, body = await self._request(
+                "GET", f"{self.site_url}/wp-json/wp/v2/posts?slug={post_slug}"
+            )
+            if status == 200:
+                data = json.loads(body)
+                if data:
+                    return data[0]
 
             raise ValueError(f"No post/page found for slug='{post_slug}'")
 
@@ -99,75 +158,182 @@ class WordPressClient:
         post_url: str = "",
         fields: list = ["title", "first_paragraphs", "categories", "tags", "url"],
     ) -> dict[str, Any]:
-        auth = (
-            aiohttp.BasicAuth(self.username, self.password)
-            if self.username and self.password
-            else None
-        )
+        from bs4 import BeautifulSoup
 
-        async with aiohttp.ClientSession(auth=auth) as session:
+        with span(
+            "wordpress.request",
+            op="post_info",
+            post=post_id if post_id != -1 else post_url or post_slug,
+        ):
             wp_obj: dict[str, Any] = await self._resolve_post_or_page(
-                post_id=post_id, post_slug=post_slug, post_url=post_url, session=session
+                post_id=post_id,
+                post_slug=post_slug,
+                post_url=post_url,
             )
-            result: dict[str, Any] = {}
-
-            if "title" in fields:
-                title: str = BeautifulSoup(
-                    wp_obj.get("title", {}).get("rendered", ""), "html.parser"
-                ).get_text()
-                result["title"] = unescape(title).strip()
-
-            if "first_paragraphs" in fields:
-                content_html = wp_obj.get("content", {}).get("rendered", "")
-                content_text = (
-                    BeautifulSoup(content_html, "html.parser").get_text().strip()
-                )
-                paragraphs: list[str] = [
-                    p.strip() for p in content_text.split("\n") if p.strip()
-                ]
-                summary = ""
+        result: dict[str, Any] = {}
 
-                if paragraphs and paragraphs[0] == result["title"]:
-                    paragraphs = paragraphs[1:]
+        if "title" in fields:
+            title: str = BeautifulSoup(
+                wp_obj.get("title", {}).get("rendered", ""), "html.parser"
+            ).get_text()
+            result["title"] = unescape(title).strip()
 
-                if paragraphs:
-                    summary = " ".join(paragraphs[:2])
+        if "first_paragraphs" in fields:
+            content_html = wp_obj.get("content", {}).get("rendered", "")
+            content_text = BeautifulSoup(content_html, "html.parser").get_text().strip()
+            paragraphs: list[str] = [
+                p.strip() for p in content_text.split("\n") if p.strip()
+            ]
+            summary = ""
 
-                result["first_paragraphs"] = unescape(summary)
+            if paragraphs and paragraphs[0] == result["title"]:
+                paragraphs = paragraphs[1:]
 
-            if "categories" in fields:
-                cat_map: dict[int, str] = await self.get_categories()
-                result["categories"] = [
-                    cat_map.get(cid, str(cid)) for cid in wp_obj.get("categories", [])
-                ]
+            if paragraphs:
+                summary = " ".join(paragraphs[:2])
 
-            if "tags" in fields:
-                tag_map: dict[int, str] = await self.get_tags()
-                result["tags"] = [
-                    tag_map.get(tid, str(tid)) for tid in wp_obj.get("tags", [])
-                ]
+            result["first_paragraphs"] = unescape(summary)
 
-            if "url" in fields:
-                result["url"] = wp_obj.get("link", "")
+        if "categories" in fields:
+            cat_map: dict[int, str] = await self.get_categories()
+            result["categories"] = [
+                cat_map.get(cid, str(cid)) for cid in wp_obj.get("categories", [])
+            ]
 
-            return result
+        if "tags" in fields:
+            tag_map: dict[int, str] = await self.get_tags()
+            result["tags"] = [
+                tag_map.get(tid, str(tid)) for tid in wp_obj.get("tags", [])
+            ]
 
-    async def get_posts_info(self, data_list: list[str | int]) -> list[dict[str, Any]]:
-        results: list[dict[str, Any]] = []
+        if "url" in fields:
+            result["url"] = wp_obj.get("link", "")
 
-        for item in data_list:
+        return result
+
+    async def get_posts_info(self, data_list: list[str | int]) -> list[dict[str, Any]]:
+        async def get_info(item: str | int) -> dict[str, Any]:
             if isinstance(item, int):
-                info: dict[str, Any] = await self._get_post_info(post_id=item)
+                return await self._get_post_info(post_id=item)
 
             elif isinstance(item, str) and self._is_url(item):
-                info = await self._get_post_info(post_url=item)
+                return await self._get_post_info(post_url=item)
 
             else:
-                info = await self._get_post_info(post_slug=item)
+                return await self._get_post_info(post_slug=item)
+
+        return list(await asyncio.gather(*(get_info(item) for item in data_list)))
+
+    async def get_published_posts(
+        self,
+        modified_after: str | None = None,
+        fields: Sequence[str] = (
+            "id",
+            "title",
+            "excerpt",
+            "link",
+            "categories",
+            "tags",
+            "modified_gmt",
+        ),
+        per_page: int = 100,
+        concurrency: int = 4,
+    ) -> list[dict[str, Any]]:
+        """Published posts, or only those modified at or after the given GMT time.
+
+        _fields keeps the responses to the projected fields; pages after the
+        first are requested concurrently once X-WP-TotalPages is known.
+        """
+        params: dict[str, Any] = {
+            "status": "publish",
+            "per_page": per_page,
+            "orderby": "modified",
+            "order": "asc",
+            "_fields": ",".join(fields),
+        }
+        if modified_after:
+            # the core filter is exclusive and modified_gmt has whole seconds,
+            # so ask from a second earlier to include posts of the same second
+            since = datetime.fromisoformat(modified_after) - timedelta(seconds=1)
+            params["modified_after"] = f"{since.isoformat()}+00:00"
+        url: str = f"{self.site_url}/wp-json/wp/v2/posts"
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def get_page(page: int) -> tuple[list[dict[str, Any]], int]:
+            async with semaphore:
+                with span("wordpress.request", op="posts", page=page) as attributes:
+                    status, headers, body = await self._request(
+                        "GET", url, params={**params, "page": page}
+                    )
+                    attributes["status"] = status
+                    if status != 200:
+                        raise Exception(f"Failed to get posts: {status}, {body}")
+                    total_pages = int(headers.get("X-WP-TotalPages", 1))
+                    return json.loads(body), total_pages
+
+        posts, total_pages = await get_page(1)
+        rest = await asyncio.gather(
+            *(get_page(page) for page in range(2, total_pages + 1))
+        )
+        for page_posts, _ in rest:
+            posts.extend(page_posts)
+        return posts
 
-            results.append(info)
+    async def get_snapshot(
+        self,
+        modified_since: str | None = None,
+        taxonomies: bool = True,
+        posts: bool = True,
+        per_page: int = 1000,
+    ) -> dict[str, Any] | None:
+        """Taxonomies and published posts from the yoast-rest-api snapshot route.
+
+        One request per per_page posts instead of the paginated core routes;
+        None when the site runs a plugin version without the route.
+        """
+        if self._snapshot_supported is False:
+            return None
+        url: str = f"{self.site_url}/wp-json/yoast-rest-api/v1/snapshot"
+        params: dict[str, Any] = {
+            "taxonomies": "true" if taxonomies else "false",
+            "posts": "true" if posts else "false",
+            "per_page": per_page,
+        }
+        if modified_since:
+            params["modified_since"] = modified_since
 
-        return results
+        async def get_page(page: int) -> dict[str, Any] | None:
+            with span("wordpress.request", op="snapshot", page=page) as attributes:
+                status, _, body = await self._request(
+                    "GET", url, params={**params, "page": page}
+                )
+                attributes["status"] = status
+            if status == 404 and page == 1:
+                log.warning(
+                    "%s has no snapshot route, using the core API", self.site_url
+                )
+                self._snapshot_supported = False
+                return None
+            if status != 200:
+                raise Exception(f"Failed to get snapshot: {status}, {body}")
+            self._snapshot_supported = True
+            return json.loads(body)
+
+        snapshot = await get_page(1)
+        if snapshot is None:
+            return None
+        params["taxonomies"] = "false"
+        rest = await asyncio.gather(
+            *(get_page(page) for page in range(2, snapshot.get("total_pages", 1) + 1))
+        )
+        for page in rest:
+            # only the first page can report a missing route
+            assert page is not None
+            snapshot["posts"].extend(page["posts"])
+        for key in ("categories", "tags"):
+            if key in snapshot:
+                snapshot[key] = {int(tid): name for tid, name in snapshot[key].items()}
+        return snapshot
 
     def _build_post_payload(
         self,
@@ -201,7 +367,7 @@ class WordPressClient:
             else ""
         )
 
-        print("synonyms: ", post_data.json.synonyms)
+        log.debug("synonyms: %s", post_data.json.synonyms)
         payload: dict[str, Any] = {
             "title": post_data.json.post_title,
             "content": post_data.html,
@@ -231,42 +397,68 @@ class WordPressClient:
             status,
         )
         url: str = f"{self.site_url}wp-json/wp/v2/posts"
-        async with aiohttp.ClientSession(
-            auth=aiohttp.BasicAuth(self.username, self.password)
-        ) as session:
-            async with session.post(url, json=post) as resp:
-                if resp.status != 201:
-                    raise Exception(
-                        f"Failed to create post: {resp.status}, {await resp.text()}"
-                    )
-                result = await resp.json()
-                print("Post created:", result["link"])
-                return result["id"]
+        with span("wordpress.request", op="create_post") as attributes:
+            code, _, body = await self._request("POST", url, json=post)
+            attributes["status"] = code
+            if code != 201:
+                raise Exception(f"Failed to create post: {code}, {body}")
+            result = json.loads(body)
+            log.info("post created: %s", result["link"])
+            return result["id"]
+
+    async def _cached_taxonomy(
+        self, key: str, fetch: Callable[[], Coroutine[Any, Any, Any]]
+    ) -> Any:
+        cached = self._taxonomy_tasks.get(key)
+        if cached is None or time.monotonic() - cached[1] > self.taxonomy_ttl:
+            task = asyncio.create_task(fetch())
+            self._taxonomy_tasks[key] = (task, time.monotonic())
+        else:
+            task = cached[0]
+        try:
+            return await asyncio.shield(task)
+        except Exception:
+            if self._taxonomy_tasks.get(key, (None,))[0] is task:
+                self._taxonomy_tasks.pop(key)
+            raise
+
+    def clear_taxonomy_cache(self) -> None:
+        self._taxonomy_tasks.clear()
 
     async def get_categories(self) -> dict[int, str]:
-        params: dict[str, int] = {"per_page": 100}
-        url: str = f"{self.site_url}/wp-json/wp/v2/categories"
-        async with aiohttp.ClientSession(
-            auth=aiohttp.BasicAuth(self.username, self.password)
-        ) as session:
-            async with session.get(url, params=params) as resp:
-                if resp.status != 200:
-                    raise Exception(
-                        f"Failed to get categories: {resp.status}, {await resp.text()}"
-                    )
-                result = await resp.json()
-                return {category["id"]: category["name"] for category in result}
+        return await self._cached_taxonomy("categories", self._fetch_categories)
 
     async def get_tags(self) -> dict[int, str]:
+        return await self._cached_taxonomy("tags", self._fetch_tags)
+
+    async def _taxonomy_snapshot(self) -> dict[str, Any] | None:
+        # categories and tags come with the same snapshot request
+        return await self._cached_taxonomy(
+            "snapshot", lambda: self.get_snapshot(posts=False)
+        )
+
+    async def _fetch_categories(self) -> dict[int, str]:
+        snapshot = await self._taxonomy_snapshot()
+        if snapshot is not None:
+            return snapshot["categories"]
+        params: dict[str, int] = {"per_page": 100}
+        url: str = f"{self.site_url}/wp-json/wp/v2/categories"
+        with span("wordpress.request", op="categories") as attributes:
+            status, _, body = await self._request("GET", url, params=params)
+            attributes["status"] = status
+            if status != 200:
+                raise Exception(f"Failed to get categories: {status}, {body}")
+            return {category["id"]: category["name"] for category in json.loads(body)}
+
+    async def _fetch_tags(self) -> dict[int, str]:
+        snapshot = await self._taxonomy_snapshot()
+        if snapshot is not None:
+            return snapshot["tags"]
         params: dict[str, int] = {"per_page": 100}
         url: str = f"{self.site_url}/wp-json/wp/v2/tags"
-        async with aiohttp.ClientSession(
-            auth=aiohttp.BasicAuth(self.username, self.password)
-        ) as session:
-            async with session.get(url, params=params) as resp:
-                if resp.status != 200:
-                    raise Exception(
-                        f"Failed to get tags: {resp.status}, {await resp.text()}"
-                    )
-                result = await resp.json()
-                return {tag["id"]: tag["name"] for tag in result}
+        with span("wordpress.request", op="tags") as attributes:
+            status, _, body = await self._request("GET", url, params=params)
+            attributes["status"] = status
+            if status != 200:
+                raise Exception(f"Failed to get tags: {status}, {body}")
+            return {tag["id"]: tag["name"] for tag in json.loads(body)}
@@ -0,0 +1,193 @@
+"""Queue keyphrases and drain the queue with any number of worker processes.
+
+    python worker.py add "keyphrase one" "keyphrase two" -f keyphrases.txt
+    python worker.py run --concurrency 4          # on as many hosts as needed
+    python worker.py status
+
+Workers share the queue through the STATE_DB sqlite file, so every worker
+must see the same file (same host or a shared volume with working locks).
+With SITES_FILE set, jobs are queued for a site (add --site name) and each
+worker serves every site of the file, each with its own concurrency.
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from typing import Any
+import tracing
+from batch import KeyphraseRunner, print_summary, read_keyphrases
+from config import Settings, load_settings, setup_logging, validate_environment
+from job_queue import JobQueue
+from sites import SiteRegistry, read_sites_file
+
+log = logging.getLogger(__name__)
+
+
+async def process_job(
+    queue: JobQueue,
+    runner: KeyphraseRunner,
+    job: dict[str, Any],
+    owner: str,
+    retry_delay: float,
+    timings: dict[str, float] | None = None,
+) -> dict[str, Any]:
+    task = asyncio.create_task(runner.run(job["keyphrase"], timings))
+
+    async def keep_lease() -> None:
+        while True:
+            await asyncio.sleep(queue.lease_seconds / 3)
+            if not await queue.heartbeat(job["id"], owner):
+                log.warning("lost the lease on '%s', stopping it", job["keyphrase"])
+                task.cancel()
+                return
+
+    heartbeat = asyncio.create_task(keep_lease())
+    try:
+        summary = await task
+    except asyncio.CancelledError:
+        if not heartbeat.done():
+            raise
+        # another worker owns the job now, leave its row alone
+        return {
+            "keyphrase": job["keyphrase"],
+            "status": "lost",
+            "timings": {},
+            "total": 0.0,
+        }
+    finally:
+        heartbeat.cancel()
+
+    if summary["status"] == "done":
+        await queue.complete(job["id"], owner, summary)
+    else:
+        await queue.fail(job["id"], owner, summary.get("error", ""), retry_delay)
+    return summary
+
+
+async def run_worker(
+    settings: Settings,
+    concurrency: int,
+    publish: bool,
+    wait: bool,
+    poll_interval: float,
+    retry_delay: float,
+) -> None:
+    registry = SiteRegistry(settings, publish, concurrency)
+    for runner in registry.runners.values():
+        validate_environment(settings, runner.site_info)
+    queue = JobQueue(settings.state_db, lease_seconds=settings.job_lease_seconds)
+    owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+    await registry.prepare()
+    log.info("worker %s started for sites %s", owner, registry.names)
+
+    started = time.perf_counter()
+    results: list[dict[str, Any]] = []
+
+    async def work_loop(site: str) -> None:
+        runner = registry.get(site)
+        while True:
+            job = await queue.claim(owner, sites=[site])
+            if job is None:
+                if not wait:
+                    return
+                await asyncio.sleep(poll_interval)
+                continue
+            log.info(
+                "%s %s (attempt %d)",
+                job["site"] or "-",
+                job["keyphrase"],
+                job["attempts"],
+            )
+            results.append(await process_job(queue, runner, job, owner, retry_delay))
+
+    try:
+        await asyncio.gather(
+            *(
+                work_loop(site)
+                for site, limit in registry.concurrency.items()
+                for _ in range(limit)
+            )
+        )
+    finally:
+        await registry.close()
+    print_summary(results, time.perf_counter() - started)
+    print(f"http: {registry.resilience.metrics()}")
+    print(await queue.counts())
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="Work through the keyphrase job queue")
+    commands = parser.add_subparsers(dest="command", required=True)
+    add = commands.add_parser("add", help="queue keyphrases")
+    add.add_argument("keyphrases", nargs="*")
+    add.add_argument("-f", "--file", help="file with one keyphrase per line")
+    add.add_argument("--max-attempts", type=int, default=3)
+    add.add_argument("--site", default="", help="site name from the sites file")
+    run = commands.add_parser("run", help="process queued jobs")
+    run.add_argument(
+        "-c",
+        "--concurrency",
+        type=int,
+        default=2,
+        help="jobs per site at once, unless the sites file sets it",
+    )
+    run.add_argument("--no-publish", action="store_true")
+    run.add_argument(
+        "--wait", action="store_true", help="keep polling when the queue is empty"
+    )
+    run.add_argument("--poll-interval", type=float, default=10)
+    run.add_argument("--retry-delay", type=float, default=60)
+    status = commands.add_parser("status", help="show the queue")
+    status.add_argument("--retry-failed", action="store_true")
+    args = parser.parse_args()
+
+    settings = load_settings()
+    setup_logging(settings)
+    if args.command == "add":
+        keyphrases: list[str] = list(args.keyphrases)
+        if args.file:
+            keyphrases += read_keyphrases(args.file)
+        if settings.sites_file:
+            names = [entry["name"] for entry in read_sites_file(settings.sites_file)]
+            if args.site not in names:
+                raise SystemExit(f"--site must be one of {names}")
+        elif args.site:
+            raise SystemExit("--site needs SITES_FILE to be set")
+        queue = JobQueue(settings.state_db)
+        added = await queue.enqueue(
+            keyphrases, max_attempts=args.max_attempts, site=args.site
+        )
+        print(f"queued {added} of {len(keyphrases)} keyphrases")
+    elif args.command == "run":
+        tracer = tracing.configure(settings.trace_file)
+        await run_worker(
+            settings,
+            args.concurrency,
+            publish=not args.no_publish,
+            wait=args.wait,
+            poll_interval=args.poll_interval,
+            retry_delay=args.retry_delay,
+        )
+        if tracer.enabled:
+            tracing.print_report(tracer.summary())
+            tracer.close()
+    else:
+        queue = JobQueue(settings.state_db)
+        if args.retry_failed:
+            print(f"requeued {await queue.retry_failed()} failed jobs")
+        for job in await queue.jobs():
+            print(
+                f"{job['id']:>5} {job['status']:<8} {job['attempts']}/{job['max_attempts']} "
+                + (f"[{job['site']}] " if job["site"] else "")
+                + job["keyphrase"]
+                + (f"  ({job['last_error']})" if job["last_error"] else "")
+            )
+        print(await queue.counts())
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
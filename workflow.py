@@ -1,10 +1,114 @@
-from models import PostData, SiteInfo
+import asyncio
+import logging
+import time
+from contextlib import contextmanager
+from models import PostData, SiteInfo, StopPolicy
 from aibot import OpenAi
 from yoast import Yoast
 from models import PostJsonData
-import json
-from file_utils import read_json_file, read_text_file, save_to_file
+from config import Truncated
+from file_utils import read_json_file, read_text_file
+from link_check import LinkChecker
 from scrape import Scrape
+from state_store import StateStore
+from tracing import span
+from wordpress import WordPressClient
+
+log = logging.getLogger(__name__)
+
+
+@contextmanager
+def timed(timings: dict[str, float] | None, stage: str):
+    started = time.perf_counter()
+    try:
+        with span(f"pipeline.{stage}"):
+            yield
+    finally:
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - started
+
+
+def draft_score(analysis: list[dict]) -> tuple[int, int]:
+    # fewer problems first, then the higher total yoast score
+    return len(analysis), -sum(item.get("score") or 0 for item in analysis)
+
+
+async def analyze_draft(
+    analyzer: Yoast,
+    keyphrase: str,
+    json_data: PostJsonData,
+    html: str,
+    site_data: SiteInfo,
+) -> list[dict]:
+    # the node subprocess would otherwise block every other pipeline
+    error = await asyncio.to_thread(
+        analyzer.analyze,
+        keyword=keyphrase,
+        synonyms=", ".join(json_data.synonyms),
+        title=json_data.post_title,
+        meta=json_data.meta,
+        slug=json_data.slug,
+        text=html,
+        permalink=site_data.site_url,
+        locale="fa",
+    )
+    if error:
+        # an empty analysis would read as a draft without problems
+        raise RuntimeError(f"Yoast analysis failed: {error}")
+    return analyzer.get_analysis()
+
+
+async def improve_variants(
+    client: OpenAi,
+    analyzer: Yoast,
+    post_data: PostData,
+    site_data: SiteInfo,
+    analysis: list[dict],
+    count: int,
+    edit_mode: str = "full",
+) -> tuple[dict, str, PostJsonData, list[dict]]:
+    """Improve the draft count times at once and return the best scored candidate."""
+
+    async def candidate() -> tuple[dict, str, PostJsonData, list[dict]]:
+        fork = client.fork()
+        improve = (
+            fork.improve_article_blocks
+            if edit_mode == "patch"
+            else fork.improve_article
+        )
+        json_output, html_output = await improve(
+            title=post_data.json.post_title, yoast_info=analysis, stateless=True
+        )
+        json_data = PostJsonData.from_json(json_output, site_data)
+        # Yoast keeps the last analysis on the instance, one per candidate
+        candidate_analysis = await analyze_draft(
+            Yoast(analyzer.filters, pool=analyzer.pool),
+            post_data.keyphrase,
+            json_data,
+            html_output,
+            site_data,
+        )
+        return json_output, html_output, json_data, candidate_analysis
+
+    with span("pipeline.variants", variants=count) as attributes:
+        results = await asyncio.gather(
+            *(candidate() for _ in range(count)), return_exceptions=True
+        )
+        candidates = [r for r in results if not isinstance(r, BaseException)]
+        errors = [r for r in results if isinstance(r, BaseException)]
+        attributes["failed"] = len(errors)
+        if not candidates:
+            raise errors[0]
+        for error in errors:
+            log.warning("draft variant failed: %s", error)
+        best = min(candidates, key=lambda c: draft_score(c[3]))
+        attributes["problems"] = [len(c[3]) for c in candidates]
+    log.info(
+        "kept the variant with %d problems out of %s",
+        len(best[3]),
+        sorted(len(c[3]) for c in candidates),
+    )
+    return best
 
 
 async def optimize_until_valid(
@@ -12,62 +116,286 @@ async def optimize_until_valid(
     analyzer: Yoast,
     post_data: PostData,
     site_data: SiteInfo,
+    store: StateStore,
     maximum_iterations: int = 100,
     maximum_problems: int = 0,
-):
+    edit_mode: str = "full",
+    policy: StopPolicy | None = None,
+) -> dict:
+    if policy is None:
+        policy = StopPolicy(
+            target_problems=maximum_problems, max_iterations=maximum_iterations
+        )
     iteration = 0
-    html_file = f"{post_data.keyphrase}.html"
-    json_file = f"{post_data.keyphrase}.json"
+    keyphrase = post_data.keyphrase
+    latest = await store.get_latest_draft(keyphrase)
+    version = (
+        latest[2]
+        if latest
+        else await store.save_draft(keyphrase, client.json_output, post_data.html)
+    )
+    started = time.perf_counter()
+    log_start = len(client.context_log)
+    best: dict = {}
+    stalled = 0
+    # analysis of the kept variant, already known when variants were scored
+    next_analysis: list[dict] | None = None
+    tokens_per_variant = 0
     while True:
-        analyzer.analyze(
-            keyword=post_data.keyphrase,
-            synonyms=", ".join(post_data.json.synonyms),
-            title=post_data.json.post_title,
-            meta=post_data.json.meta,
-            slug=post_data.json.slug,
-            text=post_data.html,
-            permalink=site_data.site_url,
-            locale="fa",
+        if next_analysis is None:
+            analysis = await analyze_draft(
+                analyzer, keyphrase, post_data.json, post_data.html, site_data
+            )
+        else:
+            analysis, next_analysis = next_analysis, None
+        await store.save_analysis(keyphrase, version, analysis)
+        score = draft_score(analysis)
+        if not best or score < best["score"]:
+            best = {
+                "score": score,
+                "iteration": iteration,
+                "version": version,
+                "json": post_data.json,
+                "html": post_data.html,
+                "json_output": client.json_output,
+            }
+            stalled = 0
+        else:
+            stalled += 1
+
+        tokens = sum(
+            entry["input_tokens"] + entry["output_tokens"]
+            for entry in client.context_log[log_start:]
         )
-        analysis = analyzer.get_analysis()
-        if len(analysis) <= maximum_problems or iteration >= maximum_iterations:
-            break
-        # optional: print/debug
-        print(json.dumps(analysis, indent=2, ensure_ascii=False))
-        print(len(analysis))
-        user_input = input("Would you like to improve? (y/n)").lower()
-        if user_input != "y":
+        stop_reason = policy.stop_reason(
+            iteration=iteration,
+            problems=len(analysis),
+            stalled=stalled,
+            elapsed=time.perf_counter() - started,
+            tokens=tokens,
+        )
+        if stop_reason:
             break
-        json_output, html_output = await client.improve_article(
-            title=post_data.json.post_title,
-            yoast_info=analysis,
+        log.info(
+            "%s: %d problems after iteration %d", keyphrase, len(analysis), iteration
         )
-        post_data.json = PostJsonData.from_json(json_output, site_data)
+        log.debug("analysis: %s", Truncated(analysis))
+        if policy.interactive:
+            user_input = input("Would you like to improve? (y/n)").lower()
+            if user_input != "y":
+                stop_reason = "stopped by user"
+                break
+        variants = policy.variant_count(tokens, tokens_per_variant)
+        if variants > 1:
+            spent = len(client.context_log)
+            (
+                json_output,
+                html_output,
+                post_data.json,
+                next_analysis,
+            ) = await improve_variants(
+                client,
+                analyzer,
+                post_data,
+                site_data,
+                analysis,
+                variants,
+                edit_mode,
+            )
+            tokens_per_variant = (
+                sum(
+                    entry["input_tokens"] + entry["output_tokens"]
+                    for entry in client.context_log[spent:]
+                )
+                // variants
+            )
+            client.json_output = json_output
+            client.html_output = html_output
+        else:
+            improve = (
+                client.improve_article_blocks
+                if edit_mode == "patch"
+                else client.improve_article
+            )
+            json_output, html_output = await improve(
+                title=post_data.json.post_title,
+                yoast_info=analysis,
+            )
+            post_data.json = PostJsonData.from_json(json_output, site_data)
         post_data.html = html_output
-        await save_to_file(
-            json_file, json.dumps(json_output, indent=2, ensure_ascii=False)
-        )
-        await save_to_file(html_file, html_output)
+        version = await store.save_draft(keyphrase, json_output, html_output)
         iteration += 1
 
+    if best["iteration"] != iteration:
+        log.info("keeping the draft from iteration %d", best["iteration"])
+        post_data.json = best["json"]
+        post_data.html = best["html"]
+        client.json_output = best["json_output"]
+        client.html_output = best["html"]
+        # the best draft becomes the latest version so a resumed run picks it up
+        await store.save_draft(keyphrase, best["json_output"], best["html"])
+    await store.set_stage(keyphrase, "optimized")
+
+    elapsed = time.perf_counter() - started
+    result = {
+        "stop_reason": stop_reason,
+        "iterations": iteration,
+        "variants": policy.variants,
+        "best_iteration": best["iteration"],
+        "problems": best["score"][0],
+        "tokens": tokens,
+        "elapsed": elapsed,
+        # wall-clock time to the target problem count, to compare against DRAFT_VARIANTS=1
+        "time_to_target": elapsed if stop_reason == "target reached" else None,
+    }
+    log.info("optimization of %s finished: %s", keyphrase, result)
+    return result
+
 
 async def generate_post_if_missing(
-    post_info: PostData, scraper: Scrape, client: OpenAi
+    post_info: PostData,
+    scraper: Scrape,
+    client: OpenAi,
+    store: StateStore,
+    timings: dict[str, float] | None = None,
 ):
-    json_file = f"{post_info.keyphrase}.json"
-    html_file = f"{post_info.keyphrase}.html"
+    keyphrase = post_info.keyphrase
+    draft = await store.get_latest_draft(keyphrase)
+    if draft:
+        json_output, html_output, _ = draft
+        return json_output, html_output
 
-    try:
-        json_output = await read_json_file(json_file)
-        html_output = await read_text_file(html_file)
-    except FileNotFoundError:
-        top_results_info = await scraper.get_top_results_info(query=post_info.keyphrase)
+    legacy = await import_legacy_files(keyphrase, store)
+    if legacy:
+        return legacy
+
+    with timed(timings, "scrape"):
+        top_results_info = await get_top_results(keyphrase, scraper, store)
+    with timed(timings, "generate"):
         json_output, html_output = await client.get_full_response(
             top_results_info=top_results_info
         )
-        await save_to_file(
-            json_file, json.dumps(json_output, indent=2, ensure_ascii=False)
-        )
-        await save_to_file(html_file, html_output)
+    await store.save_draft(keyphrase, json_output, html_output)
+    await store.set_stage(keyphrase, "generated")
+
+    return json_output, html_output
+
+
+# searches and scrapes in flight, so sites generating the same keyphrase
+# at the same time wait for one request instead of repeating it
+_pending_results: dict[str, asyncio.Task] = {}
+
+
+async def get_top_results(
+    keyphrase: str, scraper: Scrape, store: StateStore
+) -> list[dict]:
+    """SERP results of keyphrase, searched and scraped once for every site.
+
+    SERP links and scraped pages are stored by the bare keyphrase, so the
+    first caller's store saves them for all; each caller records the stage
+    in its own store.
+    """
+    task = _pending_results.get(keyphrase)
+    if task is None:
+        task = asyncio.create_task(_fetch_top_results(keyphrase, scraper, store))
+        _pending_results[keyphrase] = task
+        task.add_done_callback(lambda _: _pending_results.pop(keyphrase, None))
+    results = await asyncio.shield(task)
+    await store.set_stage(keyphrase, "scraped")
+    return results
 
+
+async def _fetch_top_results(
+    keyphrase: str, scraper: Scrape, store: StateStore
+) -> list[dict]:
+    top_results_info = await store.get_scraped(keyphrase)
+    if top_results_info is None:
+        links = await store.get_serp(keyphrase)
+        if links is None:
+            links = await scraper.get_search_links(keyphrase)
+            await store.save_serp(keyphrase, links)
+        top_results_info = await scraper.get_results_info(links)
+        await store.save_scraped(keyphrase, top_results_info)
+    return top_results_info
+
+
+async def prefetch_top_results(
+    keyphrase: str, scraper: Scrape, store: StateStore
+) -> None:
+    """Search and scrape ahead of generation unless a draft already exists."""
+    if await store.stage_done(keyphrase, "generated"):
+        return
+    if await import_legacy_files(keyphrase, store):
+        return
+    await get_top_results(keyphrase, scraper, store)
+
+
+async def import_legacy_files(
+    keyphrase: str, store: StateStore
+) -> tuple[dict, str] | None:
+    """Move a draft saved as {keyphrase}.json/.html by older versions into the store."""
+    try:
+        json_output = await read_json_file(f"{keyphrase}.json")
+        html_output = await read_text_file(f"{keyphrase}.html")
+    except FileNotFoundError:
+        return None
+    await store.save_draft(keyphrase, json_output, html_output)
+    await store.set_stage(keyphrase, "generated")
     return json_output, html_output
+
+
+async def run_pipeline(
+    post_info: PostData,
+    site_info: SiteInfo,
+    scraper: Scrape,
+    client: OpenAi,
+    analyzer: Yoast,
+    wordpress: WordPressClient,
+    store: StateStore,
+    policy: StopPolicy,
+    edit_mode: str = "full",
+    publish: bool = True,
+    timings: dict[str, float] | None = None,
+    link_checker: LinkChecker | None = None,
+) -> dict:
+    """Run every stage that the store has not checkpointed yet for one keyphrase."""
+    keyphrase = post_info.keyphrase
+    summary: dict = {"keyphrase": keyphrase}
+    if await store.stage_done(keyphrase, "published"):
+        summary["post_id"] = await store.get_post_id(keyphrase)
+        log.info("%s is already published as post %s", keyphrase, summary["post_id"])
+        return summary
+
+    json_output, html_output = await generate_post_if_missing(
+        post_info, scraper, client, store, timings
+    )
+    post_info.html = html_output
+    post_info.json = PostJsonData.from_json(json=json_output, site_info=site_info)
+    client.conversation_id = post_info.json.conversation_id
+    client.html_output = html_output
+    client.json_output = json_output
+
+    if await store.stage_done(keyphrase, "optimized"):
+        log.info("%s is already optimized, using the stored draft", keyphrase)
+    else:
+        with timed(timings, "optimize"):
+            summary["optimize"] = await optimize_until_valid(
+                client,
+                analyzer,
+                post_info,
+                site_info,
+                store,
+                edit_mode=edit_mode,
+                policy=policy,
+            )
+
+    if publish:
+        if link_checker is not None:
+            with timed(timings, "links"):
+                dead = await link_checker.check_post(post_info)
+            summary["dead_links"] = [result["url"] for result in dead]
+        with timed(timings, "publish"):
+            post_id = await wordpress.create_post(post_data=post_info)
+        await store.set_stage(keyphrase, "published", post_id=post_id)
+        summary["post_id"] = post_id
+    return summary
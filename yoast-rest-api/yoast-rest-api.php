@@ -2,8 +2,8 @@
 
 /*
 Plugin Name: Yoast REST API fields
-Description: Expose Yoast SEO title, meta description, focus keyword and its synonyms via REST API
-Version: 1.2.7
+Description: Expose Yoast SEO title, meta description, focus keyword and its synonyms via REST API, plus a bulk site snapshot
+Version: 1.3.0
 Author: Mamad
 */
 
@@ -81,3 +81,126 @@ function register_yoast_meta_in_rest() {
 }
 
 add_action('rest_api_init', 'register_yoast_meta_in_rest');
+
+/**
+ * Compact snapshot of the site for the post generator: id => name maps of the
+ * categories and tags and the published posts with their Yoast focus keyword.
+ * Meta and term caches are primed for the whole page of posts up front, so a
+ * page costs a handful of queries no matter how many posts it holds.
+ *
+ * GET /wp-json/yoast-rest-api/v1/snapshot?modified_since=2025-01-01T00:00:00&page=1
+ */
+function yoast_rest_api_snapshot($request) {
+    $page = (int) $request['page'];
+    $response = array(
+        'generated_gmt' => gmdate('Y-m-d\TH:i:s'),
+        'page'          => $page,
+    );
+
+    // taxonomies are only sent with the first page
+    if ($request['taxonomies'] && $page === 1) {
+        foreach (array('categories' => 'category', 'tags' => 'post_tag') as $key => $taxonomy) {
+            $terms = get_terms(array(
+                'taxonomy'   => $taxonomy,
+                'hide_empty' => false,
+                'fields'     => 'id=>name',
+            ));
+            $names = array();
+            if (!is_wp_error($terms)) {
+                foreach ($terms as $id => $name) {
+                    $names[$id] = html_entity_decode($name, ENT_QUOTES, 'UTF-8');
+                }
+            }
+            $response[$key] = (object) $names;
+        }
+    }
+
+    if (!$request['posts']) {
+        return rest_ensure_response($response);
+    }
+
+    $args = array(
+        'post_type'              => 'post',
+        'post_status'            => 'publish',
+        'posts_per_page'         => (int) $request['per_page'],
+        'paged'                  => $page,
+        'orderby'                => array('modified' => 'ASC', 'ID' => 'ASC'),
+        'ignore_sticky_posts'    => true,
+        'update_post_meta_cache' => true,
+        'update_post_term_cache' => true,
+    );
+    if (!empty($request['modified_since'])) {
+        // times without an offset are GMT, like the modified_gmt values we send
+        $since = new DateTime($request['modified_since'], new DateTimeZone('UTC'));
+        $since->setTimezone(new DateTimeZone('UTC'));
+        $args['date_query'] = array(array(
+            'column'    => 'post_modified_gmt',
+            'after'     => $since->format('Y-m-d H:i:s'),
+            // modified_gmt has whole seconds: a post changed in the same second
+            // as the caller's newest one may be new to it
+            'inclusive' => true,
+        ));
+    }
+    $query = new WP_Query($args);
+
+    $posts = array();
+    foreach ($query->posts as $post) {
+        $text = $post->post_excerpt !== '' ? $post->post_excerpt : strip_shortcodes($post->post_content);
+        $posts[] = array(
+            'id'            => $post->ID,
+            'slug'          => $post->post_name,
+            'link'          => get_permalink($post),
+            'title'         => html_entity_decode(wp_strip_all_tags($post->post_title), ENT_QUOTES, 'UTF-8'),
+            'excerpt'       => wp_trim_words(wp_strip_all_tags($text), 55, ''),
+            'categories'    => wp_list_pluck(get_the_terms($post, 'category') ?: array(), 'term_id'),
+            'tags'          => wp_list_pluck(get_the_terms($post, 'post_tag') ?: array(), 'term_id'),
+            'focus_keyword' => get_post_meta($post->ID, '_yoast_wpseo_focuskw', true),
+            'modified_gmt'  => mysql2date('Y-m-d\TH:i:s', $post->post_modified_gmt, false),
+        );
+    }
+    $response['posts'] = $posts;
+    $response['total'] = (int) $query->found_posts;
+    $response['total_pages'] = (int) $query->max_num_pages;
+
+    return rest_ensure_response($response);
+}
+
+function register_yoast_snapshot_route() {
+    register_rest_route('yoast-rest-api/v1', '/snapshot', array(
+        'methods'             => WP_REST_Server::READABLE,
+        'callback'            => 'yoast_rest_api_snapshot',
+        'permission_callback' => function() {
+            return current_user_can('edit_posts');
+        },
+        'args' => array(
+            'modified_since' => array(
+                'type'              => 'string',
+                'description'       => 'Only posts modified after this GMT time',
+                'validate_callback' => function($value) {
+                    return $value === '' || strtotime($value) !== false;
+                },
+            ),
+            'page' => array(
+                'type'    => 'integer',
+                'default' => 1,
+                'minimum' => 1,
+            ),
+            'per_page' => array(
+                'type'    => 'integer',
+                'default' => 500,
+                'minimum' => 1,
+                'maximum' => 2000,
+            ),
+            'taxonomies' => array(
+                'type'    => 'boolean',
+                'default' => true,
+            ),
+            'posts' => array(
+                'type'    => 'boolean',
+                'default' => true,
+            ),
+        ),
+    ));
+}
+
+add_action('rest_api_init', 'register_yoast_snapshot_route');
@@ -1,14 +1,94 @@
 import subprocess
 import re
 import json
+import threading
 from typing import Any, Pattern
+from title_width import title_width
+from tracing import span
 
 TAG_PATTERN: Pattern = re.compile(r"<(h[1-6]|p|li)>(.*?)</\1>", re.DOTALL)
 
 
+class YoastPool:
+    """Node processes running yoast_seo.js --serve, reused between analyses.
+
+    Starting node and loading yoastseo costs more than analyzing a typical
+    article, so long-running processes keep up to size of them warm.
+    analyze() blocks; call it from a thread.
+    """
+
+    def __init__(self, size: int = 2, script: str = "yoast_seo.js") -> None:
+        self.size: int = size
+        self.script: str = script
+        self._idle: list[subprocess.Popen] = []
+        # guards _idle and _running; notified when a process is returned or dies
+        self._available = threading.Condition()
+        self._running: int = 0
+        self.stats: dict[str, int] = {"analyses": 0, "started": 0, "failed": 0}
+
+    def _checkout(self) -> subprocess.Popen:
+        with self._available:
+            while not self._idle and self._running >= self.size:
+                self._available.wait()
+            if self._idle:
+                return self._idle.pop()
+            self._running += 1
+            self.stats["started"] += 1
+        try:
+            return subprocess.Popen(
+                ["node", self.script, "--serve"],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                encoding="utf-8",
+            )
+        except OSError:
+            self._release()
+            raise
+
+    def _release(self) -> None:
+        with self._available:
+            self._running -= 1
+            self._available.notify()
+
+    def analyze(self, input_data: dict[str, Any]) -> dict[str, Any]:
+        proc = self._checkout()
+        assert proc.stdin is not None and proc.stdout is not None
+        try:
+            proc.stdin.write(json.dumps(input_data) + "\n")
+            proc.stdin.flush()
+            line = proc.stdout.readline()
+        except OSError:
+            line = ""
+        if not line:
+            # the process is gone, a waiting or later analysis starts a new one
+            proc.kill()
+            self._release()
+            self.stats["failed"] += 1
+            raise RuntimeError(f"{self.script} exited with {proc.wait()}")
+        with self._available:
+            self._idle.append(proc)
+            self._available.notify()
+        self.stats["analyses"] += 1
+        output: dict[str, Any] = json.loads(line)
+        if "error" in output:
+            raise RuntimeError(output["error"])
+        return output
+
+    def close(self) -> None:
+        with self._available:
+            idle, self._idle = self._idle, []
+            self._running -= len(idle)
+        for proc in idle:
+            if proc.stdin is not None:
+                proc.stdin.close()
+            proc.wait()
+
+
 class Yoast:
-    def __init__(self, filters: list[str]) -> None:
+    def __init__(self, filters: list[str], pool: YoastPool | None = None) -> None:
         self.filters: list[str] = filters
+        # without a pool every analysis starts its own node process
+        self.pool: YoastPool | None = pool
         self._analysis: list[dict[str, Any]] = []
 
     def analyze(
@@ -28,31 +108,37 @@ class Yoast:
             "keyword": keyword,
             "synonyms": synonyms,
             "title": title,
+            "titleWidth": title_width(title),
             "metaDescription": meta,
             "slug": slug,
             "text": text,
             "locale": locale,
             "permalink": permalink,
         }
-        proc = subprocess.run(
-            ["node", "yoast_seo.js"],
-            input=json.dumps(input_data).encode(),
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-        )
-
-        if proc.returncode != 0:
-            return proc.stderr.decode()
-        else:
-            output: dict[str, Any] = json.loads(proc.stdout.decode())
-            for key, value in output.items():
-                if key != "inclusiveLanguage":
-                    for seo in value:
-                        if (
-                            seo["rating"] != "good"
-                            and seo["_identifier"] not in self.filters
-                        ):
-                            self._analysis.append(seo)
+        with span("yoast.analyze", bytes=len(text)) as attributes:
+            if self.pool is not None:
+                try:
+                    output = self.pool.analyze(input_data)
+                except RuntimeError as e:
+                    attributes["error"] = str(e)
+                    return str(e)
+                self._analysis = select_problems(output, self.filters)
+                attributes["problems"] = len(self._analysis)
+                return None
+            proc = subprocess.run(
+                ["node", "yoast_seo.js"],
+                input=json.dumps(input_data).encode(),
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+            )
+            attributes["returncode"] = proc.returncode
+
+            if proc.returncode != 0:
+                return proc.stderr.decode()
+            else:
+                output: dict[str, Any] = json.loads(proc.stdout.decode())
+                self._analysis = select_problems(output, self.filters)
+                attributes["problems"] = len(self._analysis)
 
     def get_analysis(
         self,
@@ -64,6 +150,10 @@ class Yoast:
             "problemSentences",
         ],
     ) -> list[dict[str, Any]]:
+        with span("yoast.get_analysis", assessments=len(self._analysis)):
+            return self._collect_analysis(keys)
+
+    def _collect_analysis(self, keys: list[str]) -> list[dict[str, Any]]:
         result: list[dict[str, Any]] = []
         for item in self._analysis:
             marks: list = item.get("marks", [])
@@ -90,6 +180,17 @@ class Yoast:
         return result
 
 
+def select_problems(output: dict[str, Any], filters: list[str]) -> list[dict[str, Any]]:
+    """Assessments from yoast_seo.js output that are not good and not filtered out."""
+    problems: list[dict[str, Any]] = []
+    for key, value in output.items():
+        if key != "inclusiveLanguage":
+            for seo in value:
+                if seo["rating"] != "good" and seo["_identifier"] not in filters:
+                    problems.append(seo)
+    return problems
+
+
 def normalize_first_word(text: str) -> str:
     stripped_text: str = re.sub(r"^[\(\[\"\'«»،؛\-\–\—\u200c]+", "", text.strip())
     if not stripped_text:
@@ -2,7 +2,6 @@
 
 const { Paper, assessments, assessors, interpreters } = require("yoastseo");
 const { getResearcher } = require("./get-researcher.js");
-const { createCanvas } = require("canvas");
 
 // Assessors
 const {
@@ -24,30 +23,8 @@ const resultToVM = (result) => {
   return { _identifier, score, text, marks, editFieldName, rating: interpreters.scoreToRating(score) };
 };
 
-function measureTextWidth(text, font = "22px sans-serif") {
-  const canvas = createCanvas("canvas");
-  const ctx = canvas.getContext("2d");
-  ctx.font = font;
-  return ctx.measureText(text).width;
-}
-
-// Main function
-async function main() {
-  // Read JSON from stdin
-  let input = "";
-  process.stdin.setEncoding("utf8");
-  for await (const chunk of process.stdin) {
-    input += chunk;
-  }
-
-  let body;
-  try {
-    body = JSON.parse(input);
-  } catch (err) {
-    console.error(JSON.stringify({ error: "Invalid JSON input" }));
-    process.exit(1);
-  }
-
+// Run every assessor on one request body
+function analyze(body) {
   const language = body.locale || "en";
   const researcher = getResearcher(language);
 
@@ -68,7 +45,8 @@ async function main() {
     synonyms: body.synonyms || "",
     title: body.title || "",
     textTitle: body.title || "",
-    titleWidth: measureTextWidth(body.title) || 0,
+    // measured by the caller from a glyph advance table, see title_width.py
+    titleWidth: body.titleWidth || 0,
     description: body.metaDescription || "",
     slug: body.slug || "",
     locale: body.locale || "en",
@@ -81,17 +59,54 @@ async function main() {
   relatedKeywordAssessor.assess(paper);
   inclusiveLanguageAssessor.assess(paper);
 
-  // Output results
-  const result = {
+  return {
     seo: seoAssessor.getValidResults().map(resultToVM),
     readability: contentAssessor.getValidResults().map(resultToVM),
     relatedKeyword: relatedKeywordAssessor.getValidResults().map(resultToVM),
     inclusiveLanguage: inclusiveLanguageAssessor.getValidResults().map(resultToVM),
   };
+}
 
-  console.log(JSON.stringify(result, null, 2));
+// --serve: one JSON request per stdin line, one JSON result per stdout line,
+// so yoast.YoastPool can keep the process and the loaded modules warm
+async function serve() {
+  const lines = require("readline").createInterface({ input: process.stdin });
+  for await (const line of lines) {
+    if (!line.trim()) continue;
+    let result;
+    try {
+      result = analyze(JSON.parse(line));
+    } catch (err) {
+      result = { error: String(err) };
+    }
+    process.stdout.write(JSON.stringify(result) + "\n");
+  }
+}
+
+// Main function
+async function main() {
+  if (process.argv.includes("--serve")) {
+    return serve();
+  }
+
+  // Read JSON from stdin
+  let input = "";
+  process.stdin.setEncoding("utf8");
+  for await (const chunk of process.stdin) {
+    input += chunk;
+  }
+
+  let body;
+  try {
+    body = JSON.parse(input);
+  } catch (err) {
+    console.error(JSON.stringify({ error: "Invalid JSON input" }));
+    process.exit(1);
+  }
+
+  // Output results
+  console.log(JSON.stringify(analyze(body), null, 2));
 }
 
 // Run the CLI
 main();
-